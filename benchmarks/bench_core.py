@@ -0,0 +1,60 @@
+import itertools
+from flask_app.extensions import db
+from flask_app.models import Entry
+from utils.pagination import keyset_paginate
+from utils.pdf_generator import generate_pdf
+from utils.queries import ENTRY_OPTIONS, user_entries_query
+from utils.tags import get_tag_cache, upsert_tags
+
+DASHBOARD_PER_PAGE = 20
+
+
+def bench_generate_pdf(benchmark, app):
+    entry = Entry.query.options(*ENTRY_OPTIONS).order_by(Entry.id).first()
+    pdf = benchmark(generate_pdf, entry, 'Europe/London')
+    assert pdf.startswith(b'%PDF')
+
+
+def bench_upsert_existing_tags(benchmark, app):
+    # The common case when saving an entry: every tag exists and its id is cached
+    names = [f'tag-{i}' for i in range(10)]
+    upsert_tags(names)
+    db.session.commit()
+
+    def save():
+        ids = upsert_tags(names)
+        db.session.rollback()
+        return ids
+
+    assert len(benchmark(save)) == 10
+
+
+def bench_upsert_new_tags(benchmark, app):
+    # Lookup, insert and re-read; rolled back so the tag table doesn't grow between rounds
+    counter = itertools.count()
+
+    def save():
+        round_number = next(counter)
+        ids = upsert_tags([f'new-{round_number}-{i}' for i in range(10)])
+        db.session.rollback()
+        return ids
+
+    assert len(benchmark(save)) == 10
+    get_tag_cache().clear()
+
+
+def bench_dashboard_query(benchmark, app):
+    user_id = app.seeded['user_ids'][0]
+
+    def first_page():
+        page = keyset_paginate(user_entries_query(user_id), (Entry.date, Entry.id), per_page=DASHBOARD_PER_PAGE)
+        [(entry.tags, entry.media) for entry in page.items]
+        db.session.expunge_all()
+        return page
+
+    assert len(benchmark(first_page).items) == DASHBOARD_PER_PAGE
+
+
+def bench_dashboard_request(benchmark, client):
+    response = benchmark(client.get, f'/dashboard?per_page={DASHBOARD_PER_PAGE}')
+    assert response.status_code == 200
@@ -0,0 +1,66 @@
+"""Fixtures for the pytest-benchmark microbenchmarks (not part of the `tests/` run):
+
+    DATABASE_URL=sqlite:// OPENAI_API_KEY=x python -m pytest benchmarks --seed-entries 500
+
+The seeded app is built once per session; every benchmark also gets a p50/p95/p99 line
+in the terminal summary.
+"""
+import os
+import pytest
+from latency import format_table
+
+# Benchmarks measure the app, not the login throttle or background workers
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('LOGIN_RATE_LIMIT_BACKEND', 'none')
+os.environ.setdefault('JOB_EXECUTOR', 'inline')
+
+_round_times = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('fieldscribe benchmarks')
+    group.addoption('--seed-users', type=int, default=5, help='seeded users')
+    group.addoption('--seed-entries', type=int, default=200, help='seeded entries per user')
+    group.addoption('--seed-tags', type=int, default=50, help='seeded tags')
+
+
+@pytest.fixture(scope='session')
+def app(request):
+    from flask_app import create_app
+    from flask_app.extensions import db
+    from seed_data import seed_database
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        app.seeded = seed_database(users=request.config.getoption('--seed-users'),
+                                   entries_per_user=request.config.getoption('--seed-entries'),
+                                   tags=request.config.getoption('--seed-tags'))
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    from seed_data import PASSWORD, USERNAME_PREFIX
+    client = app.test_client()
+    response = client.post('/login', data={'username': f'{USERNAME_PREFIX}0', 'password': PASSWORD},
+                           follow_redirects=True)
+    assert response.status_code == 200
+    return client
+
+
+@pytest.fixture(autouse=True)
+def _collect_round_times(request):
+    benchmark = request.getfixturevalue('benchmark') if 'benchmark' in request.fixturenames else None
+    yield
+    stats = getattr(benchmark, 'stats', None)
+    if stats is not None:
+        _round_times[request.node.name] = list(stats.stats.data)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _round_times:
+        terminalreporter.write_sep('-', 'latency percentiles per round')
+        terminalreporter.write_line(format_table(_round_times))
@@ -0,0 +1,42 @@
+"""Latency percentiles shared by the microbenchmarks and the load scenario."""
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_samples, pct):
+    # Nearest-rank: the smallest sample with at least pct% of the samples at or below it
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples):
+    # samples in seconds; returns milliseconds
+    ordered = sorted(samples)
+    summary = {'count': len(ordered)}
+    for pct in PERCENTILES:
+        value = percentile(ordered, pct)
+        summary[f'p{pct}'] = None if value is None else value * 1000
+    summary['max'] = ordered[-1] * 1000 if ordered else None
+    return summary
+
+
+def format_table(samples_by_name, extra=None):
+    # One row per name, slowest p95 first; extra: {name: {column: value}} appended per row
+    rows = sorted(((name, summarize(samples)) for name, samples in samples_by_name.items()),
+                  key=lambda row: -(row[1]['p95'] or 0))
+    extra = extra or {}
+    extra_columns = sorted({column for values in extra.values() for column in values})
+    width = max([len(name) for name, _ in rows] + [4])
+    header = f"{'name':<{width}} {'count':>7} " + ' '.join(f"{'p%d ms' % pct:>9}" for pct in PERCENTILES)
+    header += f" {'max ms':>9}" + ''.join(f' {column:>8}' for column in extra_columns)
+    lines = [header]
+    for name, summary in rows:
+        line = f"{name:<{width}} {summary['count']:>7} "
+        line += ' '.join(f"{summary[f'p{pct}']:>9.2f}" for pct in PERCENTILES)
+        line += f" {summary['max']:>9.2f}" + ''.join(f" {extra.get(name, {}).get(column, 0):>8}"
+                                                     for column in extra_columns)
+        lines.append(line)
+    return '\n'.join(lines)
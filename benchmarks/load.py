@@ -0,0 +1,189 @@
+"""Load scenario for the core routes: virtual users sign in and run a weighted mix of page
+views, searches, saves, PDF exports and analyses, locust-style, against the app in-process.
+The OpenAI client is replaced by a stub, so no key or network is needed.
+
+    python benchmarks/load.py --users 20 --duration 60
+    DATABASE_URL=postgresql://... python benchmarks/load.py --no-seed --max-p95 250
+
+Without DATABASE_URL it seeds a throwaway SQLite file. Prints p50/p95/p99 per task and
+exits non-zero when --max-p95 is set and any task is slower.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from latency import format_table, summarize  # noqa: E402
+from seed_data import PASSWORD, USERNAME_PREFIX, WORDS  # noqa: E402
+
+
+class StubOpenAI:
+    # Stands in for openai.OpenAI: chat.completions.create() sleeps for the configured
+    # latency and returns a fixed completion
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        message = SimpleNamespace(content='Themes: tides, birds and weather.')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class VirtualUser:
+    # One signed-in browser. Tasks are methods named in TASKS; each returns a response.
+    TASKS = {
+        'dashboard': 10,
+        'view_entry': 6,
+        'search': 3,
+        'create_entry': 2,
+        'export_pdf': 1,
+        'analyze': 1,
+    }
+
+    def __init__(self, app, username, entry_ids, rng):
+        self.client = app.test_client()
+        self.username = username
+        self.entry_ids = list(entry_ids)
+        self.rng = rng
+
+    def login(self):
+        return self.client.post('/login', data={'username': self.username, 'password': PASSWORD},
+                                follow_redirects=True)
+
+    def dashboard(self):
+        return self.client.get('/dashboard?per_page=20')
+
+    def view_entry(self):
+        return self.client.get(f'/entry/{self.rng.choice(self.entry_ids)}')
+
+    def search(self):
+        return self.client.get(f'/search?q={self.rng.choice(WORDS)}')
+
+    def create_entry(self):
+        response = self.client.post('/api/v1/entries', json={
+            'project': 'Load test', 'title': 'Load test entry',
+            'detailed_observation': ' '.join(self.rng.choice(WORDS) for _ in range(60)),
+            'tags': [f'tag-{self.rng.randrange(50)}' for _ in range(3)]})
+        if response.status_code == 201:
+            self.entry_ids.append(response.get_json()['id'])
+        return response
+
+    def export_pdf(self):
+        return self.client.get(f'/entry/{self.rng.choice(self.entry_ids)}/export')
+
+    def analyze(self):
+        return self.client.post('/analyze')
+
+
+def run(app, users, duration, wait, seed):
+    from flask_app.models import Entry, User
+    with app.app_context():
+        accounts = (User.query.filter(User.username.startswith(USERNAME_PREFIX))
+                    .order_by(User.id).limit(users).all())
+        if not accounts:
+            sys.exit('No seeded users found; run without --no-seed or seed with benchmarks/seed_data.py')
+        entry_ids = {account.username: [entry_id for (entry_id,) in Entry.query.with_entities(Entry.id)
+                                        .filter_by(user_id=account.id).all()]
+                     for account in accounts}
+
+    names, weights = zip(*VirtualUser.TASKS.items())
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        account = accounts[index % len(accounts)]
+        user = VirtualUser(app, account.username, entry_ids[account.username], random.Random(seed + index))
+        if user.login().status_code != 200:
+            with lock:
+                errors['login'] += 1
+            return
+        while time.perf_counter() < deadline:
+            name = user.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = getattr(user, name)().status_code
+            except Exception:
+                status = 500
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[name].append(elapsed)
+                if status >= 400:
+                    errors[name] += 1
+            if wait:
+                time.sleep(user.rng.uniform(0, 2 * wait))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--wait', type=float, default=0, help='mean think time between tasks, seconds')
+    parser.add_argument('--openai-latency', type=float, default=0.5, help='seconds per stubbed completion')
+    parser.add_argument('--entries', type=int, default=200, help='seeded entries per user')
+    parser.add_argument('--no-seed', action='store_true', help='use the users already in DATABASE_URL')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the summary to this file')
+    parser.add_argument('--max-p95', type=float, help='fail if any task p95 exceeds this many ms')
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    # Every virtual user signs in from the same address
+    os.environ.setdefault('LOGIN_RATE_LIMIT_BACKEND', 'none')
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    from flask_app import create_app
+    from flask_app.extensions import db
+    from seed_data import seed_database
+    from utils import thematic_analysis
+    thematic_analysis._client = StubOpenAI(args.openai_latency)
+
+    app = create_app()
+    if not args.no_seed:
+        with app.app_context():
+            db.create_all()
+            seed_database(users=args.users, entries_per_user=args.entries, seed=args.seed)
+
+    samples, errors, elapsed = run(app, args.users, args.duration, args.wait, args.seed)
+    total = sum(len(values) for values in samples.values())
+    print(format_table(samples, {name: {'errors': errors.get(name, 0)} for name in samples}))
+    print(f"\n{total} requests in {elapsed:.1f} s ({total / elapsed:.1f}/s) from {args.users} users, "
+          f"{sum(errors.values())} errors, {thematic_analysis._client.calls} stubbed completions")
+
+    summary = {name: dict(summarize(values), errors=errors.get(name, 0)) for name, values in samples.items()}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'users': args.users, 'duration': elapsed, 'requests': total, 'tasks': summary}, f, indent=2)
+    if args.max_p95 is not None:
+        slow = [name for name, values in summary.items() if values['p95'] > args.max_p95]
+        if slow:
+            sys.exit(f"p95 over {args.max_p95} ms: {', '.join(sorted(slow))}")
+
+
+if __name__ == '__main__':
+    main()
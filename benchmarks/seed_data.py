@@ -0,0 +1,102 @@
+"""Seeded data generator for benchmarks: users, entries, tags and media rows at a chosen
+scale. The same --seed gives the same data, so runs compare like with like.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed_data.py --users 50 --entries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert  # noqa: E402
+from flask_app.extensions import db  # noqa: E402
+from flask_app.models import User, Entry, Media, entry_tags  # noqa: E402
+from utils.passwords import hash_password  # noqa: E402
+from utils.tags import upsert_tags  # noqa: E402
+
+# Every seeded user signs in with this
+PASSWORD = 'benchmark-password'
+USERNAME_PREFIX = 'bench'
+# Rows per INSERT batch
+BATCH_SIZE = 1000
+
+WORDS = ('heron', 'tide', 'estuary', 'mudflat', 'reed', 'gull', 'current', 'sediment', 'wind', 'shore',
+         'observed', 'feeding', 'nesting', 'low', 'high', 'north', 'south', 'cold', 'calm', 'storm',
+         'interview', 'community', 'market', 'boat', 'net', 'catch', 'season', 'change', 'water', 'light')
+PROJECTS = ('Estuary survey', 'Harbour interviews', 'Dune transects', 'Market ethnography', 'Reed beds')
+LOCATIONS = ('North bank', 'South spit', 'Old pier', 'Fish market', 'Lagoon hide', None)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def seed_database(users=10, entries_per_user=100, tags=50, tags_per_entry=3, media_per_entry=1,
+                  observation_words=120, days=365, seed=1, now=None):
+    # Inserts in bulk and commits; returns the new user ids and row counts
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    # One hash for everyone: the policy hash is deliberately slow
+    password_hash = hash_password(PASSWORD)
+
+    start = db.session.query(db.func.count(User.id)).scalar()
+    user_ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), [
+        {'username': f'{USERNAME_PREFIX}{start + i}', 'email': f'{USERNAME_PREFIX}{start + i}@example.com',
+         'password_hash': password_hash, 'is_admin': False}
+        for i in range(users)]).all()
+
+    tag_ids = list(upsert_tags([f'tag-{i}' for i in range(tags)]).values())
+    entry_count = media_count = 0
+    rows = [{'user_id': user_id, 'project': rng.choice(PROJECTS), 'title': _text(rng, 4)[:100],
+             'location': rng.choice(LOCATIONS), 'context': _text(rng, 20),
+             'detailed_observation': _text(rng, observation_words), 'reflection': _text(rng, 30),
+             'date': now - timedelta(days=rng.uniform(0, days))}
+            for user_id in user_ids for _ in range(entries_per_user)]
+    for offset in range(0, len(rows), BATCH_SIZE):
+        batch = rows[offset:offset + BATCH_SIZE]
+        entry_ids = db.session.scalars(insert(Entry).returning(Entry.id, sort_by_parameter_order=True), batch).all()
+        links = [{'entry_id': entry_id, 'tag_id': tag_id} for entry_id in entry_ids
+                 for tag_id in rng.sample(tag_ids, min(tags_per_entry, len(tag_ids)))]
+        if links:
+            db.session.execute(insert(entry_tags), links)
+        # Audio rows: listed on pages and in PDFs without needing image files on disk
+        media = [{'entry_id': entry_id, 'filename': f'seed/{entry_id}-{n}.mp3', 'media_type': 'audio',
+                  'processing_status': 'skipped'}
+                 for entry_id in entry_ids for n in range(media_per_entry)]
+        if media:
+            db.session.execute(insert(Media), media)
+        entry_count += len(entry_ids)
+        media_count += len(media)
+    db.session.commit()
+    return {'user_ids': user_ids, 'entries': entry_count, 'tags': len(tag_ids), 'media': media_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--entries', type=int, default=100, help='entries per user')
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--tags-per-entry', type=int, default=3)
+    parser.add_argument('--media', type=int, default=1, help='media rows per entry')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from flask_app import create_app
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        result = seed_database(args.users, args.entries, args.tags, args.tags_per_entry, args.media, seed=args.seed)
+    print(f"Seeded {len(result['user_ids'])} users, {result['entries']} entries, {result['tags']} tags and "
+          f"{result['media']} media rows in {time.perf_counter() - started:.1f} s "
+          f"(password: {PASSWORD})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Cold-start cost of a worker: import the app module (which runs create_app) in fresh
+interpreters and report wall time plus the slowest imports from `python -X importtime`.
+
+    python benchmarks/startup.py --runs 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(module, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', f'import {module}']
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def slowest_imports(stderr, top):
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative_us), int(self_us), name))
+    # Top-level packages only, so a parent and its children aren't all listed
+    rows = [row for row in rows if '.' not in row[2] or row[2].split('.')[0] in ('routes', 'utils', 'flask_app')]
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='main', help='module a worker imports (default: main)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    timings = [run_import(args.module)[0] for _ in range(args.runs)]
+    print(f"import {args.module}: {args.runs} runs, "
+          f"min {min(timings) * 1000:.0f} ms, median {statistics.median(timings) * 1000:.0f} ms, "
+          f"max {max(timings) * 1000:.0f} ms")
+
+    _, stderr = run_import(args.module, importtime=True)
+    print(f"\n{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in slowest_imports(stderr, args.top):
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name.strip()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from flask_app.extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from utils.passwords import hash_password, needs_rehash
 from datetime import datetime
 import pytz
 from flask_login import UserMixin
@@ -11,13 +12,18 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255))
     is_admin = db.Column(db.Boolean, default=False)
+    # Last change sequence handed out for this user's journal (see utils.sync)
+    sync_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
+
     @property
     def is_active(self):
         return True
@@ -37,6 +43,14 @@ class User(db.Model, UserMixin):
         return f'<User {self.username}>'
 
 class Entry(db.Model):
+    # Backs keyset pagination over (date, id) within a user's journal
+    # sqlite_autoincrement: never reuse a deleted id (PostgreSQL sequences don't), so a sync
+    # tombstone can't be confused with a newer row
+    __table_args__ = (db.Index('ix_entry_user_date_id', 'user_id', 'date', 'id'),
+                      db.Index('ix_entry_user_change_seq', 'user_id', 'change_seq'),
+                      db.UniqueConstraint('user_id', 'client_id', name='uq_entry_user_client_id'),
+                      {'sqlite_autoincrement': True})
+
     id = db.Column(db.Integer, primary_key=True)
     project = db.Column(db.String(100), nullable=False)
     title = db.Column(db.String(100), nullable=False)
@@ -47,10 +61,19 @@ class Entry(db.Model):
     date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     tags = db.relationship('Tag', secondary='entry_tags', backref=db.backref('entries', lazy='dynamic'))
-    media = db.relationship('Media', backref='entry', lazy='dynamic')
+    media = db.relationship('Media', backref='entry', order_by='Media.id', cascade='all, delete-orphan')
     share_token = db.Column(db.String(32), unique=True)
+    # Bumped on every content or media change; derived artifacts (e.g. cached PDFs) are keyed on it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Per-user change sequence of the last insert/update (including tag changes); drives delta sync
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    # Id an offline client gave the entry when creating it; a replayed sync push gets the same row back
+    client_id = db.Column(db.String(64))
     user = db.relationship('User', backref='entries')
 
+    def bump_version(self):
+        self.version = (self.version or 1) + 1
+
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -61,10 +84,69 @@ entry_tags = db.Table('entry_tags',
 )
 
 class Media(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    # Indexed: /media/files checks who may read an original by its filename
+    filename = db.Column(db.String(255), nullable=False, index=True)
     entry_id = db.Column(db.Integer, db.ForeignKey('entry.id'), nullable=False)
     media_type = db.Column(db.String(50), nullable=False)
+    # Set for uploads stored by utils.media_storage; identical files share one MediaBlob
+    content_hash = db.Column(db.String(64), db.ForeignKey('media_blob.sha256'), index=True)
+    # {name: {'filename', 'width', 'height', 'mimetype'}} as written by utils.media_pipeline
+    renditions = db.Column(db.JSON)
+    processing_status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
+
+    def rendition(self, name):
+        return (self.renditions or {}).get(name)
+
+class MediaBlob(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False)
+    # Number of Media rows pointing at this file; the file is deleted when it drops to zero
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+
+    def __repr__(self):
+        return f'<MediaBlob {self.sha256[:12]} x{self.ref_count}>'
+
+class UploadSession(db.Model):
+    # A resumable upload in progress; the bytes received so far live in the staging directory
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey('entry.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    total_bytes = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    mime_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_bytes}/{self.total_bytes}>'
+
+class SyncTombstone(db.Model):
+    # A deleted entry or media row, so offline clients learn about deletes in sequence order
+    __table_args__ = (db.Index('ix_sync_tombstone_user_change_seq', 'user_id', 'change_seq'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    object_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+
+class StatCounter(db.Model):
+    # Running totals kept by database triggers on entry, entry_tags and user (see utils.stats).
+    # dimension: 'entries' (bucket ''), 'project' (project name), 'tag' (tag id), 'day' (YYYY-MM-DD),
+    # 'users' (user_id 0, bucket '': accounts in total)
+    dimension = db.Column(db.String(20), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
 
 class AnalysisResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -75,3 +157,58 @@ class AnalysisResult(db.Model):
 
     def __repr__(self):
         return f'<AnalysisResult {self.id}>'
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    error = db.Column(db.Text)
+    analysis_result_id = db.Column(db.Integer, db.ForeignKey('analysis_result.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    user = db.relationship('User', backref='jobs')
+    analysis_result = db.relationship('AnalysisResult')
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class AnalysisPartial(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    summary = db.Column(db.Text, nullable=False)
+    # Model and prompts the summary was made with (utils.thematic_analysis.partial_fingerprint)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+    entries = db.relationship('AnalysisPartialEntry', backref='partial', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<AnalysisPartial {self.id}>'
+
+class AnalysisPartialEntry(db.Model):
+    # entry_id is deliberately not a foreign key: a deleted entry must invalidate the partial, not vanish from it
+    partial_id = db.Column(db.Integer, db.ForeignKey('analysis_partial.id', ondelete='CASCADE'), primary_key=True)
+    entry_id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+
+class LoginAttempt(db.Model):
+    # Sliding-window log for the SQL login rate limiter (utils.rate_limit); key is 'user:<name>' or 'ip:<addr>'
+    __table_args__ = (db.Index('ix_login_attempt_key_time', 'key', 'attempted_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(200), nullable=False)
+    attempted_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SessionRecord(db.Model):
+    # Server-side session (utils.sessions); key is a hash of the cookie's session id, data the
+    # serialized session dict. user_id is copied out of the data so admins can revoke by user.
+    key = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, index=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class AnalysisCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
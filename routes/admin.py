@@ -1,9 +1,19 @@
-from flask import Blueprint, render_template, flash, redirect, url_for
+from flask import Blueprint, render_template, flash, redirect, url_for, jsonify, request, abort
 from flask_login import login_required
 from utils.decorators import admin_required
+from utils.db_routing import use_replica
 from flask_app.models import User, Entry
 from flask_app.extensions import db
-from sqlalchemy.orm import joinedload
+from utils.analysis_cache import get_analysis_cache
+from utils.queries import admin_entries_query, admin_users_query
+from utils.pagination import keyset_paginate, InvalidCursor
+from utils import stats
+from utils.sessions import revoke_user_sessions
+
+ADMIN_PER_PAGE = 50
+# Rows per chart in the stats endpoints
+STATS_LIMIT = 20
+MAX_STATS_LIMIT = 200
 
 bp = Blueprint('admin', __name__)
 
@@ -14,15 +24,90 @@ def admin_dashboard():
     return render_template('admin/dashboard.html')
 
 @bp.route('/manage_users')
+@use_replica
 @login_required
 @admin_required
 def manage_users():
-    users = User.query.all()
-    return render_template('admin/manage_users.html', users=users)
+    try:
+        page = keyset_paginate(admin_users_query(), (User.id,), cursor=request.args.get('cursor'),
+                               per_page=request.args.get('per_page', ADMIN_PER_PAGE, type=int), descending=False,
+                               with_count=request.args.get('count', 0, type=int) == 1)
+    except InvalidCursor:
+        abort(400)
+    return render_template('admin/manage_users.html', users=page.items, page=page)
+
+@bp.route('/users/<int:user_id>/revoke_sessions', methods=['POST'])
+@login_required
+@admin_required
+def revoke_sessions(user_id):
+    user = User.query.get_or_404(user_id)
+    revoked = revoke_user_sessions(user.id)
+    if revoked is None:
+        flash('Sessions are stored in cookies and cannot be revoked.', 'danger')
+    else:
+        flash(f'Signed {user.username} out of {revoked} session(s).', 'success')
+    return redirect(url_for('admin.manage_users'))
 
 @bp.route('/manage_entries')
+@use_replica
 @login_required
 @admin_required
 def manage_entries():
-    entries = Entry.query.options(joinedload(Entry.user)).all()
-    return render_template('admin/manage_entries.html', entries=entries)
+    try:
+        page = keyset_paginate(admin_entries_query(), (Entry.date, Entry.id), cursor=request.args.get('cursor'),
+                               per_page=request.args.get('per_page', ADMIN_PER_PAGE, type=int),
+                               with_count=request.args.get('count', 0, type=int) == 1)
+    except InvalidCursor:
+        abort(400)
+    return render_template('admin/manage_entries.html', entries=page.items, page=page)
+
+@bp.route('/analysis_cache')
+@login_required
+@admin_required
+def analysis_cache_stats():
+    cache = get_analysis_cache()
+    if cache is None:
+        return jsonify({'backend': None}), 200
+    return jsonify(cache.stats()), 200
+
+@bp.route('/stats/summary')
+@use_replica
+@login_required
+@admin_required
+def stats_summary():
+    return jsonify(stats.summary()), 200
+
+@bp.route('/stats/users')
+@use_replica
+@login_required
+@admin_required
+def stats_users():
+    limit = max(1, min(request.args.get('limit', STATS_LIMIT, type=int), MAX_STATS_LIMIT))
+    return jsonify({'users': stats.entries_per_user(limit)}), 200
+
+@bp.route('/stats/projects')
+@use_replica
+@login_required
+@admin_required
+def stats_projects():
+    limit = max(1, min(request.args.get('limit', STATS_LIMIT, type=int), MAX_STATS_LIMIT))
+    return jsonify({'projects': stats.entries_per_project(limit, request.args.get('user_id', type=int))}), 200
+
+@bp.route('/stats/tags')
+@use_replica
+@login_required
+@admin_required
+def stats_tags():
+    limit = max(1, min(request.args.get('limit', STATS_LIMIT, type=int), MAX_STATS_LIMIT))
+    return jsonify({'tags': stats.entries_per_tag(limit, request.args.get('user_id', type=int))}), 200
+
+@bp.route('/stats/activity')
+@use_replica
+@login_required
+@admin_required
+def stats_activity():
+    interval = request.args.get('interval', 'day')
+    if interval not in ('day', 'week'):
+        return jsonify({'error': "interval must be 'day' or 'week'"}), 400
+    series = stats.activity(request.args.get('days', 90, type=int), interval, request.args.get('user_id', type=int))
+    return jsonify({'interval': interval, 'series': series}), 200
@@ -0,0 +1,533 @@
+from flask import Blueprint, request, jsonify, current_app, url_for
+from flask_login import current_user
+from flask_app.models import Entry, Media, AnalysisResult
+from flask_app.extensions import db
+from functools import wraps
+from datetime import datetime
+import pytz
+import json
+import logging
+from sqlalchemy.exc import IntegrityError
+from utils.pagination import keyset_paginate, InvalidCursor, DEFAULT_PER_PAGE
+from utils.serializers import (ENTRY_FIELDS, ENTRY_COLUMN_FIELDS, InvalidFields, parse_fields, entry_load_options, entry_to_dict,
+                               media_to_dict, analysis_to_dict)
+from utils.pdf_cache import invalidate_entry_pdfs
+from utils.media_storage import release_media, reclaim_blobs
+from utils.jobs import job_queue
+from utils.sync import changes_since, DEFAULT_SYNC_BATCH
+from utils.tags import normalize_tags, set_tags_for_entries, tag_counts
+
+# Versioned JSON API for the mobile and React clients
+bp = Blueprint('api', __name__)
+
+# Most entries (or ids) accepted by one batch request
+MAX_BATCH_SIZE = 100
+# Writable entry fields and their maximum lengths (None = unbounded text)
+ENTRY_WRITABLE_FIELDS = {
+    'project': 100, 'title': 100, 'location': 100,
+    'context': None, 'detailed_observation': None, 'reflection': None
+}
+REQUIRED_ENTRY_FIELDS = ('project', 'title', 'detailed_observation')
+# Most tags returned by one /tags request
+TAG_CLOUD_LIMIT = 500
+
+def api_login_required(f):
+    # JSON 401 instead of the login-page redirect HTML routes get
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_error(message, status, **extra):
+    return jsonify({'error': message, **extra}), status
+
+def requested_fields():
+    return parse_fields(request.args.get('fields'))
+
+def parse_entry_date(value):
+    # ISO 8601; stored as naive UTC like the rest of the journal
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(pytz.UTC).replace(tzinfo=None)
+    return parsed
+
+def validate_entry_data(data, partial=False):
+    # Returns (values, errors); partial=True for updates, where every field is optional
+    if not isinstance(data, dict):
+        return None, {'_': 'Each entry must be a JSON object'}
+    values, errors = {}, {}
+    for field in data:
+        if field not in ENTRY_WRITABLE_FIELDS and field not in ('id', 'tags', 'date'):
+            errors[field] = 'Unknown or read-only field'
+
+    for field, max_length in ENTRY_WRITABLE_FIELDS.items():
+        if field not in data:
+            continue
+        value = data[field]
+        if value is None and field not in REQUIRED_ENTRY_FIELDS:
+            values[field] = None
+        elif not isinstance(value, str):
+            errors[field] = 'Must be a string'
+        elif max_length is not None and len(value) > max_length:
+            errors[field] = f'Must be at most {max_length} characters'
+        else:
+            values[field] = value
+
+    for field in REQUIRED_ENTRY_FIELDS:
+        if field in errors or (partial and field not in data):
+            continue
+        if not (values.get(field) or '').strip():
+            errors[field] = 'This field is required'
+
+    if 'tags' in data:
+        tags = data['tags']
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            errors['tags'] = 'Must be a list of strings'
+        else:
+            values['tags'] = normalize_tags(tags)
+
+    if 'date' in data:
+        try:
+            values['date'] = parse_entry_date(data['date'])
+        except (TypeError, ValueError):
+            errors['date'] = 'Must be an ISO 8601 datetime'
+    return values, errors
+
+def apply_entry_values(entry, values):
+    # Column values are set on the entry; tags are returned for set_tags_for_entries()
+    for field, value in values.items():
+        if field != 'tags':
+            setattr(entry, field, value)
+    return values.get('tags')
+
+def validate_batch(items, partial=False):
+    if not isinstance(items, list) or not items:
+        return None, api_error('Expected a non-empty "entries" list', 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return None, api_error(f'At most {MAX_BATCH_SIZE} entries per request', 413)
+    validated, errors = [], {}
+    for index, item in enumerate(items):
+        values, item_errors = validate_entry_data(item, partial=partial)
+        if partial and isinstance(item, dict) and not isinstance(item.get('id'), int):
+            item_errors['id'] = 'Must be an integer'
+        if item_errors:
+            errors[str(index)] = item_errors
+        validated.append(values)
+    if errors:
+        return None, api_error('Validation failed', 400, errors=errors)
+    return validated, None
+
+def add_entries(validated, client_ids=None):
+    # Returns the new ids in request order; the caller commits
+    entries = []
+    for values, client_id in zip(validated, client_ids or [None] * len(validated)):
+        entry = Entry(user_id=current_user.id, client_id=client_id,
+                      date=values.pop('date', None) or datetime.utcnow())
+        db.session.add(entry)
+        entries.append((entry, apply_entry_values(entry, values)))
+    db.session.flush()
+    set_tags_for_entries({entry.id: names for entry, names in entries if names is not None})
+    return [entry.id for entry, names in entries]
+
+def create_entries(validated):
+    ids = add_entries(validated)
+    db.session.commit()
+    return ids
+
+def apply_updates(entries_by_id, updates):
+    # The caller commits and invalidates PDFs
+    tag_updates = {}
+    for entry_id, values in updates.items():
+        entry = entries_by_id[entry_id]
+        names = apply_entry_values(entry, values)
+        if names is not None:
+            tag_updates[entry_id] = names
+        entry.bump_version()
+    db.session.flush()
+    set_tags_for_entries(tag_updates)
+
+def update_entries(entries_by_id, updates):
+    apply_updates(entries_by_id, updates)
+    db.session.commit()
+    for entry_id in updates:
+        invalidate_entry_pdfs(entry_id)
+
+def created_for_client_ids(client_ids):
+    # {client_id: entry id} for the current user's entries already created under these ids
+    if not client_ids:
+        return {}
+    return dict(db.session.query(Entry.client_id, Entry.id)
+                .filter(Entry.user_id == current_user.id, Entry.client_id.in_(client_ids)))
+
+def own_entries(ids, fields=ENTRY_FIELDS):
+    # One IN query, scoped to the current user so other users' ids look missing
+    if not ids:
+        return {}
+    query = (Entry.query
+             .filter(Entry.user_id == current_user.id, Entry.id.in_(ids))
+             .options(*entry_load_options(fields)))
+    return {entry.id: entry for entry in query}
+
+def entries_response(ids, fields, status=200):
+    # Committed rows are expired; reload them all in one query rather than one refresh each
+    found = own_entries(ids, fields)
+    return jsonify({'entries': [entry_to_dict(found[entry_id], fields) for entry_id in ids]}), status
+
+def release_entry_media(entry):
+    # Drop the entry's blob references; returns blobs to reclaim once the delete commits
+    released_blobs = []
+    for media in entry.media:
+        released_blobs.extend(release_media(media))
+    return released_blobs
+
+def parse_ids(value):
+    try:
+        ids = [int(part) for part in (value or '').split(',') if part.strip()]
+    except ValueError:
+        return None
+    return list(dict.fromkeys(ids))
+
+@bp.errorhandler(InvalidFields)
+def invalid_fields(e):
+    return api_error(str(e), 400)
+
+@bp.errorhandler(InvalidCursor)
+def invalid_cursor(e):
+    return api_error('Invalid cursor', 400)
+
+# Entries
+
+@bp.route('/entries', methods=['GET'])
+@api_login_required
+def list_entries():
+    fields = requested_fields()
+    query = Entry.query.filter_by(user_id=current_user.id).options(*entry_load_options(fields))
+    project = request.args.get('project', '').strip()
+    if project:
+        query = query.filter(Entry.project == project)
+    page = keyset_paginate(query, (Entry.date, Entry.id), cursor=request.args.get('cursor'),
+                           per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int))
+    return jsonify({
+        'entries': [entry_to_dict(entry, fields) for entry in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+@bp.route('/entries/batch', methods=['GET'])
+@api_login_required
+def get_entries_batch():
+    ids = parse_ids(request.args.get('ids'))
+    if not ids:
+        return api_error('Expected ids=1,2,3', 400)
+    if len(ids) > MAX_BATCH_SIZE:
+        return api_error(f'At most {MAX_BATCH_SIZE} ids per request', 413)
+    fields = requested_fields()
+    found = own_entries(ids, fields)
+    return jsonify({
+        'entries': [entry_to_dict(found[entry_id], fields) for entry_id in ids if entry_id in found],
+        'missing': [entry_id for entry_id in ids if entry_id not in found],
+    })
+
+@bp.route('/entries/<int:entry_id>', methods=['GET'])
+@api_login_required
+def get_entry(entry_id):
+    fields = requested_fields()
+    entry = own_entries([entry_id], fields).get(entry_id)
+    if entry is None:
+        return api_error('Entry not found', 404)
+    return jsonify(entry_to_dict(entry, fields))
+
+@bp.route('/entries', methods=['POST'])
+@api_login_required
+def create_entry():
+    fields = requested_fields()
+    validated, error = validate_batch([request.get_json(silent=True)])
+    if error:
+        return error
+    try:
+        entry_id = create_entries(validated)[0]
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error creating entry via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while creating the entry', 500)
+    return jsonify(entry_to_dict(own_entries([entry_id], fields)[entry_id], fields)), 201
+
+@bp.route('/entries/batch', methods=['POST'])
+@api_login_required
+def create_entries_batch():
+    fields = requested_fields()
+    validated, error = validate_batch((request.get_json(silent=True) or {}).get('entries'))
+    if error:
+        return error
+    try:
+        ids = create_entries(validated)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error creating entries via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while creating the entries', 500)
+    return entries_response(ids, fields, 201)
+
+@bp.route('/entries/<int:entry_id>', methods=['PATCH'])
+@api_login_required
+def update_entry(entry_id):
+    fields = requested_fields()
+    data = request.get_json(silent=True)
+    values, errors = validate_entry_data(data, partial=True)
+    if errors:
+        return api_error('Validation failed', 400, errors=errors)
+    entries_by_id = own_entries([entry_id])
+    if entry_id not in entries_by_id:
+        return api_error('Entry not found', 404)
+    try:
+        update_entries(entries_by_id, {entry_id: values})
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error updating entry via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while updating the entry', 500)
+    return jsonify(entry_to_dict(own_entries([entry_id], fields)[entry_id], fields))
+
+@bp.route('/entries/batch', methods=['PATCH'])
+@api_login_required
+def update_entries_batch():
+    fields = requested_fields()
+    items = (request.get_json(silent=True) or {}).get('entries')
+    validated, error = validate_batch(items, partial=True)
+    if error:
+        return error
+    updates = {item['id']: values for item, values in zip(items, validated)}
+    entries_by_id = own_entries(list(updates))
+    missing = [entry_id for entry_id in updates if entry_id not in entries_by_id]
+    if missing:
+        return api_error('Entries not found', 404, missing=missing)
+    try:
+        update_entries(entries_by_id, updates)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error updating entries via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while updating the entries', 500)
+    return entries_response(list(updates), fields)
+
+@bp.route('/entries/<int:entry_id>', methods=['DELETE'])
+@api_login_required
+def delete_entry(entry_id):
+    entry = own_entries([entry_id]).get(entry_id)
+    if entry is None:
+        return api_error('Entry not found', 404)
+    try:
+        released_blobs = release_entry_media(entry)
+        db.session.delete(entry)
+        db.session.commit()
+        reclaim_blobs(released_blobs, current_app.config['UPLOAD_FOLDER'])
+        invalidate_entry_pdfs(entry_id)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error deleting entry via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while deleting the entry', 500)
+    return '', 204
+
+# Tags and media
+
+@bp.route('/tags', methods=['GET'])
+@api_login_required
+def list_tags():
+    # ?sort=count&limit=50 gives a tag cloud: the user's most used tags first
+    order = 'count' if request.args.get('sort') == 'count' else 'name'
+    limit = max(1, min(request.args.get('limit', TAG_CLOUD_LIMIT, type=int), TAG_CLOUD_LIMIT))
+    rows = tag_counts(current_user.id, limit=limit, order=order)
+    return jsonify({'tags': [{'id': tag_id, 'name': name, 'count': count} for tag_id, name, count in rows]})
+
+@bp.route('/entries/<int:entry_id>/media', methods=['GET'])
+@api_login_required
+def list_entry_media(entry_id):
+    if not own_entries([entry_id], ('id',)):
+        return api_error('Entry not found', 404)
+    media = Media.query.filter_by(entry_id=entry_id).order_by(Media.id)
+    return jsonify({
+        'media': [media_to_dict(item) for item in media],
+        'upload_url': url_for('media.upload_file', entry_id=entry_id),
+        'resumable_upload_url': url_for('media.init_upload', entry_id=entry_id),
+    })
+
+@bp.route('/media/<int:media_id>', methods=['GET'])
+@api_login_required
+def get_media(media_id):
+    media = (Media.query
+             .join(Entry, Entry.id == Media.entry_id)
+             .filter(Media.id == media_id, Entry.user_id == current_user.id)
+             .first())
+    if media is None:
+        return api_error('Media not found', 404)
+    return jsonify(media_to_dict(media))
+
+# Analyses
+
+@bp.route('/analyses', methods=['GET'])
+@api_login_required
+def list_analyses():
+    page = keyset_paginate(AnalysisResult.query.filter_by(user_id=current_user.id),
+                           (AnalysisResult.date, AnalysisResult.id), cursor=request.args.get('cursor'),
+                           per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int))
+    include_content = request.args.get('content', 1, type=int) == 1
+    return jsonify({
+        'analyses': [analysis_to_dict(analysis, include_content) for analysis in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+@bp.route('/analyses/<int:analysis_id>', methods=['GET'])
+@api_login_required
+def get_analysis(analysis_id):
+    analysis = AnalysisResult.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+    if analysis is None:
+        return api_error('Analysis not found', 404)
+    return jsonify(analysis_to_dict(analysis))
+
+@bp.route('/analyses', methods=['POST'])
+@api_login_required
+def create_analysis():
+    try:
+        job = job_queue.enqueue('analysis', current_user.id)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error queueing analysis via API", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while queueing the analysis', 500)
+    return jsonify({'job_id': job.id, 'status_url': url_for('jobs.job_status', job_id=job.id)}), 202
+
+# Delta sync for offline clients. Every insert, update (including tag changes) and delete of
+# an entry or media row gets the next number in the user's change sequence (utils.sync).
+
+# Entries carry their tags; media is sent separately so a new photo doesn't resend the entry
+SYNC_ENTRY_FIELDS = ENTRY_COLUMN_FIELDS + ('tags',)
+# Keys a pushed change may carry besides entry fields
+SYNC_CONTROL_KEYS = ('id', 'client_id', 'base_seq', 'deleted')
+# Longest client_id a create may carry (Entry.client_id)
+MAX_CLIENT_ID_LENGTH = 64
+
+@bp.route('/sync', methods=['GET'])
+@api_login_required
+def pull_changes():
+    # Apply `deleted` before `entries`/`media`, then continue from `cursor` while has_more
+    cursor = request.args.get('cursor', 0, type=int)
+    if cursor < 0:
+        return api_error('Invalid cursor', 400)
+    entries, media, tombstones, next_cursor, has_more = changes_since(
+        current_user.id, cursor, request.args.get('limit', DEFAULT_SYNC_BATCH, type=int))
+    return jsonify({
+        'entries': [entry_to_dict(entry, SYNC_ENTRY_FIELDS) for entry in entries],
+        'media': [media_to_dict(item) for item in media],
+        'deleted': [{'kind': t.kind, 'id': t.object_id, 'change_seq': t.change_seq} for t in tombstones],
+        'cursor': next_cursor,
+        'has_more': has_more,
+    })
+
+@bp.route('/sync', methods=['POST'])
+@api_login_required
+def push_changes():
+    # {"entries": [{"client_id": ..., <fields>},                      create
+    #              {"id": 5, "base_seq": 12, <changed fields>},       update
+    #              {"id": 5, "base_seq": 12, "deleted": true}]}       delete
+    # An update or delete whose base_seq is older than the server's change_seq is a conflict:
+    # it is not applied and the server's copy is returned so the client can merge and retry.
+    # A create whose client_id the server has already seen is a replay of a push whose response
+    # was lost: it reports the entry created then instead of adding another one. Each id and
+    # client_id may appear only once per batch.
+    items = (request.get_json(silent=True) or {}).get('entries')
+    if not isinstance(items, list) or not items:
+        return api_error('Expected a non-empty "entries" list', 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return api_error(f'At most {MAX_BATCH_SIZE} entries per request', 413)
+
+    results, creates, updates, deletes, errors = [], [], {}, [], {}
+    ids = [item['id'] for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)]
+    existing = own_entries(list(dict.fromkeys(ids)))
+    replayed = created_for_client_ids([item['client_id'] for item in items
+                                       if isinstance(item, dict) and item.get('id') is None
+                                       and isinstance(item.get('client_id'), str)])
+    seen_ids, seen_client_ids = set(), set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[str(index)] = {'_': 'Each change must be a JSON object'}
+            continue
+        entry_id = item.get('id')
+        client_id = item.get('client_id')
+        result = {'index': index, 'id': entry_id, 'client_id': client_id}
+        results.append(result)
+        data = {key: value for key, value in item.items() if key not in SYNC_CONTROL_KEYS}
+        if entry_id is None:
+            if client_id is not None and not (isinstance(client_id, str) and
+                                              0 < len(client_id) <= MAX_CLIENT_ID_LENGTH):
+                errors[str(index)] = {'client_id': f'Must be a string of 1 to {MAX_CLIENT_ID_LENGTH} characters'}
+                continue
+            if client_id is not None and client_id in seen_client_ids:
+                errors[str(index)] = {'client_id': 'Appears more than once in this batch'}
+                continue
+            seen_client_ids.add(client_id)
+            if client_id in replayed:
+                result.update(status='created', id=replayed[client_id])
+                continue
+            values, item_errors = validate_entry_data(data)
+            if item_errors:
+                errors[str(index)] = item_errors
+            else:
+                creates.append((result, values, client_id))
+            continue
+
+        if isinstance(entry_id, int):
+            if entry_id in seen_ids:
+                errors[str(index)] = {'id': 'Appears more than once in this batch'}
+                continue
+            seen_ids.add(entry_id)
+        entry = existing.get(entry_id) if isinstance(entry_id, int) else None
+        base_seq = item.get('base_seq')
+        if not isinstance(base_seq, int):
+            errors[str(index)] = {'base_seq': 'Required for updates and deletes'}
+        elif entry is None:
+            # Deleted on the server (or never this user's); the client drops or re-creates it
+            result.update(status='conflict', server=None)
+        elif entry.change_seq > base_seq:
+            result.update(status='conflict', server=entry_to_dict(entry, SYNC_ENTRY_FIELDS))
+        elif item.get('deleted'):
+            deletes.append((result, entry))
+        else:
+            values, item_errors = validate_entry_data(data, partial=True)
+            if item_errors:
+                errors[str(index)] = item_errors
+            else:
+                updates[entry_id] = values
+                result['status'] = 'updated'
+    if errors:
+        return api_error('Validation failed', 400, errors=errors)
+
+    try:
+        released_blobs = []
+        for result, entry in deletes:
+            released_blobs.extend(release_entry_media(entry))
+            db.session.delete(entry)
+            result['status'] = 'deleted'
+        apply_updates(existing, updates)
+        created_ids = add_entries([values for result, values, client_id in creates],
+                                  [client_id for result, values, client_id in creates]) if creates else []
+        for (result, values, client_id), entry_id in zip(creates, created_ids):
+            result.update(status='created', id=entry_id)
+        db.session.commit()
+        reclaim_blobs(released_blobs, current_app.config['UPLOAD_FOLDER'])
+    except IntegrityError:
+        # Another push with the same client_id committed first; a retry gets its entry back
+        db.session.rollback()
+        return api_error('A concurrent push created one of these entries; retry the request', 409)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error applying sync changes", "exception": str(e)}), exc_info=True)
+        return api_error('An error occurred while applying the changes', 500)
+
+    for entry_id in list(updates) + [result['id'] for result, entry in deletes]:
+        invalidate_entry_pdfs(entry_id)
+    # New sequence numbers, so the client can use them as base_seq next time
+    changed_ids = [result['id'] for result in results if result.get('status') in ('created', 'updated')]
+    seqs = {entry.id: entry.change_seq for entry in own_entries(changed_ids, ('change_seq',)).values()}
+    for result in results:
+        if result.get('status') in ('created', 'updated'):
+            result['change_seq'] = seqs.get(result['id'])
+    return jsonify({'results': results})
@@ -1,15 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, make_response
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_app.models import User
 from flask_app.extensions import db
+from utils.rate_limit import check_login_attempt, record_failed_login, reset_login_attempts
 import re
 from urllib.parse import urlparse, urljoin
 import logging
 
 bp = Blueprint('auth', __name__)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def is_safe_url(target):
@@ -79,9 +79,23 @@ def login():
         password = request.form['password']
         
         logger.debug(f"Login attempt for username: {username}")
-        
+
+        # Throttled before the user lookup and the (deliberately slow) password hash
+        retry_after = check_login_attempt(username, request.remote_addr)
+        if retry_after:
+            logger.warning(f"Login throttled for username: {username} from {request.remote_addr}")
+            flash(f'Too many login attempts. Please try again in {retry_after} seconds.', 'danger')
+            response = make_response(render_template('login.html'), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            reset_login_attempts(username)
+            if user.password_needs_rehash():
+                # Hashing policy changed since this password was set; upgrade it while we have it
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             logger.debug(f"User {username} logged in successfully")
             flash('Logged in successfully.', 'success')
@@ -94,6 +108,7 @@ def login():
             return redirect_to_dashboard()
         else:
             logger.debug(f"Invalid login attempt for username: {username}")
+            record_failed_login(request.remote_addr)
             flash('Invalid username or password', 'danger')
     
     return render_template('login.html')
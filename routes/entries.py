@@ -1,41 +1,64 @@
-from flask import Blueprint, render_template, redirect, url_for, request, jsonify, flash, abort, current_app, send_file
+from flask import Blueprint, render_template, redirect, url_for, request, jsonify, flash, abort, current_app, send_file, Response
 from flask_login import login_required, current_user
-from flask_app.models import Entry, Tag, Media, AnalysisResult
+from flask_app.models import Entry, Media, AnalysisResult, Job
 from flask_app.extensions import db
-from utils.pdf_generator import generate_pdf
-from utils.thematic_analysis import perform_thematic_analysis
+from utils.pdf_cache import get_pdf_cache, invalidate_entry_pdfs
+from utils.pdf_generator import generate_report
+from utils.jobs import job_queue
+from utils.queries import ENTRY_OPTIONS, user_entries_query, load_entry_or_404
+from utils.pagination import keyset_paginate, InvalidCursor, DEFAULT_PER_PAGE
+from utils.media_storage import store_upload, media_for_blob, release_media, reclaim_blobs
+from utils.tags import parse_tags, set_entry_tags
+from utils.db_routing import use_replica
+from utils.metrics import timer
+from utils.share_cache import get_shared_page
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from werkzeug.utils import secure_filename
 import os
 from forms import EntryForm
 from functools import wraps
+from io import BytesIO
 import tempfile
 import secrets
 
 bp = Blueprint('entries', __name__)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s', handlers=[logging.StreamHandler()])
+# Entries loaded per query when building multi-entry reports
+REPORT_BATCH_SIZE = 50
 
 def owner_required(f):
     @wraps(f)
     def decorated_function(entry_id, *args, **kwargs):
-        entry = Entry.query.get_or_404(entry_id)
+        entry = load_entry_or_404(entry_id)
         if entry.user_id != current_user.id:
             abort(403)
         return f(entry, *args, **kwargs)
     return decorated_function
 
+def queue_media_processing(entry):
+    # Renditions are built by the job pool; pages fall back to the original until they're ready
+    for media in entry.media:
+        if media.processing_status == 'pending':
+            job_queue.enqueue('media_renditions', entry.user_id, media_id=media.id)
+
 @bp.route('/dashboard', methods=['GET'])
+@use_replica
 @login_required
 def dashboard():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 5, type=int)
-        entries = Entry.query.filter_by(user_id=current_user.id).order_by(Entry.date.desc()).paginate(page=page, per_page=per_page)
-        return render_template('dashboard.html', entries=entries)
+        page = keyset_paginate(
+            user_entries_query(current_user.id),
+            (Entry.date, Entry.id),
+            cursor=request.args.get('cursor'),
+            per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int),
+            with_count=request.args.get('count', 0, type=int) == 1
+        )
+        return render_template('dashboard.html', entries=page.items, page=page)
+    except InvalidCursor:
+        abort(400)
     except Exception as e:
         logging.error(json.dumps({"error": "Error loading dashboard", "exception": str(e)}), exc_info=True)
         flash("An error occurred while loading your dashboard. Please try again.", "error")
@@ -53,35 +76,22 @@ def new_entry():
             context = form.context.data
             detailed_observation = form.detailed_observation.data
             reflection = form.reflection.data
-            tags = [tag.strip() for tag in form.tags.data.split(',')]
+            tags = parse_tags(form.tags.data)
             
             entry = Entry(project=project, title=title, location=location, context=context,
                           detailed_observation=detailed_observation, reflection=reflection,
                           user_id=current_user.id, date=datetime.utcnow())
             db.session.add(entry)
-
-            existing_tags = Tag.query.filter(Tag.name.in_(tags)).all()
-            existing_tag_names = {tag.name: tag for tag in existing_tags}
-
-            for tag_name in tags:
-                if tag_name in existing_tag_names:
-                    tag = existing_tag_names[tag_name]
-                else:
-                    tag = Tag(name=tag_name)
-                    db.session.add(tag)
-                if tag not in entry.tags:
-                    entry.tags.append(tag)
+            set_entry_tags(entry, tags)
 
             if 'photo' in request.files:
                 photo = request.files['photo']
                 if photo.filename != '':
-                    filename = secure_filename(photo.filename)
-                    photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    photo.save(photo_path)
-                    media = Media(filename=filename, entry_id=entry.id, media_type='image')
-                    db.session.add(media)
+                    stored = store_upload(photo, current_app.config['UPLOAD_FOLDER'])
+                    entry.media.append(media_for_blob(stored))
 
             db.session.commit()
+            queue_media_processing(entry)
 
             flash("New entry created successfully!", "success")
             return redirect(url_for('entries.dashboard'))
@@ -107,43 +117,28 @@ def edit_entry(entry):
             entry.context = form.context.data
             entry.detailed_observation = form.detailed_observation.data
             entry.reflection = form.reflection.data
-            tags = [tag.strip() for tag in form.tags.data.split(',')]
-            
-            existing_tags = {tag.name for tag in entry.tags}
-            new_tags = set(tags)
-
-            all_tags = Tag.query.filter(Tag.name.in_(new_tags)).all()
-            tag_map = {tag.name: tag for tag in all_tags}
-
-            for tag_name in new_tags - existing_tags:
-                if tag_name in tag_map:
-                    tag = tag_map[tag_name]
-                else:
-                    tag = Tag(name=tag_name)
-                    db.session.add(tag)
-                if tag not in entry.tags:
-                    entry.tags.append(tag)
-
-            for tag_name in existing_tags - new_tags:
-                tag = Tag.query.filter_by(name=tag_name).first()
-                if tag:
-                    entry.tags.remove(tag)
+            set_entry_tags(entry, parse_tags(form.tags.data))
 
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            released_blobs = []
             if 'photo' in request.files:
                 photo = request.files['photo']
                 if photo.filename != '':
-                    filename = secure_filename(photo.filename)
-                    photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    photo.save(photo_path)
+                    stored = store_upload(photo, upload_folder)
                     
-                    old_media = Media.query.filter_by(entry_id=entry.id).first()
+                    old_media = entry.media[0] if entry.media else None
                     if old_media:
-                        db.session.delete(old_media)
+                        released_blobs = release_media(old_media)
+                        entry.media.remove(old_media)
                     
-                    media = Media(filename=filename, entry_id=entry.id, media_type='image')
-                    db.session.add(media)
+                    entry.media.insert(0, media_for_blob(stored))
 
+            entry.bump_version()
             db.session.commit()
+            # Files go only once nothing references them and the commit has succeeded
+            reclaim_blobs(released_blobs, upload_folder)
+            invalidate_entry_pdfs(entry.id)
+            queue_media_processing(entry)
 
             flash("Entry updated successfully!", "success")
             return redirect(url_for('entries.dashboard'))
@@ -159,8 +154,15 @@ def edit_entry(entry):
 @owner_required
 def delete_entry(entry):
     try:
+        entry_id = entry.id
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        released_blobs = []
+        for media in entry.media:
+            released_blobs.extend(release_media(media))
         db.session.delete(entry)
         db.session.commit()
+        reclaim_blobs(released_blobs, upload_folder)
+        invalidate_entry_pdfs(entry_id)
         flash("Entry deleted successfully!", "success")
     except Exception as e:
         db.session.rollback()
@@ -170,11 +172,12 @@ def delete_entry(entry):
     return redirect(url_for('entries.dashboard'))
 
 @bp.route('/entry/<int:entry_id>', methods=['GET'])
+@use_replica
 @login_required
 @owner_required
 def view_entry(entry):
     try:
-        media = Media.query.filter_by(entry_id=entry.id).first()
+        media = entry.media[0] if entry.media else None
         return render_template('entry_detail.html', entry=entry, media=media)
     except Exception as e:
         logging.error(json.dumps({"error": "Error viewing entry", "exception": str(e)}), exc_info=True)
@@ -187,14 +190,11 @@ def view_entry(entry):
 def export_entry(entry):
     try:
         timezone = request.args.get('timezone', 'UTC')
-        pdf_content = generate_pdf(entry, timezone)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(pdf_content)
-            temp_file_path = temp_file.name
+        with timer('entry_pdf'):
+            pdf_content = get_pdf_cache().get_or_build(entry, timezone)
 
         return send_file(
-            temp_file_path,
+            BytesIO(pdf_content),
             as_attachment=True,
             download_name=f"entry_{entry.id}.pdf",
             mimetype='application/pdf'
@@ -204,6 +204,76 @@ def export_entry(entry):
         flash("An error occurred while exporting the entry. Please try again.", "error")
         return redirect(url_for('entries.view_entry', entry_id=entry.id))
 
+def iter_entries_with_media(query, batch_size=REPORT_BATCH_SIZE):
+    # Tags and media are selectin-loaded once per yield_per batch
+    for entry in query.options(*ENTRY_OPTIONS).yield_per(batch_size):
+        yield entry, entry.media
+
+def stream_file(f, chunk_size=64 * 1024):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+@bp.route('/export/project', methods=['GET'])
+@login_required
+def export_project():
+    try:
+        timezone = request.args.get('timezone', 'UTC')
+        tz = pytz.timezone(timezone)
+        project = request.args.get('project', '').strip()
+        start = request.args.get('start', '').strip()
+        end = request.args.get('end', '').strip()
+
+        query = Entry.query.filter_by(user_id=current_user.id)
+        if project:
+            query = query.filter(Entry.project == project)
+        # Dates are the user's local calendar days; entries are stored in UTC
+        if start:
+            start_local = tz.localize(datetime.strptime(start, '%Y-%m-%d'))
+            query = query.filter(Entry.date >= start_local.astimezone(pytz.UTC).replace(tzinfo=None))
+        if end:
+            end_local = tz.localize(datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1))
+            query = query.filter(Entry.date < end_local.astimezone(pytz.UTC).replace(tzinfo=None))
+        query = query.order_by(Entry.date, Entry.id)
+
+        title = f"{project or 'All projects'}: field report"
+        fd, report_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            with timer('report_pdf'):
+                generate_report(iter_entries_with_media(query), report_path, timezone, title)
+            report = open(report_path, 'rb')
+        finally:
+            # The open handle keeps the data readable; nothing is left on disk if the client
+            # disconnects or never reads the body (HEAD)
+            os.remove(report_path)
+
+        filename = secure_filename(f"{project or 'journal'}_report.pdf") or 'report.pdf'
+        response = Response(stream_file(report), mimetype='application/pdf')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['Content-Length'] = str(os.fstat(report.fileno()).st_size)
+        response.call_on_close(report.close)
+        return response
+    except Exception as e:
+        logging.error(json.dumps({"error": "Error exporting project", "exception": str(e)}), exc_info=True)
+        flash("An error occurred while exporting the report. Please check the filters and try again.", "error")
+        return redirect(url_for('entries.dashboard'))
+
+@bp.route('/entry/<int:entry_id>/export/jobs', methods=['POST'])
+@login_required
+@owner_required
+def export_entry_job(entry):
+    try:
+        timezone = request.args.get('timezone', 'UTC')
+        job = job_queue.enqueue('pdf_export', current_user.id, entry_id=entry.id, timezone=timezone)
+        return jsonify({'job_id': job.id, 'status_url': url_for('jobs.job_status', job_id=job.id)}), 202
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error queueing entry export", "exception": str(e)}), exc_info=True)
+        return jsonify({'error': 'An error occurred while queueing the export'}), 500
+
 @bp.route('/entry/<int:entry_id>/share', methods=['POST'])
 @login_required
 @owner_required
@@ -222,48 +292,57 @@ def share_entry(entry):
         return jsonify({'error': 'An error occurred while sharing the entry'}), 500
 
 @bp.route('/shared/<string:share_token>')
+@use_replica
 def view_shared_entry(share_token):
-    entry = Entry.query.filter_by(share_token=share_token).first_or_404()
-    return render_template('shared_entry.html', entry=entry)
+    # Served from the rendered-page cache; browsers and proxies revalidate with the ETag
+    page = get_shared_page(share_token)
+    if page is None:
+        abort(404)
+    response = Response(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['SHARED_PAGE_MAX_AGE']
+    return response.make_conditional(request)
 
 @bp.route('/analyze', methods=['GET', 'POST'])
 @login_required
 def analyze_entries():
     if request.method == 'POST':
+        # The model calls run on a job worker; the page polls the job and shows the result
         try:
-            entries = Entry.query.filter_by(user_id=current_user.id).all()
-            serialized_entries = []
-            for entry in entries:
-                serialized_entry = {
-                    'id': entry.id,
-                    'title': entry.title,
-                    'project': entry.project,
-                    'location': entry.location,
-                    'context': entry.context,
-                    'detailed_observation': entry.detailed_observation,
-                    'reflection': entry.reflection,
-                    'date': entry.date.isoformat(),
-                    'tags': [tag.name for tag in entry.tags]
-                }
-                serialized_entries.append(serialized_entry)
-            
-            analysis_result = perform_thematic_analysis(serialized_entries)
-            
-            new_analysis = AnalysisResult(user_id=current_user.id, content=analysis_result)
-            db.session.add(new_analysis)
-            db.session.commit()
-            
-            flash("Analysis completed and saved successfully!", "success")
-            return render_template('analysis_result.html', analysis_result=analysis_result)
+            job = job_queue.enqueue('analysis', current_user.id)
+            return redirect(url_for('entries.analyze_entries', job=job.id))
         except Exception as e:
-            logging.error(f"Error analyzing entries: {str(e)}", exc_info=True)
-            flash("An error occurred while analyzing the entries. Please try again.", "error")
-            return redirect(url_for('entries.dashboard'))
+            db.session.rollback()
+            logging.error(json.dumps({"error": "Error queueing analysis", "exception": str(e)}), exc_info=True)
+            flash("An error occurred while starting the analysis. Please try again.", "error")
+            return redirect(url_for('entries.analyze_entries'))
     else:
+        job = None
+        job_id = request.args.get('job')
+        if job_id:
+            job = db.session.get(Job, job_id)
+            if job is None or job.user_id != current_user.id or job.kind != 'analysis':
+                job = None
+            elif job.status == 'failed':
+                flash("An error occurred while analyzing the entries. Please try again.", "error")
         latest_analysis = AnalysisResult.query.filter_by(user_id=current_user.id).order_by(AnalysisResult.date.desc()).first()
-        return render_template('analyze.html', latest_analysis=latest_analysis)
+        return render_template('analyze.html', latest_analysis=latest_analysis, job=job)
+
+@bp.route('/analyze/jobs', methods=['POST'])
+@login_required
+def analyze_entries_job():
+    try:
+        job = job_queue.enqueue('analysis', current_user.id)
+        return jsonify({'job_id': job.id, 'status_url': url_for('jobs.job_status', job_id=job.id)}), 202
+    except Exception as e:
+        db.session.rollback()
+        logging.error(json.dumps({"error": "Error queueing analysis", "exception": str(e)}), exc_info=True)
+        return jsonify({'error': 'An error occurred while queueing the analysis'}), 500
 
 @bp.route('/analysis_history')
+@use_replica
 @login_required
 def analysis_history():
     analysis_results = AnalysisResult.query.filter_by(user_id=current_user.id).order_by(AnalysisResult.date.desc()).all()
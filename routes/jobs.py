@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify, abort, send_file, url_for
+from flask_login import login_required, current_user
+from flask_app.models import Job, Entry
+from flask_app.extensions import db
+from utils.jobs import RESULT_KINDS, job_to_dict
+from utils.pdf_cache import get_pdf_cache
+from io import BytesIO
+import json
+
+bp = Blueprint('jobs', __name__)
+
+def get_own_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        abort(404)
+    if job.user_id != current_user.id:
+        abort(403)
+    return job
+
+@bp.route('/jobs/<string:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = get_own_job(job_id)
+    data = job_to_dict(job)
+    if job.status == 'finished' and job.kind in RESULT_KINDS:
+        data['result_url'] = url_for('jobs.job_result', job_id=job.id)
+    return jsonify(data), 200
+
+@bp.route('/jobs/<string:job_id>/result', methods=['GET'])
+@login_required
+def job_result(job_id):
+    job = get_own_job(job_id)
+    if job.kind not in RESULT_KINDS:
+        return jsonify({'error': 'This job has no downloadable result', 'kind': job.kind}), 404
+    if job.status != 'finished':
+        return jsonify({'error': 'Job has not finished', 'status': job.status}), 409
+
+    if job.kind == 'analysis':
+        analysis = job.analysis_result
+        if analysis is None:
+            abort(404)
+        return jsonify({'id': analysis.id, 'date': analysis.date.isoformat(), 'content': analysis.content}), 200
+
+    # The export job warmed the PDF cache; an evicted or since-edited entry is rendered again
+    params = json.loads(job.params or '{}')
+    entry = db.session.get(Entry, params.get('entry_id'))
+    if entry is None or entry.user_id != current_user.id:
+        abort(404)
+    return send_file(
+        BytesIO(get_pdf_cache().get_or_build(entry, params.get('timezone', 'UTC'))),
+        as_attachment=True,
+        download_name=f"entry_{params.get('entry_id')}.pdf",
+        mimetype='application/pdf'
+    )
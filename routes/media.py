@@ -1,15 +1,21 @@
 import logging
-from flask import Blueprint, request, jsonify, current_app, render_template
-from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from models import Entry, Media
-from __init__ import db
+import os
 import uuid
+from datetime import datetime
+import pytz
+from flask import Blueprint, request, jsonify, current_app, render_template, url_for, abort
+from flask_login import login_required, current_user
+from flask_app.models import Entry, Media, UploadSession
+from flask_app.extensions import db
 from functools import wraps
-from pathlib import Path
 from sqlalchemy.exc import SQLAlchemyError
-import magic
 from sqlalchemy.orm import lazyload
+from utils.pdf_cache import invalidate_entry_pdfs
+from utils.jobs import job_queue
+from utils.media_pipeline import RENDITION_SIZES
+from utils.assets import send_asset, CONTENT_ADDRESSED
+from utils.media_storage import (store_upload, store_file, media_for_blob, staging_path, write_chunk,
+                                 UnsupportedMediaType, FileTooSmall, ChunkTooLarge)
 
 # Define a Blueprint for media-related routes
 bp = Blueprint('media', __name__)
@@ -20,26 +26,13 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp3', 'mp4'}
 MAX_FILE_SIZE_MB = 10
 # Minimum file size allowed (in bytes)
 MIN_FILE_SIZE_BYTES = 1024  # 1 KB
+# Resumable uploads: each chunk is one request under MAX_FILE_SIZE_MB; the whole file may be larger
+RESUMABLE_CHUNK_SIZE_MB = 5
+MAX_RESUMABLE_FILE_SIZE_MB = 2048
 
-# Helper function to check if the file extension is allowed and validate MIME type
-def allowed_file(file):
-    # Check if the filename contains a '.' and if the extension is in the allowed list
-    if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
-        return False
-    # Check the MIME type using python-magic
-    try:
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_buffer(file.read(1024))
-    except Exception as e:
-        current_app.logger.error(f"Error determining MIME type: {e}")
-        return False
-    finally:
-        file.seek(0)  # Reset file pointer after reading
-    allowed_mime_types = {
-        'image/png', 'image/jpeg', 'image/gif',
-        'audio/mpeg', 'video/mp4'
-    }
-    return mime_type in allowed_mime_types
+# Helper function to check the file extension; the MIME type is checked on the first chunk while storing
+def allowed_extension(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # Decorator for checking entry ownership
 def entry_owner_required(f):
@@ -72,45 +65,210 @@ def upload_file(entry):
         current_app.logger.error("No file part or no selected file")
         return jsonify({'error': 'No file part or no selected file'}), 400
 
-    # Check if the file size is too small
-    file.seek(0, 2)  # Move to the end of the file to get its size
-    file_size = file.tell()
-    file.seek(0)  # Reset file pointer after getting the size
-    if file_size < MIN_FILE_SIZE_BYTES:
-        current_app.logger.error(f"File size is too small: {file_size} bytes")
-        return jsonify({'error': f'File too small. Minimum allowed size is {MIN_FILE_SIZE_BYTES} bytes'}), 400
+    if not allowed_extension(file.filename):
+        current_app.logger.error("Unsupported file extension")
+        return jsonify({'error': 'Unsupported file type or MIME type'}), 400
 
-    # If the file is allowed, save it
-    if allowed_file(file):
-        # Secure the filename to prevent directory traversal attacks
-        filename = secure_filename(file.filename)
-        # Generate a unique filename to avoid conflicts
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        # Define the path where the file will be saved using pathlib
-        save_path = Path(current_app.config['UPLOAD_FOLDER']) / unique_filename
-        # Ensure the target directory exists
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        try:
-            # Save the file to the specified path
-            file.save(save_path)
-            # Create a new Media record in the database
-            new_media = Media(entry_id=entry.id, filename=unique_filename)
-            db.session.add(new_media)
-            db.session.commit()
-            # Return a success response with the filename
-            return jsonify({'message': 'File successfully uploaded', 'filename': unique_filename}), 201
-        except SQLAlchemyError as db_error:
-            db.session.rollback()
-            current_app.logger.error(f"Database error: {db_error}")
-            return jsonify({'error': 'Failed to save file to database'}), 500
-        except Exception as e:
-            # Log any errors that occur while saving the file
-            current_app.logger.error(f"Error saving file: {e}")
-            return jsonify({'error': 'Failed to save file'}), 500
-    else:
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    try:
+        # Stream the upload to disk in chunks while hashing it; identical files share one blob
+        stored = store_upload(file, upload_folder, min_size=MIN_FILE_SIZE_BYTES)
+    except UnsupportedMediaType as e:
         # Log an error if the file type is unsupported
-        current_app.logger.error("Unsupported file type or MIME type")
+        current_app.logger.error(f"Unsupported MIME type: {e}")
         return jsonify({'error': 'Unsupported file type or MIME type'}), 400
+    except FileTooSmall as e:
+        current_app.logger.error(f"File size is too small: {e} bytes")
+        return jsonify({'error': f'File too small. Minimum allowed size is {MIN_FILE_SIZE_BYTES} bytes'}), 400
+    except Exception as e:
+        # Log any errors that occur while saving the file
+        current_app.logger.error(f"Error saving file: {e}")
+        return jsonify({'error': 'Failed to save file'}), 500
+
+    try:
+        # Create a new Media record pointing at the (possibly shared) blob
+        media = add_media_to_entry(entry, stored)
+        # Return a success response with the filename
+        return jsonify({'message': 'File successfully uploaded', 'filename': media.filename,
+                        'sha256': stored.sha256}), 201
+    except SQLAlchemyError as db_error:
+        db.session.rollback()
+        current_app.logger.error(f"Database error: {db_error}")
+        return jsonify({'error': 'Failed to save file to database'}), 500
+
+def add_media_to_entry(entry, stored):
+    # Attach stored content to the entry, then invalidate its PDFs and queue image renditions
+    new_media = media_for_blob(stored)
+    entry.media.append(new_media)
+    # New media changes the exported PDF, so move the entry to a new version
+    entry.bump_version()
+    db.session.commit()
+    invalidate_entry_pdfs(entry.id)
+    # Thumbnails and display sizes are built off the request path by the job pool
+    if new_media.processing_status == 'pending' and new_media.media_type == 'image':
+        job_queue.enqueue('media_renditions', entry.user_id, media_id=new_media.id)
+    return new_media
+
+def upload_session_to_dict(upload):
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'offset': upload.received_bytes,
+        'size': upload.total_bytes,
+        'chunk_size': RESUMABLE_CHUNK_SIZE_MB * 1024 * 1024,
+        'upload_url': url_for('media.upload_chunk', upload_id=upload.id),
+        'finalize_url': url_for('media.finalize_upload', upload_id=upload.id)
+    }
+
+# Decorator for loading an upload session owned by the current user
+def upload_owner_required(f):
+    @wraps(f)
+    def decorated_function(upload_id, *args, **kwargs):
+        upload = db.session.get(UploadSession, upload_id)
+        if upload is None or upload.user_id != current_user.id:
+            return jsonify({'error': 'Upload not found'}), 404
+        return f(upload, *args, **kwargs)
+    return decorated_function
+
+# Start a resumable upload: POST {"filename": ..., "size": <total bytes>}
+@bp.route('/upload/<int:entry_id>/resumable', methods=['POST'])
+@login_required
+@entry_owner_required
+def init_upload(entry):
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '')
+    size = data.get('size')
+    if not filename or not allowed_extension(filename):
+        return jsonify({'error': 'Unsupported file type or MIME type'}), 400
+    if not isinstance(size, int) or size < MIN_FILE_SIZE_BYTES:
+        return jsonify({'error': f'File too small. Minimum allowed size is {MIN_FILE_SIZE_BYTES} bytes'}), 400
+    if size > MAX_RESUMABLE_FILE_SIZE_MB * 1024 * 1024:
+        return jsonify({'error': f'File too large. Maximum allowed size is {MAX_RESUMABLE_FILE_SIZE_MB} MB'}), 413
+
+    upload = UploadSession(id=uuid.uuid4().hex, user_id=current_user.id, entry_id=entry.id,
+                           filename=filename[:255], total_bytes=size)
+    db.session.add(upload)
+    db.session.commit()
+    return jsonify(upload_session_to_dict(upload)), 201
+
+# Current offset of an upload, so a client can resume after a dropped connection
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+@upload_owner_required
+def upload_status(upload):
+    return jsonify(upload_session_to_dict(upload))
+
+# Append one chunk: PUT the raw bytes with an Upload-Offset header equal to the current offset
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+@upload_owner_required
+def upload_chunk(upload):
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset != upload.received_bytes:
+        # Out of order or a stale retry; the client should resume from the returned offset
+        return jsonify({'error': 'Offset mismatch', 'offset': upload.received_bytes}), 409
+
+    # No more than one advertised chunk, and never past the declared size
+    max_bytes = min(RESUMABLE_CHUNK_SIZE_MB * 1024 * 1024, upload.total_bytes - offset)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': 'Chunk too large', 'max_bytes': max_bytes, 'offset': upload.received_bytes}), 413
+
+    path = staging_path(current_app.config['UPLOAD_STAGING_DIR'], upload.id)
+    try:
+        written, mime_type = write_chunk(path, request.stream, offset, max_bytes)
+    except UnsupportedMediaType as e:
+        current_app.logger.error(f"Unsupported MIME type: {e}")
+        return jsonify({'error': 'Unsupported file type or MIME type'}), 400
+    except ChunkTooLarge:
+        return jsonify({'error': 'Chunk too large', 'max_bytes': max_bytes, 'offset': upload.received_bytes}), 413
+    except OSError as e:
+        current_app.logger.error(f"Error writing upload chunk: {e}")
+        return jsonify({'error': 'Failed to save chunk', 'offset': upload.received_bytes}), 500
+
+    if mime_type:
+        upload.mime_type = mime_type
+    upload.received_bytes = offset + written
+    upload.updated_at = datetime.now(pytz.UTC)
+    db.session.commit()
+    return jsonify({'offset': upload.received_bytes, 'size': upload.total_bytes})
+
+# Move the assembled file into media storage and attach it to the entry
+@bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+@upload_owner_required
+def finalize_upload(upload):
+    if upload.received_bytes != upload.total_bytes:
+        return jsonify({'error': 'Upload incomplete', 'offset': upload.received_bytes}), 409
+
+    entry = db.session.get(Entry, upload.entry_id)
+    path = staging_path(current_app.config['UPLOAD_STAGING_DIR'], upload.id)
+    if entry is None:
+        # The entry was deleted while the upload was in flight; nothing to attach it to
+        db.session.delete(upload)
+        db.session.commit()
+        if os.path.exists(path):
+            os.remove(path)
+        return jsonify({'error': 'Entry not found'}), 404
+    try:
+        stored = store_file(path, current_app.config['UPLOAD_FOLDER'], min_size=MIN_FILE_SIZE_BYTES)
+    except (UnsupportedMediaType, FileTooSmall) as e:
+        current_app.logger.error(f"Rejected resumable upload {upload.id}: {e!r}")
+        return jsonify({'error': 'Unsupported file type or MIME type'}), 400
+    except OSError as e:
+        current_app.logger.error(f"Error finalizing upload {upload.id}: {e}")
+        return jsonify({'error': 'Failed to save file'}), 500
+
+    try:
+        db.session.delete(upload)
+        media = add_media_to_entry(entry, stored)
+        return jsonify({'message': 'File successfully uploaded', 'filename': media.filename,
+                        'sha256': stored.sha256}), 201
+    except SQLAlchemyError as db_error:
+        db.session.rollback()
+        current_app.logger.error(f"Database error: {db_error}")
+        return jsonify({'error': 'Failed to save file to database'}), 500
+
+# Abandon an upload and discard what has been staged
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+@upload_owner_required
+def cancel_upload(upload):
+    path = staging_path(current_app.config['UPLOAD_STAGING_DIR'], upload.id)
+    db.session.delete(upload)
+    db.session.commit()
+    if os.path.exists(path):
+        os.remove(path)
+    return '', 204
+
+def is_rendition(filename):
+    # <stem>.<size>.<ext>, written by the media pipeline without EXIF
+    parts = filename.rsplit('.', 2)
+    return len(parts) == 3 and parts[1] in RENDITION_SIZES
+
+def original_access(filename):
+    # Originals keep their metadata (EXIF GPS, camera serials). Audio and video on a shared entry
+    # are public, as the shared page plays them; anything else only to the entry's owner.
+    rows = (db.session.query(Media.media_type, Entry.user_id, Entry.share_token)
+            .join(Entry, Media.entry_id == Entry.id)
+            .filter(Media.filename == filename).all())
+    if any(media_type != 'image' and share_token for media_type, user_id, share_token in rows):
+        return 'public'
+    if current_user.is_authenticated and any(user_id == current_user.id for media_type, user_id, share_token in rows):
+        return 'owner'
+    return None
+
+# Uploaded files and their renditions. Content-addressed names never change content, so they
+# are cached as immutable with the name as a strong ETag; Range requests let audio/video seek.
+@bp.route('/files/<path:filename>', methods=['GET'])
+def serve_file(filename):
+    access = 'public' if is_rendition(filename) else original_access(filename)
+    if access is None:
+        abort(404)
+    folder, prefix = current_app.config['UPLOAD_FOLDER'], current_app.config['X_ACCEL_UPLOADS_PREFIX']
+    if CONTENT_ADDRESSED.match(filename):
+        return send_asset(folder, filename, prefix, immutable=True, etag=filename, public=access == 'public')
+    # Files from before content addressing can be replaced in place, so they are revalidated
+    return send_asset(folder, filename, prefix, public=access == 'public')
 
 # Before request hook to limit the file size of incoming requests
 @bp.before_request
@@ -0,0 +1,54 @@
+from flask import Blueprint, render_template, request, jsonify, url_for
+from flask_login import login_required, current_user
+from utils.search import search_entries, parse_date
+import json
+import logging
+
+bp = Blueprint('search', __name__)
+
+def get_search_args():
+    return dict(
+        q=request.args.get('q', '').strip(),
+        project=request.args.get('project', '').strip() or None,
+        tag=request.args.get('tag', '').strip() or None,
+        start=parse_date(request.args.get('start', '').strip()),
+        end=parse_date(request.args.get('end', '').strip()),
+        limit=request.args.get('limit', 20, type=int),
+        offset=max(request.args.get('offset', 0, type=int), 0),
+    )
+
+@bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    try:
+        args = get_search_args()
+    except ValueError:
+        return render_template('search.html', results=[], args=request.args, error="Dates must be in YYYY-MM-DD format."), 400
+    results = search_entries(current_user.id, **args) if args['q'] else []
+    return render_template('search.html', results=results, args=request.args, error=None)
+
+@bp.route('/api/search', methods=['GET'])
+@login_required
+def search_api():
+    try:
+        args = get_search_args()
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+    if not args['q']:
+        return jsonify({'error': 'Missing query parameter q'}), 400
+    try:
+        results = search_entries(current_user.id, **args)
+    except Exception as e:
+        logging.error(json.dumps({"error": "Error searching entries", "exception": str(e)}), exc_info=True)
+        return jsonify({'error': 'An error occurred while searching'}), 500
+    return jsonify({
+        'results': [{
+            'id': entry.id,
+            'title': entry.title,
+            'project': entry.project,
+            'date': entry.date.isoformat(),
+            'tags': [tag.name for tag in entry.tags],
+            'url': url_for('entries.view_entry', entry_id=entry.id),
+        } for entry in results],
+        'offset': args['offset'],
+    }), 200
@@ -0,0 +1,65 @@
+// Admin dashboard charts, fed by the /admin/stats/* endpoints
+
+document.addEventListener('DOMContentLoaded', () => {
+    const panel = document.querySelector('#admin-stats');
+    if (panel) {
+        loadStats(panel);
+    }
+});
+
+async function fetchJSON(url) {
+    const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+    if (!response.ok) {
+        throw new Error(`Request failed: ${response.status}`);
+    }
+    return response.json();
+}
+
+async function loadStats(panel) {
+    try {
+        const [summary, activity, projects] = await Promise.all([
+            fetchJSON(panel.dataset.summaryUrl),
+            fetchJSON(panel.dataset.activityUrl),
+            fetchJSON(panel.dataset.projectsUrl),
+        ]);
+        renderSummary(panel.querySelector('[data-stats-summary]'), summary);
+        renderActivity(panel.querySelector('[data-stats-activity]'), activity.series);
+        renderProjects(panel.querySelector('[data-stats-projects]'), projects.projects);
+    } catch (error) {
+        console.error('Error loading statistics:', error);
+    }
+}
+
+function renderSummary(container, summary) {
+    for (const key of ['users', 'entries', 'projects', 'tags']) {
+        const card = document.createElement('div');
+        card.className = 'text-center';
+        const value = document.createElement('div');
+        value.className = 'text-2xl font-bold text-sky-700';
+        value.textContent = summary[key];
+        const label = document.createElement('div');
+        label.className = 'text-sm text-gray-600';
+        label.textContent = key;
+        card.append(value, label);
+        container.appendChild(card);
+    }
+}
+
+function renderActivity(container, series) {
+    const max = Math.max(1, ...series.map(point => point.entries));
+    for (const point of series) {
+        const bar = document.createElement('div');
+        bar.className = 'bg-sky-500 flex-1';
+        bar.style.height = `${(point.entries / max) * 100}%`;
+        bar.title = `${point.period}: ${point.entries}`;
+        container.appendChild(bar);
+    }
+}
+
+function renderProjects(list, projects) {
+    for (const project of projects) {
+        const item = document.createElement('li');
+        item.textContent = `${project.project} (${project.entries})`;
+        list.appendChild(item);
+    }
+}
@@ -89,9 +89,21 @@ async function handleShareEntry(event) {
     }
 }
 
-function handleExportEntry(event) {
+async function handleExportEntry(event) {
+    // Rendered by a background job (jobs.js); downloaded once it has finished
     const entryId = event.target.dataset.entryId;
-    window.open(`/entry/${entryId}/export`, '_blank');
+    const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    try {
+        const job = await startJob(`/entry/${entryId}/export/jobs?timezone=${encodeURIComponent(timezone)}`);
+        if (job.status === 'finished') {
+            window.location.href = job.result_url;
+        } else {
+            showNotification(job.error || 'Failed to export entry', 'error');
+        }
+    } catch (error) {
+        console.error('Export error:', error);
+        showNotification('An error occurred while exporting the entry', 'error');
+    }
 }
 
 function initializeLocationCapture() {
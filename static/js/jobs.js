@@ -0,0 +1,26 @@
+// Background jobs: start one, poll its status until it finishes or fails
+
+const JOB_POLL_INTERVAL_MS = 1500;
+
+async function waitForJob(statusUrl) {
+    while (true) {
+        const response = await fetch(statusUrl, { headers: { 'Accept': 'application/json' } });
+        if (!response.ok) {
+            throw new Error(`Job status request failed (${response.status})`);
+        }
+        const job = await response.json();
+        if (job.status === 'finished' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}
+
+async function startJob(url) {
+    const response = await fetch(url, { method: 'POST', headers: { 'Accept': 'application/json' } });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to start the job');
+    }
+    return waitForJob(data.status_url);
+}
@@ -121,17 +121,17 @@ function updateMediaDisplay(filename) {
 
     if (['jpg', 'jpeg', 'png', 'gif'].includes(fileExtension)) {
         const img = document.createElement('img');
-        img.src = `/static/uploads/${filename}`;
+        img.src = `/media/files/${filename}`;
         img.className = 'w-full h-auto';
         mediaPreview.appendChild(img);
     } else if (fileExtension === 'mp3') {
         const audio = document.createElement('audio');
-        audio.src = `/static/uploads/${filename}`;
+        audio.src = `/media/files/${filename}`;
         audio.controls = true;
         mediaPreview.appendChild(audio);
     } else if (fileExtension === 'mp4') {
         const video = document.createElement('video');
-        video.src = `/static/uploads/${filename}`;
+        video.src = `/media/files/${filename}`;
         video.controls = true;
         video.className = 'w-full h-auto';
         mediaPreview.appendChild(video);
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils import thematic_analysis
+from utils.analysis_cache import MemoryCacheBackend, init_analysis_cache
+from utils.thematic_analysis import perform_incremental_analysis, perform_thematic_analysis
+
+class TestMemoryCacheBackend(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        backend = MemoryCacheBackend(maxsize=2, ttl=60)
+        backend.set('a', '1')
+        backend.set('b', '2')
+        backend.get('a')
+        backend.set('c', '3')
+        self.assertEqual(backend.get('a'), '1')
+        self.assertIsNone(backend.get('b'))
+
+    def test_expired_items_are_misses(self):
+        backend = MemoryCacheBackend(maxsize=2, ttl=-1)
+        backend.set('a', '1')
+        self.assertIsNone(backend.get('a'))
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def run_twice(self):
+        entries = [{'detailed_observation': 'Birds at dawn', 'reflection': 'Calm'}]
+        with patch.object(thematic_analysis, '_request_completion', return_value='themes') as request:
+            first = perform_thematic_analysis(entries)
+            second = perform_thematic_analysis(entries)
+        self.assertEqual(first, second)
+        return request.call_count
+
+    def test_memory_backend_serves_repeat_analysis(self):
+        cache = init_analysis_cache(self.app)
+        self.assertEqual(self.run_twice(), 1)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_sql_backend_serves_repeat_analysis(self):
+        self.app.config['ANALYSIS_CACHE_BACKEND'] = 'sql'
+        cache = init_analysis_cache(self.app)
+        self.assertEqual(self.run_twice(), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_repeat_incremental_merge_is_cached(self):
+        init_analysis_cache(self.app)
+        user = User(username='cached', email='cached@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        for i in range(2):
+            db.session.add(Entry(project='P', title=f'E{i}', detailed_observation=f'obs {i} ' + 'x' * 200,
+                                 reflection='ref', user_id=user.id))
+        db.session.commit()
+
+        with patch.object(thematic_analysis, '_request_completion', side_effect=lambda prompt: 'summary') as request:
+            perform_incremental_analysis(user.id, token_budget=60)
+            db.session.commit()
+            calls = request.call_count
+            perform_incremental_analysis(user.id, token_budget=60)
+        self.assertEqual(calls, 3)
+        self.assertEqual(request.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
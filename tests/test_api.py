@@ -0,0 +1,127 @@
+import unittest
+from datetime import datetime
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Tag
+from utils.queries import QueryCounter
+
+class TestApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        for name in ('mobile', 'other'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password('testpassword')
+            db.session.add(user)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='mobile', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def entry_data(self, i, **extra):
+        return dict(project='Coast', title=f'Entry {i}', detailed_observation=f'Observation {i}', **extra)
+
+    def create_batch(self, count):
+        response = self.client.post('/api/v1/entries/batch',
+                                    json={'entries': [self.entry_data(i, tags=['birds']) for i in range(count)]})
+        self.assertEqual(response.status_code, 201)
+        return [entry['id'] for entry in response.json['entries']]
+
+    def test_requires_login(self):
+        # The pushed app context caches the logged-in user in g; logging out resets it
+        self.client.get('/logout')
+        response = self.app.test_client().get('/api/v1/entries')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json['error'], 'Authentication required')
+
+    def test_batch_create_is_atomic_and_validated(self):
+        response = self.client.post('/api/v1/entries/batch',
+                                    json={'entries': [self.entry_data(1), {'title': 'missing fields'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('project', response.json['errors']['1'])
+        self.assertEqual(Entry.query.count(), 0)
+
+        ids = self.create_batch(5)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(Tag.query.filter_by(name='birds').count(), 1)
+
+    def test_batch_fetch_one_query_and_sparse_fields(self):
+        ids = self.create_batch(10)
+        other = User.query.filter_by(username='other').first()
+        foreign = Entry(project='P', title='Not yours', detailed_observation='x', user_id=other.id)
+        db.session.add(foreign)
+        db.session.commit()
+
+        requested = ids[:3] + [foreign.id]
+        with QueryCounter() as counter:
+            response = self.client.get('/api/v1/entries/batch?ids=' + ','.join(map(str, requested)) +
+                                       '&fields=title,date')
+        self.assertEqual(response.status_code, 200)
+        # session user load + one IN query; no relationship loads for a sparse read
+        self.assertLessEqual(counter.count, 2)
+        self.assertEqual([entry['id'] for entry in response.json['entries']], ids[:3])
+        self.assertEqual(set(response.json['entries'][0]), {'id', 'title', 'date'})
+        self.assertEqual(response.json['missing'], [foreign.id])
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get('/api/v1/entries?fields=title,password_hash')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_update(self):
+        ids = self.create_batch(3)
+        response = self.client.patch('/api/v1/entries/batch', json={'entries': [
+            {'id': ids[0], 'title': 'Renamed', 'tags': ['tides']},
+            {'id': ids[1], 'reflection': 'Later thoughts'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        updated = {entry['id']: entry for entry in response.json['entries']}
+        self.assertEqual(updated[ids[0]]['title'], 'Renamed')
+        self.assertEqual(updated[ids[0]]['tags'], ['tides'])
+        self.assertEqual(updated[ids[0]]['version'], 2)
+        self.assertEqual(updated[ids[1]]['reflection'], 'Later thoughts')
+
+        response = self.client.patch('/api/v1/entries/batch', json={'entries': [{'id': 999999, 'title': 'x'}]})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['missing'], [999999])
+
+    def test_patch_changes_date(self):
+        ids = self.create_batch(2)
+        response = self.client.patch(f'/api/v1/entries/{ids[0]}', json={'date': '2024-03-01T09:30:00+01:00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(db.session.get(Entry, ids[0]).date, datetime(2024, 3, 1, 8, 30))
+
+        response = self.client.patch('/api/v1/entries/batch', json={'entries': [
+            {'id': ids[1], 'date': '2023-12-31T23:00:00'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(db.session.get(Entry, ids[1]).date, datetime(2023, 12, 31, 23, 0))
+
+        response = self.client.patch(f'/api/v1/entries/{ids[0]}', json={'date': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json['errors'])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Entry, ids[0]).date, datetime(2024, 3, 1, 8, 30))
+
+    def test_list_paginates_with_cursor(self):
+        self.create_batch(7)
+        first = self.client.get('/api/v1/entries?per_page=5&fields=title').json
+        self.assertEqual(len(first['entries']), 5)
+        second = self.client.get(f"/api/v1/entries?per_page=5&fields=title&cursor={first['next_cursor']}").json
+        self.assertEqual(len(second['entries']), 2)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_tags_and_delete(self):
+        ids = self.create_batch(2)
+        self.assertEqual([tag['name'] for tag in self.client.get('/api/v1/tags').json['tags']], ['birds'])
+        self.assertEqual(self.client.delete(f'/api/v1/entries/{ids[0]}').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/v1/entries/{ids[0]}').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
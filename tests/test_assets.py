@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import url_for
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Media
+from utils import assets
+from utils.assets import IMMUTABLE_MAX_AGE
+
+SHA = 'ab' * 32
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        with open(os.path.join(self.upload_dir, f'{SHA}.mp3'), 'wb') as f:
+            f.write(bytes(range(256)) * 40)
+        # Audio on a shared entry: public, as the shared page plays it
+        user = User(username='recorder', email='recorder@example.com')
+        user.set_password('testpassword')
+        entry = Entry(project='P', title='Birdsong', detailed_observation='obs', user=user, share_token='song')
+        db.session.add_all([user, entry, Media(filename=f'{SHA}.mp3', media_type='audio', entry=entry)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def static_url(self, filename):
+        with self.app.test_request_context():
+            return url_for('static', filename=filename)
+
+    def test_static_urls_are_fingerprinted_and_immutable(self):
+        url = self.static_url('css/tailwind.css')
+        self.assertRegex(url, r'^/static/css/tailwind\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, IMMUTABLE_MAX_AGE)
+        etag, weak = response.get_etag()
+        self.assertFalse(weak)
+        self.assertIn(etag, url)
+
+        revalidated = self.client.get(url, headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_files_are_hashed_on_first_use_not_at_startup(self):
+        with patch.object(assets, 'file_digest', wraps=assets.file_digest) as digest:
+            app = create_app()
+            digest.assert_not_called()
+            with app.test_request_context():
+                url = url_for('static', filename='css/tailwind.css')
+                url_for('static', filename='css/tailwind.css')
+            self.assertEqual(digest.call_count, 1)
+        self.assertEqual(url, self.static_url('css/tailwind.css'))
+
+        # A fingerprinted link rendered by another worker is resolved without a lookup first
+        response = create_app().test_client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.immutable)
+        stale = url[:-len('.css') - 12] + '0' * 12 + '.css'
+        self.assertEqual(self.client.get(stale).status_code, 404)
+
+    def test_unfingerprinted_static_path_still_served(self):
+        response = self.client.get('/static/css/tailwind.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.cache_control.immutable)
+
+    def test_media_range_request(self):
+        response = self.client.get(f'/media/files/{SHA}.mp3', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], 'bytes 100-199/10240')
+        self.assertEqual(response.data, bytes(range(100, 200)))
+        self.assertTrue(response.cache_control.immutable)
+        self.assertTrue(response.cache_control.public)
+
+    def test_x_accel_redirect_mode(self):
+        self.app.config['STATIC_SENDFILE_MODE'] = 'x-accel'
+        response = self.client.get(f'/media/files/{SHA}.mp3')
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/_internal/uploads/{SHA}.mp3')
+        self.assertEqual(response.data, b'')
+        self.assertEqual(self.client.get('/media/files/missing.mp3').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import select, insert
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils.db_routing import engine_options, REPLICA_BIND
+
+class TestDbRouting(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        replica_url = 'sqlite:///' + os.path.join(self.tmpdir.name, 'replica.db')
+        with patch.dict(os.environ, {'DATABASE_REPLICA_URL': replica_url}):
+            self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.replica = db.engines[REPLICA_BIND]
+        db.metadata.create_all(self.replica)
+
+        self.user = User(username='reader', email='reader@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        db.session.add(Entry(project='P', title='On the primary', detailed_observation='obs', user=self.user))
+        db.session.commit()
+        # The replica has the user but a different entry, so each page shows where it read from
+        with self.replica.begin() as conn:
+            conn.execute(insert(User.__table__).values(id=self.user.id, username='reader', email='reader@example.com',
+                                                       password_hash=self.user.password_hash))
+            conn.execute(insert(Entry.__table__).values(id=1000, project='P', title='On the replica', detailed_observation='obs',
+                                                        user_id=self.user.id, date=self.user.entries[0].date))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.replica.dispose()
+        # The bind's metadata lives on the shared db object; later apps have no replica configured
+        db.metadatas.pop(REPLICA_BIND, None)
+        self.app_context.pop()
+        self.tmpdir.cleanup()
+
+    def test_engine_options(self):
+        self.assertEqual(engine_options('sqlite://', self.app.config), {})
+        options = engine_options('postgresql://u:p@db/app', self.app.config)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'], {'options': '-c statement_timeout=30000'})
+
+    def test_writes_and_locking_reads_use_primary(self):
+        with self.app.test_request_context():
+            from flask import g
+            g.db_use_replica = True
+            self.assertIs(db.session.get_bind(clause=select(Entry)), self.replica)
+            self.assertIsNot(db.session.get_bind(clause=select(Entry).with_for_update()), self.replica)
+            self.assertIsNot(db.session.get_bind(clause=insert(Entry.__table__)), self.replica)
+            g.db_use_replica = False
+            self.assertIsNot(db.session.get_bind(clause=select(Entry)), self.replica)
+
+    def test_read_views_use_replica_until_a_write(self):
+        self.client.post('/login', data=dict(username='reader', password='testpassword'))
+        self.assertIn(b'On the replica', self.client.get('/dashboard').data)
+
+        # A write pins this browser to the primary for REPLICA_STICKY_SECONDS
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.client.post('/entry/new', data=dict(project='P', title='Just saved', detailed_observation='obs', tags=''))
+        page = self.client.get('/dashboard').data
+        self.assertIn(b'Just saved', page)
+        self.assertNotIn(b'On the replica', page)
+
+if __name__ == '__main__':
+    unittest.main()
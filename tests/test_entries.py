@@ -1,9 +1,13 @@
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 from flask import url_for
 from flask_app import create_app
 from flask_app.extensions import db
 from flask_app.models import User, Entry
 from io import BytesIO
+from datetime import datetime
 
 class TestEntriesRoutes(unittest.TestCase):
     def setUp(self):
@@ -27,7 +31,7 @@ class TestEntriesRoutes(unittest.TestCase):
         db.session.add(user)
         db.session.commit()  # Commit to get the user.id
 
-        entry = Entry(title='Test Entry', content='Test Content', user_id=user.id)
+        entry = Entry(project='Test Project', title='Test Entry', detailed_observation='Test Content', user_id=user.id)
         db.session.add(entry)
         db.session.commit()
 
@@ -45,5 +49,44 @@ class TestEntriesRoutes(unittest.TestCase):
             self.assertTrue(response.headers['Content-Disposition'].startswith('attachment; filename=entry_'))
             self.assertGreater(len(response.data), 0)
 
+    def test_export_project(self):
+        user = User(username='reporter', email='reporter@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        for day in range(1, 4):
+            db.session.add(Entry(project='Estuary', title=f'Day {day}', detailed_observation='Herons',
+                                 user_id=user.id, date=datetime(2024, 10, day, 12)))
+        db.session.add(Entry(project='Other', title='Elsewhere', detailed_observation='Gulls',
+                             user_id=user.id, date=datetime(2024, 10, 2, 12)))
+        db.session.commit()
+
+        with self.client:
+            self.client.post('/login', data=dict(
+                username='reporter',
+                password='testpassword'
+            ))
+
+            response = self.client.get('/export/project?project=Estuary&start=2024-10-02&end=2024-10-03&timezone=UTC')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/pdf')
+            self.assertTrue(response.headers['Content-Disposition'].startswith('attachment; filename=Estuary_report'))
+            self.assertTrue(response.data.startswith(b'%PDF'))
+
+    def test_export_project_leaves_no_temp_file(self):
+        user = User(username='reporter', email='reporter@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.add(Entry(project='Estuary', title='Day 1', detailed_observation='Herons', user=user))
+        db.session.commit()
+        self.client.post('/login', data=dict(username='reporter', password='testpassword'))
+
+        with tempfile.TemporaryDirectory() as tmp, patch.object(tempfile, 'tempdir', tmp):
+            response = self.client.head('/export/project?project=Estuary')
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(int(response.headers['Content-Length']), 0)
+            response.close()
+            self.assertEqual(os.listdir(tmp), [])
+
 if __name__ == '__main__':
     unittest.main()
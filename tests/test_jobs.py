@@ -0,0 +1,117 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Job, AnalysisResult
+from utils import thematic_analysis
+
+class TestJobRoutes(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['JOB_EXECUTOR'] = 'inline'
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='jobuser', email='jobs@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        self.entry = Entry(project='Site A', title='Morning walk', detailed_observation='Birds at dawn',
+                           reflection='Calm', user_id=self.user.id)
+        db.session.add(self.entry)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='jobuser', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_analysis_job_stores_analysis_result(self):
+        with patch.object(thematic_analysis, '_complete', return_value='Themes: dawn'):
+            response = self.client.post('/analyze/jobs')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'finished')
+
+        result = self.client.get(status['result_url']).get_json()
+        self.assertEqual(result['content'], 'Themes: dawn')
+        self.assertEqual(AnalysisResult.query.filter_by(user_id=self.user.id).count(), 1)
+
+    def test_export_job_returns_pdf(self):
+        response = self.client.post(f'/entry/{self.entry.id}/export/jobs?timezone=UTC')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        response = self.client.get(f'/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/pdf')
+        self.assertTrue(response.data.startswith(b'%PDF'))
+
+    def test_jobs_without_a_result_have_no_download(self):
+        job = Job(id='b' * 32, user_id=self.user.id, kind='media_renditions', status='finished')
+        db.session.add(job)
+        db.session.commit()
+        self.assertNotIn('result_url', self.client.get(f'/jobs/{job.id}').get_json())
+        response = self.client.get(f'/jobs/{job.id}/result')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.mimetype, 'application/json')
+
+    def test_stale_jobs_are_failed_by_the_cli(self):
+        now = datetime.utcnow()
+        db.session.add_all([
+            Job(id='c' * 32, user_id=self.user.id, kind='analysis', status='running',
+                created_at=now - timedelta(hours=3), started_at=now - timedelta(hours=2)),
+            Job(id='d' * 32, user_id=self.user.id, kind='analysis', status='queued', created_at=now - timedelta(hours=2)),
+            Job(id='e' * 32, user_id=self.user.id, kind='analysis', status='running',
+                created_at=now - timedelta(hours=2), started_at=now - timedelta(minutes=5)),
+        ])
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['fail-stale-jobs'])
+        self.assertIn('Marked 2 stale jobs', result.output)
+        statuses = {job.id[0]: job.status for job in Job.query.all()}
+        self.assertEqual(statuses, {'c': 'failed', 'd': 'failed', 'e': 'running'})
+        status = self.client.get(f"/jobs/{'c' * 32}").get_json()
+        self.assertIn('Interrupted', status['error'])
+
+    def test_analyze_page_queues_a_job(self):
+        with patch.object(thematic_analysis, '_complete', return_value='Themes: dusk'):
+            response = self.client.post('/analyze')
+        self.assertEqual(response.status_code, 302)
+        job = Job.query.filter_by(user_id=self.user.id, kind='analysis').one()
+        self.assertIn(f'job={job.id}', response.headers['Location'])
+        self.assertIn(b'Themes: dusk', self.client.get(response.headers['Location']).data)
+
+    def test_pending_analysis_page_polls(self):
+        job = Job(id='f' * 32, user_id=self.user.id, kind='analysis', status='running')
+        db.session.add(job)
+        db.session.commit()
+        page = self.client.get(f'/analyze?job={job.id}').data
+        self.assertIn(b'Analysis in progress', page)
+        self.assertIn(f'/jobs/{job.id}'.encode(), page)
+        self.assertNotIn(b'Start New Analysis', page)
+
+    def test_failed_job_records_error(self):
+        with patch.object(thematic_analysis, '_complete', side_effect=RuntimeError('model unavailable')):
+            job_id = self.client.post('/analyze/jobs').get_json()['job_id']
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('model unavailable', status['error'])
+        self.assertEqual(self.client.get(f'/jobs/{job_id}/result').status_code, 409)
+
+    def test_other_users_cannot_poll_job(self):
+        job = Job(id='a' * 32, user_id=self.user.id + 100, kind='analysis', status='queued')
+        db.session.add(job)
+        db.session.commit()
+        self.assertEqual(self.client.get(f'/jobs/{job.id}').status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
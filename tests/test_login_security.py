@@ -0,0 +1,112 @@
+import os
+import unittest
+from unittest.mock import patch
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, LoginAttempt
+from utils.rate_limit import init_login_limiter, MemoryRateLimitBackend
+
+class TestLoginSecurity(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['LOGIN_MAX_ATTEMPTS_PER_USERNAME'] = 3
+        self.app.config['LOGIN_MAX_ATTEMPTS_PER_IP'] = 5
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='guarded', email='guarded@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, username='guarded', password='testpassword'):
+        return self.client.post('/login', data=dict(username=username, password=password))
+
+    def test_rehash_on_login_when_policy_changes(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        self.user.set_password('testpassword')
+        db.session.commit()
+        self.assertFalse(self.user.password_needs_rehash())
+
+        self.app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+        self.assertTrue(self.user.password_needs_rehash())
+        self.assertEqual(self.login().status_code, 302)
+        db.session.refresh(self.user)
+        self.assertTrue(self.user.password_hash.startswith('scrypt:32768:8:1$'))
+        self.assertFalse(self.user.password_needs_rehash())
+
+    def test_username_is_throttled_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong').status_code, 200)
+        with patch.object(User, 'check_password') as check_password:
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        check_password.assert_not_called()
+
+    def test_success_resets_the_username_counter(self):
+        self.login(password='wrong')
+        self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 302)
+        self.client.get('/logout')
+        self.assertEqual(self.login(password='wrong').status_code, 200)
+
+    def test_ip_is_throttled_across_usernames(self):
+        for i in range(5):
+            self.assertEqual(self.login(username=f'stuffed{i}', password='wrong').status_code, 200)
+        self.assertEqual(self.login(username='stuffed99', password='wrong').status_code, 429)
+
+    def test_successful_logins_dont_count_against_the_ip(self):
+        for _ in range(6):
+            self.assertEqual(self.login().status_code, 302)
+            self.client.get('/logout')
+        self.assertEqual(self.login(username='someone', password='wrong').status_code, 200)
+
+    def test_forwarded_clients_are_throttled_separately(self):
+        with patch.dict(os.environ, {'PROXY_FIX_X_FOR': '1'}):
+            app = create_app()
+        app.config['TESTING'] = True
+        app.config['LOGIN_MAX_ATTEMPTS_PER_IP'] = 5
+        client = app.test_client()
+
+        def login(address):
+            return client.post('/login', data=dict(username=f'nobody-{address}', password='wrong'),
+                               headers={'X-Forwarded-For': address})
+        with app.app_context():
+            db.create_all()
+            for _ in range(5):
+                self.assertEqual(login('203.0.113.1').status_code, 200)
+            self.assertEqual(login('203.0.113.1').status_code, 429)
+            self.assertEqual(login('203.0.113.2').status_code, 200)
+            db.drop_all()
+
+    def test_sql_backend(self):
+        self.app.config['LOGIN_RATE_LIMIT_BACKEND'] = 'sql'
+        init_login_limiter(self.app)
+        for _ in range(3):
+            self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(LoginAttempt.query.filter_by(key='user:guarded').count(), 3)
+
+    def test_memory_backend_drops_idle_keys_as_it_goes(self):
+        limiter = MemoryRateLimitBackend()
+        with patch('utils.rate_limit.time.monotonic', return_value=1000.0):
+            limiter.add(['ip:a', 'ip:b'], 60)
+        with patch('utils.rate_limit.time.monotonic', return_value=1030.0):
+            limiter.add(['ip:a', 'ip:c'], 60)
+        with patch('utils.rate_limit.time.monotonic', return_value=1070.0):
+            limiter.add(['ip:d'], 60)
+        # b's only hit has left the window; a was hit again and still counts
+        self.assertEqual(list(limiter._hits), ['ip:a', 'ip:c', 'ip:d'])
+        self.assertEqual(list(limiter._hits['ip:a']), [1000.0, 1030.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Media
+from utils.jobs import job_queue
+from utils.media_pipeline import RENDITION_SIZES, rendition_url
+
+class TestMediaPipeline(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['JOB_EXECUTOR'] = 'inline'
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(username='photographer', email='photographer@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        self.entry = Entry(project='P', title='Photos', detailed_observation='obs', user_id=user.id)
+        db.session.add(self.entry)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def add_photo(self, filename, size=(3000, 2000), exif=True):
+        image = Image.new('RGB', size, (40, 120, 200))
+        kwargs = {}
+        if exif:
+            tags = Image.Exif()
+            tags[0x010F] = 'FieldCam'  # Make
+            kwargs['exif'] = tags
+        image.save(os.path.join(self.upload_dir, filename), 'JPEG', **kwargs)
+        media = Media(filename=filename, entry_id=self.entry.id, media_type='image')
+        db.session.add(media)
+        db.session.commit()
+        return media
+
+    def test_renditions_are_sized_and_stripped(self):
+        media = self.add_photo('site.jpg')
+        job = job_queue.enqueue('media_renditions', self.entry.user_id, media_id=media.id)
+        self.assertEqual(job.status, 'finished')
+
+        media = db.session.get(Media, media.id)
+        self.assertEqual(media.processing_status, 'ready')
+        for name, longest_edge in RENDITION_SIZES.items():
+            for key in (name, f'{name}_webp'):
+                rendition = media.rendition(key)
+                self.assertEqual(max(rendition['width'], rendition['height']), longest_edge)
+                with Image.open(os.path.join(self.upload_dir, rendition['filename'])) as image:
+                    self.assertEqual(len(image.getexif()), 0)
+        self.assertTrue(media.rendition('thumb_webp')['filename'].endswith('.webp'))
+
+    def test_ready_renditions_move_the_entry_to_a_new_version(self):
+        media = self.add_photo('export.jpg', exif=False)
+        version = self.entry.version
+        with mock.patch('utils.pdf_cache.invalidate_entry_pdfs') as invalidate:
+            job_queue.enqueue('media_renditions', self.entry.user_id, media_id=media.id)
+        invalidate.assert_called_once_with(self.entry.id)
+        self.assertEqual(db.session.get(Entry, self.entry.id).version, version + 1)
+
+    def test_url_falls_back_to_original_until_ready(self):
+        media = self.add_photo('pending.jpg', exif=False)
+        with self.app.test_request_context():
+            self.assertTrue(rendition_url(media, 'thumb').endswith('/media/files/pending.jpg'))
+            media.renditions = {'thumb': {'filename': 'pending.thumb.jpg'}}
+            self.assertTrue(rendition_url(media, 'thumb').endswith('/media/files/pending.thumb.jpg'))
+
+    def test_unreadable_upload_marks_media_failed(self):
+        with open(os.path.join(self.upload_dir, 'broken.jpg'), 'wb') as f:
+            f.write(b'not an image')
+        media = Media(filename='broken.jpg', entry_id=self.entry.id, media_type='image')
+        db.session.add(media)
+        db.session.commit()
+        job = job_queue.enqueue('media_renditions', self.entry.user_id, media_id=media.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(db.session.get(Media, media.id).processing_status, 'failed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+from sqlalchemy.exc import SQLAlchemyError
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Media, MediaBlob, UploadSession
+from utils.media_storage import release_media, reclaim_blobs
+
+def png_bytes(color=(10, 200, 30)):
+    buffer = io.BytesIO()
+    # Noise keeps the file above the 1 KB upload minimum
+    image = Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3))
+    image.putpixel((0, 0), color)
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class TestMediaStorage(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['JOB_EXECUTOR'] = 'inline'
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        self.app.config['UPLOAD_STAGING_DIR'] = os.path.join(self.upload_dir, 'staging')
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(username='uploader', email='uploader@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        self.entries = [Entry(project='P', title=f'Entry {i}', detailed_observation='obs', user_id=user.id)
+                        for i in range(2)]
+        db.session.add_all(self.entries)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='uploader', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def upload(self, entry, data, filename='photo.png'):
+        return self.client.post(f'/media/upload/{entry.id}', data={'file': (io.BytesIO(data), filename)},
+                                content_type='multipart/form-data')
+
+    def stored_files(self):
+        # Originals are <sha256>.<ext>; renditions add a size segment (<sha256>.thumb.jpg)
+        return [name for name in os.listdir(self.upload_dir) if name.count('.') == 1]
+
+    def test_identical_uploads_share_one_blob(self):
+        data = png_bytes()
+        first = self.upload(self.entries[0], data, 'a.png')
+        second = self.upload(self.entries[1], data, 'b.png')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(first.json['sha256'], second.json['sha256'])
+
+        blob = db.session.get(MediaBlob, first.json['sha256'])
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(self.stored_files(), [blob.filename])
+        self.assertFalse([name for name in os.listdir(self.upload_dir) if name.endswith('.part')])
+
+    def test_same_bytes_under_another_extension_reuse_the_blob_file(self):
+        data = png_bytes()
+        first = self.upload(self.entries[0], data, 'a.png')
+        second = self.upload(self.entries[1], data, 'b.jpeg')
+        self.assertEqual(first.json['filename'], second.json['filename'])
+        self.assertTrue(first.json['filename'].endswith('.png'))
+        self.assertEqual(self.stored_files(), [first.json['filename']])
+
+        for entry in self.entries[:2]:
+            self.client.post(f'/entry/{entry.id}/delete')
+        self.assertEqual(self.stored_files(), [])
+
+    def test_blob_is_deleted_with_last_reference(self):
+        data = png_bytes()
+        sha256 = self.upload(self.entries[0], data).json['sha256']
+        self.upload(self.entries[1], data)
+        path = os.path.join(self.upload_dir, db.session.get(MediaBlob, sha256).filename)
+
+        self.client.post(f'/entry/{self.entries[0].id}/delete')
+        db.session.expire_all()
+        self.assertEqual(db.session.get(MediaBlob, sha256).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        self.client.post(f'/entry/{self.entries[1].id}/delete')
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(MediaBlob, sha256))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(Media.query.count(), 0)
+
+    def test_blob_referenced_again_before_reclaim_is_kept(self):
+        data = png_bytes()
+        sha256 = self.upload(self.entries[0], data).json['sha256']
+        path = os.path.join(self.upload_dir, db.session.get(MediaBlob, sha256).filename)
+
+        # The last reference is dropped, but another upload of the same bytes commits before
+        # the releasing request gets round to deleting the file
+        entry = db.session.get(Entry, self.entries[0].id)
+        released = release_media(entry.media[0])
+        db.session.delete(entry)
+        db.session.commit()
+        self.assertEqual(released, [sha256])
+        self.assertEqual(self.upload(self.entries[1], data).status_code, 201)
+
+        reclaim_blobs(released, self.upload_dir)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(MediaBlob, sha256).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+    def test_failed_commit_leaves_no_file(self):
+        with mock.patch.object(Entry, 'bump_version', side_effect=SQLAlchemyError('boom')):
+            response = self.upload(self.entries[0], png_bytes())
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        self.assertEqual(MediaBlob.query.count(), 0)
+
+    def test_rejects_unsupported_content(self):
+        response = self.upload(self.entries[0], b'#!/bin/sh\necho hi\n' * 200, 'script.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        self.assertEqual(MediaBlob.query.count(), 0)
+
+    def start_resumable(self, data, filename='recording.png'):
+        response = self.client.post(f'/media/upload/{self.entries[0].id}/resumable',
+                                    json={'filename': filename, 'size': len(data)})
+        self.assertEqual(response.status_code, 201)
+        return response.json
+
+    def put_chunk(self, upload, chunk, offset):
+        return self.client.put(upload['upload_url'], data=chunk, headers={'Upload-Offset': str(offset)})
+
+    def test_resumable_upload_in_chunks(self):
+        data = png_bytes()
+        upload = self.start_resumable(data)
+        step = len(data) // 3 + 1
+        for offset in range(0, len(data), step):
+            response = self.put_chunk(upload, data[offset:offset + step], offset)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['offset'], min(offset + step, len(data)))
+
+        response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 201)
+        blob = db.session.get(MediaBlob, response.json['sha256'])
+        with open(os.path.join(self.upload_dir, blob.filename), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(UploadSession.query.count(), 0)
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_STAGING_DIR']), [])
+
+    def test_resume_after_interrupted_chunk(self):
+        data = png_bytes()
+        upload = self.start_resumable(data)
+        self.put_chunk(upload, data[:2000], 0)
+
+        # A retry at a stale offset is refused and told where to resume
+        response = self.put_chunk(upload, data[:2000], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(upload['upload_url']).json['offset'], 2000)
+        self.assertEqual(self.client.post(upload['finalize_url']).status_code, 409)
+
+        self.put_chunk(upload, data[2000:], 2000)
+        response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 201)
+
+    def test_resumable_rejects_bad_first_chunk(self):
+        data = b'#!/bin/sh\necho hi\n' * 200
+        upload = self.start_resumable(data)
+        response = self.put_chunk(upload, data[:1024], 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(upload['upload_url']).json['offset'], 0)
+
+    def test_chunk_past_declared_size_is_rejected(self):
+        data = png_bytes()
+        upload = self.start_resumable(data)
+        response = self.put_chunk(upload, data + b'extra', 0)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.client.get(upload['upload_url']).json['offset'], 0)
+
+    def test_chunk_larger_than_chunk_size_is_rejected(self):
+        chunk_size = 5 * 1024 * 1024
+        data = png_bytes() + bytes(chunk_size)
+        upload = self.start_resumable(data)
+        self.assertEqual(upload['chunk_size'], chunk_size)
+        response = self.put_chunk(upload, data[:chunk_size + 1], 0)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json['max_bytes'], chunk_size)
+        self.assertEqual(self.put_chunk(upload, data[:chunk_size], 0).status_code, 200)
+
+    def test_finalize_after_entry_deleted(self):
+        data = png_bytes()
+        upload = self.start_resumable(data)
+        self.put_chunk(upload, data, 0)
+        db.session.delete(self.entries[0])
+        db.session.commit()
+
+        response = self.client.post(upload['finalize_url'])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(UploadSession.query.count(), 0)
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_STAGING_DIR']), [])
+        self.assertEqual(MediaBlob.query.count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
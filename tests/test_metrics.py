@@ -0,0 +1,74 @@
+import unittest
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils.metrics import Histogram
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['METRICS_TOKEN'] = 'scrape-me'
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='timed', email='timed@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='timed', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def scrape(self):
+        return self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('t_seconds', 'test', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, 'a')
+        lines = histogram.render()
+        self.assertIn('t_seconds_bucket{endpoint="a",le="0.1"} 1', lines)
+        self.assertIn('t_seconds_bucket{endpoint="a",le="1.0"} 2', lines)
+        self.assertIn('t_seconds_bucket{endpoint="a",le="+Inf"} 3', lines)
+        self.assertIn('t_seconds_count{endpoint="a"} 3', lines)
+
+    def test_requests_are_timed_with_their_queries(self):
+        db.session.add(Entry(project='P', title='Timed', detailed_observation='obs', user_id=self.user.id))
+        db.session.commit()
+        response = self.client.get('/dashboard')
+        self.assertRegex(response.headers['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+        text = self.scrape().get_data(as_text=True)
+        self.assertIn('fieldscribe_http_requests_total{endpoint="entries.dashboard",method="GET",status="200"} 1', text)
+        self.assertIn('fieldscribe_http_request_duration_seconds_count{endpoint="entries.dashboard",method="GET"} 1',
+                      text)
+        self.assertIn('fieldscribe_http_request_queries_bucket{endpoint="entries.dashboard",le="+Inf"} 1', text)
+
+    def test_slow_queries_and_requests_are_logged(self):
+        self.app.config['SLOW_QUERY_MS'] = 0
+        self.app.config['SLOW_REQUEST_MS'] = 0
+        with self.assertLogs('fieldscribe.slow', level='WARNING') as logs:
+            self.client.get('/dashboard')
+        events = [line for line in logs.output if '"entries.dashboard"' in line]
+        self.assertTrue(any('"event": "slow_query"' in line and 'FROM entry' in line for line in events))
+        self.assertTrue(any('"event": "slow_request"' in line for line in events))
+        self.assertIn('fieldscribe_sql_slow_queries_total{endpoint="entries.dashboard"}',
+                      self.scrape().get_data(as_text=True))
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        self.assertEqual(self.scrape().status_code, 200)
+
+    def test_metrics_hidden_without_token(self):
+        self.app.config['METRICS_TOKEN'] = ''
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
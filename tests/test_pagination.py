@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime, timedelta
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils.pagination import keyset_paginate, decode_cursor, encode_cursor, InvalidCursor, MAX_PER_PAGE
+
+class TestKeysetPagination(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='pager', email='pager@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        base = datetime(2024, 10, 1)
+        # Pairs of entries share a timestamp so the id tiebreaker matters
+        for i in range(11):
+            db.session.add(Entry(project='P', title=f'Entry {i}', detailed_observation='obs',
+                                 user_id=self.user.id, date=base + timedelta(hours=i // 2)))
+        db.session.commit()
+        self.query = Entry.query.filter_by(user_id=self.user.id)
+        self.expected = [e.id for e in self.query.order_by(Entry.date.desc(), Entry.id.desc())]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_walks_forward_and_back_without_gaps(self):
+        seen = []
+        pages = []
+        cursor = None
+        while True:
+            page = keyset_paginate(self.query, (Entry.date, Entry.id), cursor=cursor, per_page=4)
+            pages.append(page)
+            seen.extend(e.id for e in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(pages[0].has_prev)
+
+        back = keyset_paginate(self.query, (Entry.date, Entry.id), cursor=pages[-1].prev_cursor, per_page=4)
+        self.assertEqual([e.id for e in back], [e.id for e in pages[-2]])
+
+    def test_per_page_is_clamped(self):
+        page = keyset_paginate(self.query, (Entry.date, Entry.id), per_page=100000)
+        self.assertEqual(page.per_page, MAX_PER_PAGE)
+
+    def test_optional_count(self):
+        page = keyset_paginate(self.query, (Entry.date, Entry.id), per_page=2, with_count=True)
+        self.assertEqual(page.total, 11)
+        self.assertIsNone(keyset_paginate(self.query, (Entry.date, Entry.id), per_page=2).total)
+
+    def test_cursor_round_trip_and_rejection(self):
+        when = datetime(2024, 10, 1, 12, 30)
+        self.assertEqual(decode_cursor(encode_cursor('next', [when, 7])), ('next', [when, 7]))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_dashboard_rejects_bad_cursor(self):
+        self.client.post('/login', data=dict(username='pager', password='testpassword'))
+        self.assertEqual(self.client.get('/dashboard?cursor=garbage').status_code, 400)
+        response = self.client.get('/dashboard?per_page=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'cursor=', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils import pdf_cache
+from utils.pdf_cache import PDFCache, init_pdf_cache
+
+class TestPDFCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_disk_hit_after_memory_eviction(self):
+        cache = PDFCache(cache_dir=self.cache_dir, memory_bytes=10, disk_bytes=1024)
+        cache.set(1, 1, 'UTC', b'%PDF-first')
+        cache.set(2, 1, 'UTC', b'%PDF-other')
+        self.assertEqual(cache.get(1, 1, 'UTC'), b'%PDF-first')
+
+    def test_disk_is_size_bounded(self):
+        cache = PDFCache(cache_dir=self.cache_dir, memory_bytes=0, disk_bytes=250)
+        for entry_id in range(5):
+            cache.set(entry_id, 1, 'UTC', b'x' * 100)
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, name)) for name in os.listdir(self.cache_dir)]
+        self.assertLessEqual(sum(sizes), 250)
+        self.assertIsNotNone(cache.get(4, 1, 'UTC'))
+
+    def test_invalidate_removes_every_version_and_timezone(self):
+        cache = PDFCache(cache_dir=self.cache_dir)
+        cache.set(7, 1, 'UTC', b'a')
+        cache.set(7, 2, 'Asia/Manila', b'b')
+        cache.set(70, 1, 'UTC', b'c')
+        cache.invalidate(7)
+        self.assertIsNone(cache.get(7, 1, 'UTC'))
+        self.assertIsNone(cache.get(7, 2, 'Asia/Manila'))
+        self.assertEqual(cache.get(70, 1, 'UTC'), b'c')
+
+class TestExportCaching(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['PDF_CACHE_DIR'] = self.cache_dir
+        init_pdf_cache(self.app)
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(username='exporter', email='exporter@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        self.entry = Entry(project='Site A', title='Survey', detailed_observation='Tide pools', user_id=user.id)
+        db.session.add(self.entry)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='exporter', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.cache_dir)
+
+    def test_repeat_export_is_served_from_cache(self):
+        with patch.object(pdf_cache, 'generate_pdf', wraps=pdf_cache.generate_pdf) as build:
+            first = self.client.get(f'/entry/{self.entry.id}/export?timezone=UTC')
+            second = self.client.get(f'/entry/{self.entry.id}/export?timezone=UTC')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(build.call_count, 1)
+
+    def test_edit_rebuilds_export(self):
+        with patch.object(pdf_cache, 'generate_pdf', wraps=pdf_cache.generate_pdf) as build:
+            self.client.get(f'/entry/{self.entry.id}/export?timezone=UTC')
+            self.client.post(f'/entry/{self.entry.id}/edit', data=dict(
+                project='Site A', title='Survey', detailed_observation='Tide pools at noon', tags=''))
+            self.client.get(f'/entry/{self.entry.id}/export?timezone=UTC')
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(db.session.get(Entry, self.entry.id).version, 2)
+
+if __name__ == '__main__':
+    unittest.main()
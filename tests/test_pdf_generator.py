@@ -1,5 +1,12 @@
+import os
+import subprocess
+import sys
 import unittest
-from utils.pdf_generator import generate_pdf
+from io import BytesIO
+from unittest.mock import patch
+from reportlab.platypus import Flowable
+from utils import pdf_generator
+from utils.pdf_generator import generate_pdf, generate_report
 from flask_app.models import Entry
 from datetime import datetime
 
@@ -9,7 +16,7 @@ class TestPDFGenerator(unittest.TestCase):
         entry = Entry(
             id=1,
             title="Test Entry",
-            content="This is a test entry content.",
+            detailed_observation="This is a test entry content.",
             date=datetime.utcnow(),
             location="Test Location"
         )
@@ -24,5 +31,50 @@ class TestPDFGenerator(unittest.TestCase):
         # Check if PDF starts with the correct header
         self.assertTrue(pdf_content.startswith(b'%PDF'))
 
+    def test_generate_report_consumes_entries_lazily(self):
+        events = []
+
+        def entries():
+            for i in range(30):
+                events.append(('pulled', i))
+                yield Entry(id=i, title=f"Entry {i}", detailed_observation="Observation " * 50,
+                            date=datetime.utcnow()), []
+
+        class Marker(Flowable):
+            def __init__(self, entry_id):
+                super().__init__()
+                self.entry_id = entry_id
+
+            def wrap(self, *args):
+                return 0, 0
+
+            def draw(self):
+                events.append(('drawn', self.entry_id))
+
+        def laid_out(entry, *args, **kwargs):
+            events.append(('laid out', entry.id))
+            return entry_flowables(entry, *args, **kwargs) + [Marker(entry.id)]
+
+        entry_flowables = pdf_generator.entry_flowables
+        output = BytesIO()
+        with patch.object(pdf_generator, 'entry_flowables', side_effect=laid_out):
+            generate_report(entries(), output, "UTC", "Project report")
+
+        # Each entry is drawn before the next one is pulled
+        expected = [event for i in range(30) for event in (('pulled', i), ('laid out', i), ('drawn', i))]
+        self.assertEqual(events, expected)
+        self.assertTrue(output.getvalue().startswith(b'%PDF'))
+
+    def test_generate_report_without_entries(self):
+        output = BytesIO()
+        generate_report(iter([]), output, "UTC", "Empty report")
+        self.assertTrue(output.getvalue().startswith(b'%PDF'))
+
+    def test_app_startup_does_not_import_reportlab(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = "import sys, main; print(any(name.startswith('reportlab') for name in sys.modules))"
+        result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Tag, Media
+from utils.queries import QueryCounter
+
+# Statements a page may issue regardless of how many entries it shows:
+# server-side session load, session user load, page of entries, one selectin per relationship
+MAX_DASHBOARD_QUERIES = 5
+MAX_ENTRY_DETAIL_QUERIES = 5
+MAX_ADMIN_QUERIES = 3
+
+class TestQueryCounts(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='counter', email='counter@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_entries(self, count):
+        tags = [Tag(name=f'tag{i}') for i in range(3)]
+        entries = []
+        for i in range(count):
+            entry = Entry(project='P', title=f'Entry {i}', detailed_observation='obs', user_id=self.user.id)
+            entry.tags.extend(tags)
+            entry.media.append(Media(filename=f'photo{i}.jpg', media_type='image'))
+            db.session.add(entry)
+            entries.append(entry)
+        db.session.commit()
+        return entries
+
+    def login(self, username='counter'):
+        # Following the redirect shows the login flash, so the measured requests don't save the session
+        self.client.post('/login', data=dict(username=username, password='testpassword'), follow_redirects=True)
+
+    def dashboard_query_count(self, per_page):
+        with QueryCounter(max_queries=MAX_DASHBOARD_QUERIES) as counter:
+            response = self.client.get(f'/dashboard?per_page={per_page}')
+        self.assertEqual(response.status_code, 200)
+        return counter.count
+
+    def test_dashboard_queries_do_not_grow_with_page_size(self):
+        self.add_entries(20)
+        self.login()
+        self.assertEqual(self.dashboard_query_count(3), self.dashboard_query_count(20))
+
+    def test_entry_detail_is_bounded(self):
+        entry = self.add_entries(1)[0]
+        self.login()
+        with QueryCounter(max_queries=MAX_ENTRY_DETAIL_QUERIES):
+            response = self.client.get(f'/entry/{entry.id}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_entry_list_is_bounded(self):
+        self.add_entries(10)
+        self.user.is_admin = True
+        db.session.commit()
+        self.login()
+        with QueryCounter(max_queries=MAX_ADMIN_QUERIES):
+            response = self.client.get('/admin/manage_entries')
+        self.assertEqual(response.status_code, 200)
+
+    def test_counter_fails_when_limit_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with QueryCounter(max_queries=1):
+                User.query.all()
+                Entry.query.all()
+
+if __name__ == '__main__':
+    unittest.main()
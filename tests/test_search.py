@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Tag
+from utils.search import search_entries
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='searcher', email='searcher@example.com')
+        self.user.set_password('testpassword')
+        other = User(username='other', email='other@example.com')
+        other.set_password('testpassword')
+        db.session.add_all([self.user, other])
+        db.session.commit()
+
+        birds = Tag(name='birds')
+        self.title_hit = Entry(project='Estuary', title='Heron survey', detailed_observation='Counted waders at low tide',
+                               user_id=self.user.id, date=datetime(2024, 10, 1))
+        self.title_hit.tags.append(birds)
+        self.body_hit = Entry(project='Forest', title='Canopy walk', detailed_observation='A heron flew over the ridge',
+                              user_id=self.user.id, date=datetime(2024, 10, 5))
+        self.miss = Entry(project='Estuary', title='Mudflats', detailed_observation='Crabs everywhere',
+                          user_id=self.user.id, date=datetime(2024, 10, 3))
+        foreign = Entry(project='Estuary', title='Heron nest', detailed_observation='heron heron',
+                        user_id=other.id, date=datetime(2024, 10, 2))
+        db.session.add_all([self.title_hit, self.body_hit, self.miss, foreign])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def ids(self, **kwargs):
+        return [entry.id for entry in search_entries(self.user.id, **kwargs)]
+
+    def test_ranked_and_scoped_to_user(self):
+        self.assertEqual(self.ids(q='herons'), [self.title_hit.id, self.body_hit.id])
+
+    def test_filters(self):
+        self.assertEqual(self.ids(q='heron', project='Forest'), [self.body_hit.id])
+        self.assertEqual(self.ids(q='heron', tag='birds'), [self.title_hit.id])
+        self.assertEqual(self.ids(q='heron', start=datetime(2024, 10, 2)), [self.body_hit.id])
+        self.assertEqual(self.ids(q='heron', end=datetime(2024, 10, 1)), [self.title_hit.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.miss.reflection = 'An egret, maybe a heron'
+        db.session.commit()
+        self.assertIn(self.miss.id, self.ids(q='heron'))
+
+        db.session.delete(self.body_hit)
+        db.session.commit()
+        self.assertEqual(self.ids(q='ridge'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.ids(q='heron" OR (crabs'), [])
+        self.assertEqual(self.ids(q='***'), [])
+
+    def test_api(self):
+        self.client.post('/login', data=dict(username='searcher', password='testpassword'))
+        response = self.client.get('/api/search?q=heron&project=Estuary')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.get_json()['results']], [self.title_hit.id])
+        self.assertEqual(self.client.get('/api/search').status_code, 400)
+        self.assertEqual(self.client.get('/search?q=heron').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
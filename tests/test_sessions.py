@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import pytz
+from flask import g, url_for
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, SessionRecord
+from utils.queries import QueryCounter
+from utils.sessions import init_sessions, get_session_store, purge_expired_sessions, session_key
+
+class SessionTestMixin:
+    backend = 'sql'
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.session_dir = tempfile.mkdtemp()
+        self.app.config['SESSION_BACKEND'] = self.backend
+        self.app.config['SESSION_FILE_DIR'] = self.session_dir
+        init_sessions(self.app)
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='sessioned', email='sessioned@example.com')
+        self.user.set_password('testpassword')
+        self.admin = User(username='boss', email='boss@example.com', is_admin=True)
+        self.admin.set_password('testpassword')
+        db.session.add_all([self.user, self.admin])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+
+    def login(self, client, username='sessioned'):
+        # Requests share the test's app context, so drop the user flask-login cached in g
+        g.pop('_login_user', None)
+        return client.post('/login', data=dict(username=username, password='testpassword'), follow_redirects=True)
+
+    def session_id(self, client):
+        cookie = client.get_cookie(self.app.config['SESSION_COOKIE_NAME'])
+        return cookie.value if cookie else None
+
+    def test_responses_that_ignore_the_session_do_not_vary_on_cookie(self):
+        db.session.add(Entry(project='P', title='Shared', detailed_observation='obs', user_id=self.user.id,
+                             share_token='vary-token'))
+        db.session.commit()
+        self.login(self.client)
+        with self.app.test_request_context():
+            asset = url_for('static', filename='css/tailwind.css')
+
+        for url in (asset, '/shared/vary-token'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('cookie', {header.lower() for header in response.vary}, url)
+        self.assertIn('Cookie', self.client.get('/dashboard').vary)
+
+    def test_cookie_holds_only_the_session_id(self):
+        self.assertIsNone(self.session_id(self.client))
+        self.login(self.client)
+        sid = self.session_id(self.client)
+        self.assertEqual(len(sid), 43)
+        data, user_id, _ = get_session_store().load(session_key(sid))
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(data['_user_id'], str(self.user.id))
+        self.assertEqual(self.client.get('/dashboard').status_code, 200)
+
+    def test_login_rotates_the_session_id(self):
+        with self.client.session_transaction() as session:
+            session['planted'] = True
+        before = self.session_id(self.client)
+        self.assertIsNotNone(before)
+        self.login(self.client)
+        after = self.session_id(self.client)
+        self.assertNotEqual(before, after)
+        self.assertIsNone(get_session_store().load(session_key(before)))
+
+    def test_admin_can_revoke_sessions(self):
+        self.login(self.client)
+        other_device = self.app.test_client()
+        self.login(other_device)
+        admin = self.app.test_client()
+        self.login(admin, 'boss')
+
+        response = admin.post(f'/admin/users/{self.user.id}/revoke_sessions', follow_redirects=True)
+        self.assertIn(b'out of 2 session(s)', response.data)
+        for client in (self.client, other_device):
+            g.pop('_login_user', None)
+            response = client.get('/dashboard')
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/login', response.headers['Location'])
+        g.pop('_login_user', None)
+        self.assertEqual(admin.get('/admin/manage_users').status_code, 200)
+
+    def test_expired_sessions_are_purged_in_batches(self):
+        store = get_session_store()
+        now = datetime.now(pytz.UTC).replace(tzinfo=None)
+        for i in range(5):
+            store.save(session_key(f'expired-{i}'), {'n': i}, None, now - timedelta(minutes=1))
+        store.save(session_key('live'), {'n': 'live'}, None, now + timedelta(hours=1))
+        self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+        self.assertIsNone(store.load(session_key('expired-0')))
+        self.assertEqual(store.load(session_key('live'))[0], {'n': 'live'})
+
+class TestSQLSessions(SessionTestMixin, unittest.TestCase):
+    def test_requests_that_do_not_touch_the_session_skip_the_store(self):
+        self.login(self.client)
+        with QueryCounter() as counter:
+            self.assertEqual(self.client.get('/static/js/admin_stats.js').status_code, 200)
+        self.assertEqual(counter.count, 0)
+
+    def test_unchanged_session_is_not_rewritten(self):
+        self.login(self.client)
+        with QueryCounter() as counter:
+            response = self.client.get('/dashboard')
+        self.assertNotIn('Set-Cookie', response.headers)
+        self.assertEqual([s for s in counter.statements if 'session_record' in s and not s.startswith('SELECT')], [])
+        self.assertEqual(SessionRecord.query.filter_by(user_id=self.user.id).count(), 1)
+
+class TestFileSessions(SessionTestMixin, unittest.TestCase):
+    backend = 'file'
+
+class TestMemorySessions(SessionTestMixin, unittest.TestCase):
+    backend = 'memory'
+
+if __name__ == '__main__':
+    unittest.main()
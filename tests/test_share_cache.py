@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flask import g
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Media
+from utils.queries import QueryCounter
+from utils.share_cache import get_shared_page_cache
+
+class TestSharedPageCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='sharer', email='sharer@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        self.entry = Entry(project='P', title='Tide pools', detailed_observation='Anemones everywhere',
+                           user_id=self.user.id, share_token='public-token')
+        db.session.add(self.entry)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_page_is_cached_and_conditional(self):
+        first = self.client.get('/shared/public-token')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b'Anemones everywhere', first.data)
+        self.assertIn('public', first.headers['Cache-Control'])
+        self.assertIn('max-age=60', first.headers['Cache-Control'])
+        self.assertIsNotNone(first.headers.get('Last-Modified'))
+
+        with QueryCounter() as counter:
+            second = self.client.get('/shared/public-token')
+            not_modified = self.client.get('/shared/public-token', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b'')
+
+    def test_expired_page_is_revalidated_with_one_query(self):
+        self.client.get('/shared/public-token')
+        get_shared_page_cache().ttl = 0
+        with QueryCounter() as counter:
+            self.assertEqual(self.client.get('/shared/public-token').status_code, 200)
+        self.assertEqual(counter.count, 1)
+
+    def test_edits_and_token_rotation_invalidate(self):
+        etag = self.client.get('/shared/public-token').headers['ETag']
+        self.entry.detailed_observation = 'Crabs, mostly'
+        self.entry.bump_version()
+        db.session.commit()
+        response = self.client.get('/shared/public-token', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Crabs, mostly', response.data)
+
+        self.entry.share_token = 'rotated-token'
+        db.session.commit()
+        self.assertEqual(self.client.get('/shared/public-token').status_code, 404)
+        self.assertEqual(self.client.get('/shared/rotated-token').status_code, 200)
+
+    def test_originals_are_never_linked(self):
+        media = Media(filename='abc.jpg', media_type='image', entry_id=self.entry.id)
+        db.session.add(media)
+        db.session.commit()
+        page = self.client.get('/shared/public-token').data
+        self.assertNotIn(b'abc.jpg', page)
+        self.assertIn(b'Image is being processed', page)
+
+        media.renditions = {name: {'filename': f'abc.display.{ext}', 'width': 1, 'height': 1, 'mimetype': mime}
+                            for name, ext, mime in (('display', 'jpg', 'image/jpeg'),
+                                                    ('display_webp', 'webp', 'image/webp'))}
+        media.processing_status = 'ready'
+        db.session.commit()
+        page = self.client.get('/shared/public-token').data
+        self.assertIn(b'abc.display.jpg', page)
+        self.assertNotIn(b'abc.jpg', page)
+
+    def test_originals_are_served_only_to_the_owner(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir)
+        self.app.config['UPLOAD_FOLDER'] = upload_dir
+        original, rendition = 'ab' * 32 + '.jpg', 'ab' * 32 + '.display.jpg'
+        for name in (original, rendition):
+            with open(os.path.join(upload_dir, name), 'wb') as f:
+                f.write(b'jpeg bytes')
+        db.session.add(Media(filename=original, media_type='image', entry_id=self.entry.id))
+        db.session.commit()
+
+        self.assertEqual(self.client.get(f'/media/files/{original}').status_code, 404)
+        self.assertEqual(self.client.get(f'/static/uploads/{original}').status_code, 404)
+        response = self.client.get(f'/media/files/{rendition}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.public)
+
+        other = User(username='stranger', email='stranger@example.com')
+        other.set_password('testpassword')
+        db.session.add(other)
+        db.session.commit()
+        g.pop('_login_user', None)
+        self.client.post('/login', data=dict(username='stranger', password='testpassword'))
+        self.assertEqual(self.client.get(f'/media/files/{original}').status_code, 404)
+
+        g.pop('_login_user', None)
+        owner = self.app.test_client()
+        owner.post('/login', data=dict(username='sharer', password='testpassword'))
+        response = owner.get(f'/media/files/{original}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.private)
+        self.assertFalse(response.cache_control.public)
+
+    def test_page_does_not_depend_on_the_viewer(self):
+        self.client.post('/login', data=dict(username='sharer', password='testpassword'))
+        page = self.client.get('/shared/public-token').data
+        with QueryCounter() as counter:
+            self.assertEqual(self.client.get('/shared/public-token').data, page)
+        self.assertEqual(counter.count, 0)
+        self.assertNotIn(b'Logout', page)
+        self.assertNotIn(b'Logged in successfully', page)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime, date
+from flask_app import create_app, create_admin_user
+from flask_app.extensions import db
+from flask_app.models import User, Entry, StatCounter
+from utils.stats import install_stats, activity
+from utils.tags import set_entry_tags
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='counter', email='counter@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_entry(self, project='P', day=datetime(2024, 3, 4, 12), tags=()):
+        entry = Entry(project=project, title='Entry', detailed_observation='obs', user_id=self.user.id, date=day)
+        db.session.add(entry)
+        db.session.commit()
+        if tags:
+            set_entry_tags(entry, list(tags))
+            db.session.commit()
+        return entry
+
+    def counters(self):
+        return {(row.dimension, row.bucket): row.total
+                for row in StatCounter.query.filter_by(user_id=self.user.id)}
+
+    def test_counters_follow_inserts_updates_and_deletes(self):
+        first = self.add_entry(tags=['birds'])
+        self.add_entry(project='Q', tags=['birds', 'tides'])
+        counters = self.counters()
+        self.assertEqual(counters[('entries', '')], 2)
+        self.assertEqual(counters[('project', 'P')], 1)
+        self.assertEqual(counters[('day', '2024-03-04')], 2)
+        self.assertEqual(sorted(total for (dimension, bucket), total in counters.items() if dimension == 'tag'), [1, 2])
+
+        first.project = 'Q'
+        first.date = datetime(2024, 3, 5, 9)
+        db.session.commit()
+        counters = self.counters()
+        self.assertNotIn(('project', 'P'), counters)
+        self.assertEqual(counters[('project', 'Q')], 2)
+        self.assertEqual(counters[('day', '2024-03-05')], 1)
+
+        db.session.delete(first)
+        db.session.commit()
+        counters = self.counters()
+        self.assertEqual(counters[('entries', '')], 1)
+        self.assertEqual(sorted(total for (dimension, bucket), total in counters.items() if dimension == 'tag'), [1, 1])
+
+    def test_rebuild_matches_triggers(self):
+        for i in range(3):
+            self.add_entry(project=f'P{i % 2}', tags=['birds'])
+        expected = self.counters()
+        StatCounter.query.delete()
+        db.session.commit()
+        install_stats()
+        self.assertEqual(self.counters(), expected)
+
+    def test_init_db_on_existing_database_backfills_counters(self):
+        # A database from before the counters: entries but no triggers or counter table
+        for i in range(3):
+            self.add_entry(project=f'P{i % 2}', tags=['birds'])
+        expected = self.counters()
+        with db.engine.begin() as conn:
+            triggers = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars().all()
+            for name in triggers:
+                conn.exec_driver_sql(f'DROP TRIGGER {name}')
+            conn.exec_driver_sql('DROP TABLE stat_counter')
+
+        db.create_all()
+        self.assertEqual(self.counters(), expected)
+        db.session.delete(Entry.query.filter_by(project='P0').first())
+        db.session.commit()
+        self.assertEqual(self.counters()[('entries', '')], 2)
+        self.assertEqual(self.counters()[('project', 'P0')], 1)
+
+    def test_weekly_activity_is_zero_filled(self):
+        self.add_entry(day=datetime(2024, 3, 4, 12))
+        self.add_entry(day=datetime(2024, 3, 6, 12))
+        series = activity(days=14, interval='week', today=date(2024, 3, 10))
+        self.assertEqual(series, [{'period': '2024-02-26', 'entries': 0}, {'period': '2024-03-04', 'entries': 2}])
+
+    def test_endpoints_require_admin(self):
+        self.add_entry(tags=['birds'])
+        self.client.post('/login', data=dict(username='counter', password='testpassword'))
+        self.assertEqual(self.client.get('/admin/stats/summary').status_code, 403)
+        self.client.get('/logout')
+
+        create_admin_user(password='testpassword')
+        self.client.post('/login', data=dict(username='admin', password='testpassword'))
+        summary = self.client.get('/admin/stats/summary').json
+        self.assertEqual((summary['users'], summary['entries'], summary['projects'], summary['tags']), (2, 1, 1, 1))
+        tags = self.client.get('/admin/stats/tags').json['tags']
+        self.assertEqual([(tag['tag'], tag['entries']) for tag in tags], [('birds', 1)])
+        users = self.client.get('/admin/stats/users').json['users']
+        self.assertEqual([(user['username'], user['entries']) for user in users], [('counter', 1)])
+        self.assertEqual(self.client.get('/admin/stats/activity?interval=month').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Media, Tag
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='offline', email='offline@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+        self.client.post('/login', data=dict(username='offline', password='testpassword'))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_entries(self, count):
+        entries = [Entry(project='P', title=f'Entry {i}', detailed_observation='obs', user_id=self.user.id)
+                   for i in range(count)]
+        db.session.add_all(entries)
+        db.session.commit()
+        return entries
+
+    def pull(self, cursor=0, limit=200):
+        response = self.client.get(f'/api/v1/sync?cursor={cursor}&limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def pull_all(self, cursor=0, limit=200):
+        changes = {'entries': [], 'media': [], 'deleted': []}
+        while True:
+            page = self.pull(cursor, limit)
+            for key in changes:
+                changes[key].extend(page[key])
+            cursor = page['cursor']
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_sequences_are_per_user_and_increasing(self):
+        entries = self.add_entries(3)
+        self.assertEqual([entry.change_seq for entry in entries], [1, 2, 3])
+        self.assertEqual(db.session.get(User, self.user.id).sync_seq, 3)
+
+    def test_new_user_and_entries_in_one_flush(self):
+        user = User(username='fresh', email='fresh@example.com')
+        user.set_password('testpassword')
+        entries = [Entry(project='P', title=f'Entry {i}', detailed_observation='obs', user=user) for i in range(2)]
+        db.session.add_all(entries)
+        db.session.commit()
+        self.assertEqual([entry.change_seq for entry in entries], [1, 2])
+        self.assertEqual(user.sync_seq, 2)
+
+    def test_pull_returns_only_changes_in_bounded_batches(self):
+        entries = self.add_entries(7)
+        changes, cursor = self.pull_all(limit=3)
+        self.assertEqual(len(changes['entries']), 7)
+
+        entries[2].title = 'Edited'
+        entries[4].tags.append(Tag(name='birds'))
+        db.session.commit()
+        page = self.pull(cursor)
+        changed = {entry['id']: entry for entry in page['entries']}
+        self.assertEqual(set(changed), {entries[2].id, entries[4].id})
+        self.assertEqual(changed[entries[4].id]['tags'], ['birds'])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(self.pull(page['cursor'])['entries'], [])
+
+    def test_deletes_become_tombstones(self):
+        entry = self.add_entries(1)[0]
+        entry.media.append(Media(filename='a.jpg', media_type='image'))
+        entry.media.append(Media(filename='b.jpg', media_type='image'))
+        db.session.commit()
+        changes, cursor = self.pull_all()
+        self.assertEqual(len(changes['media']), 2)
+
+        dropped = entry.media[0]
+        dropped_id = dropped.id
+        entry.media.remove(dropped)
+        db.session.commit()
+        page = self.pull(cursor)
+        self.assertEqual(page['deleted'], [{'kind': 'media', 'id': dropped_id, 'change_seq': page['cursor']}])
+
+        entry_id = entry.id
+        db.session.delete(entry)
+        db.session.commit()
+        page = self.pull(page['cursor'])
+        self.assertEqual([(d['kind'], d['id']) for d in page['deleted']], [('entry', entry_id)])
+
+    def test_push_applies_changes_and_detects_conflicts(self):
+        entries = self.add_entries(3)
+        stale_seq = entries[1].change_seq
+        entries[1].title = 'Changed on the web'
+        db.session.commit()
+
+        response = self.client.post('/api/v1/sync', json={'entries': [
+            {'client_id': 'local-1', 'project': 'P', 'title': 'Made offline', 'detailed_observation': 'obs'},
+            {'id': entries[0].id, 'base_seq': entries[0].change_seq, 'title': 'Edited offline'},
+            {'id': entries[1].id, 'base_seq': stale_seq, 'title': 'Edited offline too'},
+            {'id': entries[2].id, 'base_seq': entries[2].change_seq, 'deleted': True},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'updated', 'conflict', 'deleted'])
+        self.assertEqual(results[0]['client_id'], 'local-1')
+        self.assertEqual(results[2]['server']['title'], 'Changed on the web')
+        self.assertGreater(results[1]['change_seq'], stale_seq)
+
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Entry, entries[1].id).title, 'Changed on the web')
+        self.assertIsNone(db.session.get(Entry, entries[2].id))
+        self.assertEqual(Entry.query.filter_by(title='Made offline').count(), 1)
+
+    def test_replayed_push_returns_the_entry_created_before(self):
+        change = {'client_id': 'local-7', 'project': 'P', 'title': 'Made offline', 'detailed_observation': 'obs'}
+        first = self.client.post('/api/v1/sync', json={'entries': [change]}).json['results'][0]
+        replay = self.client.post('/api/v1/sync', json={'entries': [change]}).json['results'][0]
+        self.assertEqual(replay['status'], 'created')
+        self.assertEqual(replay['id'], first['id'])
+        self.assertEqual(replay['change_seq'], first['change_seq'])
+        self.assertEqual(Entry.query.filter_by(title='Made offline').count(), 1)
+
+    def test_push_rejects_repeated_ids_in_one_batch(self):
+        entry = self.add_entries(1)[0]
+        response = self.client.post('/api/v1/sync', json={'entries': [
+            {'id': entry.id, 'base_seq': entry.change_seq, 'title': 'First'},
+            {'id': entry.id, 'base_seq': entry.change_seq, 'title': 'Second'},
+            {'client_id': 'local-1', 'project': 'P', 'title': 'A', 'detailed_observation': 'obs'},
+            {'client_id': 'local-1', 'project': 'P', 'title': 'B', 'detailed_observation': 'obs'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json['errors']), {'1', '3'})
+        db.session.expire_all()
+        self.assertNotIn(db.session.get(Entry, entry.id).title, ('First', 'Second'))
+        self.assertEqual(Entry.query.filter(Entry.client_id.isnot(None)).count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Tag
+from utils.queries import QueryCounter
+from utils.tags import parse_tags, upsert_tags, set_entry_tags, get_tag_cache
+
+class TestTags(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='tagger', email='tagger@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_entry(self, title='Entry'):
+        entry = Entry(project='P', title=title, detailed_observation='obs', user_id=self.user.id)
+        db.session.add(entry)
+        db.session.commit()
+        return entry
+
+    def test_parse_tags_normalizes(self):
+        self.assertEqual(parse_tags(''), [])
+        self.assertEqual(parse_tags(' birds ,, tide  pools,birds, '), ['birds', 'tide pools'])
+        self.assertEqual(len(parse_tags('x' * 80)[0]), 50)
+
+    def test_empty_tag_field_creates_no_tag(self):
+        self.client.post('/login', data=dict(username='tagger', password='testpassword'))
+        response = self.client.post('/entry/new', data=dict(
+            project='P', title='No tags', detailed_observation='obs', tags=''))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Tag.query.count(), 0)
+        self.assertEqual(Entry.query.filter_by(title='No tags').one().tags, [])
+
+    def test_upsert_is_idempotent(self):
+        first = upsert_tags(['birds', 'tides'])
+        db.session.commit()
+        get_tag_cache().clear()
+        self.assertEqual(upsert_tags(['tides', 'birds']), first)
+        self.assertEqual(Tag.query.count(), 2)
+
+    def test_set_tags_diffs_associations(self):
+        entry = self.add_entry()
+        set_entry_tags(entry, ['a', 'b', 'c'])
+        db.session.commit()
+        set_entry_tags(entry, ['c', 'd'])
+        db.session.commit()
+        self.assertEqual(sorted(tag.name for tag in entry.tags), ['c', 'd'])
+
+    def test_statement_count_does_not_grow_with_tags(self):
+        entries = [self.add_entry(f'Entry {i}') for i in range(2)]
+        counts = []
+        for entry, size in zip(entries, (2, 40)):
+            names = [f'tag{size}-{i}' for i in range(size)]
+            with QueryCounter() as counter:
+                set_entry_tags(entry, names)
+            db.session.commit()
+            counts.append(counter.count)
+        self.assertEqual(counts[0], counts[1])
+
+        # Cached ids skip the lookups altogether
+        with QueryCounter() as counter:
+            set_entry_tags(entries[0], [f'tag40-{i}' for i in range(40)])
+        self.assertLess(counter.count, counts[1])
+
+    def test_rolled_back_tags_are_not_cached(self):
+        upsert_tags(['ephemeral'])
+        db.session.rollback()
+        self.assertEqual(get_tag_cache().get_many(['ephemeral']), {})
+        entry = self.add_entry()
+        set_entry_tags(entry, ['ephemeral'])
+        db.session.commit()
+        self.assertEqual([tag.name for tag in entry.tags], ['ephemeral'])
+
+    def test_tag_cloud_counts(self):
+        for i in range(3):
+            set_entry_tags(self.add_entry(f'Entry {i}'), ['birds'] + (['tides'] if i else []))
+        db.session.commit()
+        self.client.post('/login', data=dict(username='tagger', password='testpassword'))
+        response = self.client.get('/api/v1/tags?sort=count')
+        self.assertEqual([(tag['name'], tag['count']) for tag in response.json['tags']],
+                         [('birds', 3), ('tides', 2)])
+
+if __name__ == '__main__':
+    unittest.main()
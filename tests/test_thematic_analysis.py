@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry, Tag, AnalysisPartial
+from utils import thematic_analysis
+from utils.thematic_analysis import chunk_entries, perform_thematic_analysis, perform_incremental_analysis, stream_user_entries
+
+def make_entry(i, size=40):
+    return {'detailed_observation': f"observation {i} " + "x" * size, 'reflection': f"reflection {i}"}
+
+class TestChunking(unittest.TestCase):
+    def test_chunks_respect_token_budget(self):
+        entries = (make_entry(i, size=400) for i in range(20))
+        chunks = list(chunk_entries(entries, token_budget=300))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 20)
+        for chunk in chunks:
+            self.assertLessEqual(sum(thematic_analysis.estimate_tokens(thematic_analysis.format_entry(entry)) for entry in chunk), 300)
+
+    def test_oversized_entry_gets_its_own_chunk(self):
+        entries = [make_entry(0, size=4000), make_entry(1)]
+        chunks = list(chunk_entries(entries, token_budget=100))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1])
+
+class TestMapReduce(unittest.TestCase):
+    def test_small_journal_uses_single_call(self):
+        with patch.object(thematic_analysis, '_complete', return_value='themes') as complete:
+            result = perform_thematic_analysis([make_entry(1), make_entry(2)])
+        self.assertEqual(result, 'themes')
+        complete.assert_called_once()
+        self.assertTrue(complete.call_args[0][0].startswith(thematic_analysis.ANALYSIS_PROMPT))
+
+    def test_large_journal_is_summarised_then_merged(self):
+        with patch.object(thematic_analysis, '_complete', side_effect=lambda prompt: 'partial') as complete:
+            result = perform_thematic_analysis((make_entry(i, size=400) for i in range(20)), token_budget=300)
+        self.assertEqual(result, 'partial')
+        prompts = [call[0][0] for call in complete.call_args_list]
+        self.assertTrue(prompts[-1].startswith(thematic_analysis.MERGE_PROMPT))
+        self.assertGreater(len(prompts), 2)
+
+class TestStreamUserEntries(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_streams_serialized_entries_in_date_order(self):
+        user = User(username='streamer', email='streamer@example.com')
+        user.set_password('testpassword')
+        db.session.add(user)
+        db.session.commit()
+        tag = Tag(name='field')
+        for day in (3, 1, 2):
+            entry = Entry(project='P', title=f'Day {day}', detailed_observation='obs', reflection='ref',
+                          user_id=user.id, date=datetime(2024, 10, day))
+            entry.tags.append(tag)
+            db.session.add(entry)
+        db.session.commit()
+
+        entries = list(stream_user_entries(user.id, batch_size=2))
+        self.assertEqual([entry['title'] for entry in entries], ['Day 1', 'Day 2', 'Day 3'])
+        self.assertEqual(entries[0]['tags'], ['field'])
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='incremental', email='incremental@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_entry(self, title, observation):
+        entry = Entry(project='P', title=title, detailed_observation=observation, reflection='ref', user_id=self.user.id)
+        db.session.add(entry)
+        db.session.commit()
+        return entry
+
+    def analyze(self):
+        with patch.object(thematic_analysis, '_complete', side_effect=lambda prompt: 'summary') as complete:
+            perform_incremental_analysis(self.user.id, token_budget=40)
+            db.session.commit()
+        return [call[0][0] for call in complete.call_args_list]
+
+    def test_unchanged_journal_makes_no_model_calls(self):
+        self.add_entry('One', 'first observation')
+        self.add_entry('Two', 'second observation')
+        self.assertTrue(self.analyze())
+        self.assertEqual(self.analyze(), [])
+
+    def test_only_new_and_edited_entries_are_summarised(self):
+        self.add_entry('One', 'first observation ' + 'a' * 100)
+        edited = self.add_entry('Two', 'second observation ' + 'b' * 100)
+        self.analyze()
+
+        edited.detailed_observation = 'second observation, revised'
+        self.add_entry('Three', 'third observation')
+        prompts = self.analyze()
+        summarised = "".join(prompt for prompt in prompts if prompt.startswith(thematic_analysis.ANALYSIS_PROMPT))
+        self.assertIn('revised', summarised)
+        self.assertIn('third observation', summarised)
+        self.assertNotIn('first observation', summarised)
+
+    def test_deleted_entry_invalidates_its_partial(self):
+        self.add_entry('One', 'first observation ' + 'a' * 100)
+        doomed = self.add_entry('Two', 'second observation ' + 'b' * 100)
+        self.analyze()
+        self.assertEqual(AnalysisPartial.query.count(), 2)
+
+        db.session.delete(doomed)
+        db.session.commit()
+        self.assertEqual(self.analyze(), [])
+        self.assertEqual(AnalysisPartial.query.count(), 1)
+
+    def test_small_runs_are_compacted(self):
+        # Each entry is under half the budget; adding one per run must not grow the
+        # number of stored partials (and merge inputs) with the number of runs
+        for i in range(12):
+            self.add_entry(f'Day {i}', f'observation {i}')
+            prompts = self.analyze()
+            summarised = [prompt for prompt in prompts if prompt.startswith(thematic_analysis.ANALYSIS_PROMPT)]
+            self.assertLessEqual(len(summarised), 2)
+        self.assertLessEqual(AnalysisPartial.query.count(), 7)
+        self.assertFalse([prompt for prompt in self.analyze() if prompt.startswith(thematic_analysis.ANALYSIS_PROMPT)])
+
+    def test_prompt_or_model_change_invalidates_partials(self):
+        self.add_entry('One', 'first observation')
+        self.analyze()
+        with patch.object(thematic_analysis, 'ANALYSIS_PROMPT', 'Summarise the themes:\n\n'):
+            self.assertTrue(self.analyze())
+            self.assertEqual(self.analyze(), [])
+        with patch.object(thematic_analysis, 'MODEL', 'another-model'):
+            self.assertTrue(self.analyze())
+        self.assertEqual(AnalysisPartial.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
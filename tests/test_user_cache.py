@@ -0,0 +1,64 @@
+import unittest
+from flask_app import create_app
+from flask_app.extensions import db
+from flask_app.models import User, Entry
+from utils.queries import QueryCounter
+from utils.user_cache import load_user, get_user_cache
+
+class TestUserCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='cached', email='cached@example.com')
+        self.user.set_password('testpassword')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_repeat_loads_skip_the_database(self):
+        user_id = self.user.id
+        with QueryCounter() as counter:
+            first = load_user(str(user_id))
+        self.assertEqual(counter.count, 1)
+        with QueryCounter() as counter:
+            second = load_user(str(user_id))
+        self.assertEqual(counter.count, 0)
+        self.assertIs(second, first)
+        self.assertEqual((second.id, second.username, second.is_admin), (user_id, 'cached', False))
+        self.assertIsNone(load_user('999'))
+        self.assertIsNone(load_user('not-an-id'))
+
+    def test_admin_flag_change_invalidates(self):
+        load_user(self.user.id)
+        self.user.is_admin = True
+        db.session.commit()
+        self.assertTrue(load_user(self.user.id).is_admin)
+
+        db.session.delete(self.user)
+        db.session.commit()
+        self.assertIsNone(load_user(self.user.id))
+
+    def test_entry_writes_keep_the_cached_user(self):
+        cached = load_user(self.user.id)
+        db.session.add(Entry(project='P', title='T', detailed_observation='obs', user=self.user))
+        db.session.commit()
+        self.assertIs(load_user(self.user.id), cached)
+
+    def test_expired_users_are_reloaded(self):
+        user_id = self.user.id
+        get_user_cache().ttl = 0
+        load_user(user_id)
+        with QueryCounter() as counter:
+            load_user(user_id)
+        self.assertEqual(counter.count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+from flask_app.extensions import db
+
+
+def make_cache_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    def __init__(self, maxsize=256, ttl=86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLCacheBackend:
+    # Rows are written into the caller's transaction and committed with it
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+
+    def get(self, key):
+        from flask_app.models import AnalysisCacheEntry
+        item = db.session.get(AnalysisCacheEntry, key)
+        if item is None:
+            return None
+        created_at = item.created_at if item.created_at.tzinfo else item.created_at.replace(tzinfo=pytz.UTC)
+        if created_at + timedelta(seconds=self.ttl) < datetime.now(pytz.UTC):
+            db.session.delete(item)
+            return None
+        return item.value
+
+    def set(self, key, value):
+        from flask_app.models import AnalysisCacheEntry
+        try:
+            with db.session.begin_nested():
+                db.session.merge(AnalysisCacheEntry(key=key, value=value, created_at=datetime.now(pytz.UTC)))
+        except IntegrityError:
+            # Another worker stored the same key first; its value is just as good
+            pass
+
+    def clear(self):
+        from flask_app.models import AnalysisCacheEntry
+        AnalysisCacheEntry.query.delete()
+
+
+class AnalysisCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is None:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+def init_analysis_cache(app):
+    backend = app.config.get('ANALYSIS_CACHE_BACKEND', 'memory')
+    ttl = app.config.get('ANALYSIS_CACHE_TTL', 86400)
+    if backend == 'memory':
+        cache = AnalysisCache(MemoryCacheBackend(maxsize=app.config.get('ANALYSIS_CACHE_SIZE', 256), ttl=ttl))
+    elif backend == 'sql':
+        cache = AnalysisCache(SQLCacheBackend(ttl=ttl))
+    elif backend == 'none':
+        cache = None
+    else:
+        raise ValueError(f"Unknown ANALYSIS_CACHE_BACKEND: {backend}")
+    app.extensions['analysis_cache'] = cache
+    return cache
+
+
+def get_analysis_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('analysis_cache')
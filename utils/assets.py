@@ -0,0 +1,154 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from flask import current_app, send_from_directory, abort, Response
+from werkzeug.security import safe_join
+
+# Fingerprinted URLs never change content, so browsers and proxies may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Written by `flask assets-manifest`; without it each file is hashed when its URL is first built
+MANIFEST_FILENAME = 'manifest.json'
+# Static subdirectories that are not build assets (uploads are served by the media blueprint)
+SKIP_DIRS = {'uploads'}
+HASH_LENGTH = 12
+# Content-addressed uploads: <sha256>.<ext> and renditions <sha256>.<size>.<ext>
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}(\.[A-Za-z0-9_]+)+$')
+# A fingerprinted static name: <root>.<hash><ext>
+FINGERPRINTED = re.compile(r'^(.+)\.([0-9a-f]{%d})(\.[^./]*)?$' % HASH_LENGTH)
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hashed_name(filename, digest):
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def build_manifest(static_folder):
+    # {'css/tailwind.css': 'css/tailwind.1a2b3c4d5e6f.css', ...}
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if dirpath == static_folder:
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            if filename == MANIFEST_FILENAME:
+                continue
+            manifest[filename] = hashed_name(filename, file_digest(path))
+    return manifest
+
+
+def write_manifest(static_folder):
+    manifest = build_manifest(static_folder)
+    with open(os.path.join(static_folder, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    # The prebuilt manifest, or None when `flask assets-manifest` hasn't been run
+    path = os.path.join(static_folder, MANIFEST_FILENAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def is_asset(static_folder, filename):
+    path = safe_join(static_folder, filename)
+    return (path is not None and os.path.isfile(path) and filename != MANIFEST_FILENAME
+            and filename.split('/', 1)[0] not in SKIP_DIRS)
+
+
+class AssetManifest:
+    # Original static filename <-> fingerprinted name. Complete when loaded from manifest.json;
+    # otherwise filled in one file at a time, so a worker only hashes what it links to or serves.
+    def __init__(self, static_folder, prebuilt=None):
+        self.static_folder = static_folder
+        self.complete = prebuilt is not None
+        self._hashed = dict(prebuilt or {})
+        self._originals = {hashed: original for original, hashed in self._hashed.items()}
+        self._lock = threading.Lock()
+
+    def hashed(self, filename):
+        hashed = self._hashed.get(filename)
+        if hashed is not None or self.complete or not is_asset(self.static_folder, filename):
+            return hashed
+        hashed = hashed_name(filename, file_digest(safe_join(self.static_folder, filename)))
+        with self._lock:
+            self._hashed[filename] = hashed
+            self._originals[hashed] = filename
+        return hashed
+
+    def original(self, hashed):
+        original = self._originals.get(hashed)
+        if original is not None or self.complete:
+            return original
+        # Linked from a page another worker rendered
+        match = FINGERPRINTED.match(hashed)
+        if match is None:
+            return None
+        original = match.group(1) + (match.group(3) or '')
+        return original if self.hashed(original) == hashed else None
+
+
+def send_asset(directory, filename, accel_prefix, immutable=False, etag=True, public=True):
+    # Serve a file with conditional/Range support. In 'x-accel' mode only headers are
+    # produced and the front proxy (nginx) streams the bytes from accel_prefix; in
+    # 'x-sendfile' mode Flask emits X-Sendfile (USE_X_SENDFILE) for Apache/lighttpd.
+    # public=False keeps shared caches from storing a per-user file.
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if current_app.config['STATIC_SENDFILE_MODE'] == 'x-accel':
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{filename}"
+    else:
+        response = send_from_directory(directory, filename, conditional=True, etag=etag,
+                                       max_age=IMMUTABLE_MAX_AGE if immutable else None)
+
+    if immutable:
+        response.cache_control.public = public
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    if not public:
+        response.cache_control.private = True
+    return response
+
+
+def init_assets(app):
+    manifest = app.extensions['asset_manifest'] = AssetManifest(app.static_folder, load_manifest(app.static_folder))
+    app.config['USE_X_SENDFILE'] = app.config['STATIC_SENDFILE_MODE'] == 'x-sendfile'
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        # url_for('static', filename='css/tailwind.css') -> /static/css/tailwind.<hash>.css
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.hashed(values['filename']) or values['filename']
+
+    def static(filename):
+        if filename.split('/', 1)[0] in SKIP_DIRS:
+            # Uploads live under static/ but are only served, with access checks, by the media blueprint
+            abort(404)
+        original = manifest.original(filename)
+        if original is None:
+            # Unfingerprinted path (e.g. a hard-coded link): served, but revalidated every time
+            return send_asset(app.static_folder, filename, app.config['X_ACCEL_STATIC_PREFIX'])
+        # The fingerprint is a content hash, which makes it a strong ETag
+        root = os.path.splitext(original)[0]
+        digest = filename[len(root) + 1:len(root) + 1 + HASH_LENGTH]
+        return send_asset(app.static_folder, original, app.config['X_ACCEL_STATIC_PREFIX'],
+                          immutable=True, etag=digest)
+
+    app.view_functions['static'] = static
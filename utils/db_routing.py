@@ -0,0 +1,75 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event
+from sqlalchemy.engine import make_url
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+
+def engine_options(url, config):
+    # Pool and timeout settings for a server database. SQLite keeps Flask-SQLAlchemy's
+    # defaults (its in-memory databases need a single static connection).
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if backend == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+class RoutingSession(Session):
+    # Sends plain SELECTs to the replica inside views marked with @use_replica. Everything
+    # else (flushes, Core writes, SELECT ... FOR UPDATE, and any read after the request has
+    # written) stays on the primary.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        return (has_request_context() and g.get('db_use_replica', False)
+                and REPLICA_BIND in self._db.engines
+                and not self._flushing and not g.get('db_wrote', False)
+                and isinstance(clause, Select) and clause._for_update_arg is None)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def use_replica(f):
+    # Read-only views: route their queries to the replica unless this browser wrote
+    # something within REPLICA_STICKY_SECONDS (so a redirect after a save reads its own write)
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Checked in that order so that without a replica the session isn't loaded
+        g.db_use_replica = (REPLICA_BIND in current_app.config['SQLALCHEMY_BINDS']
+                            and session.get('db_primary_until', 0) < time.time())
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('db_use_replica', None)
+    return decorated_function
+
+
+def init_db_routing(app):
+    if REPLICA_BIND not in app.config['SQLALCHEMY_BINDS']:
+        return
+
+    @app.after_request
+    def pin_to_primary(response):
+        if g.pop('db_wrote', False):
+            session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
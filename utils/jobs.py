@@ -0,0 +1,169 @@
+import json
+import logging
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app
+from flask_app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+# Kinds with something to fetch from /jobs/<id>/result
+RESULT_KINDS = ('analysis', 'pdf_export')
+
+
+def job_handler(kind):
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+class InlineExecutor:
+    # Runs jobs synchronously in the calling thread; used for tests and local runs without workers
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_EXECUTOR', 'thread')
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_STALE_AFTER', 3600)
+        app.extensions['job_queue'] = {'executor': None}
+
+    def get_executor(self, app):
+        state = app.extensions['job_queue']
+        if state['executor'] is None:
+            if app.config['JOB_EXECUTOR'] == 'inline':
+                state['executor'] = InlineExecutor()
+            else:
+                state['executor'] = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                                       thread_name_prefix='fieldscribe-job')
+        return state['executor']
+
+    def enqueue(self, kind, user_id, **params):
+        from flask_app.models import Job
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        app = current_app._get_current_object()
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, kind=kind, params=json.dumps(params), status='queued')
+        db.session.add(job)
+        db.session.commit()
+        self.get_executor(app).submit(self._run, app, job.id)
+        # The worker commits through its own session; don't hand back our stale copy
+        db.session.expire(job)
+        return job
+
+    def _run(self, app, job_id):
+        from flask_app.models import Job
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return
+            job.status = 'running'
+            job.started_at = datetime.now(pytz.UTC)
+            db.session.commit()
+            try:
+                JOB_HANDLERS[job.kind](job, **json.loads(job.params or '{}'))
+                job.status = 'finished'
+            except Exception as e:
+                db.session.rollback()
+                logger.error(json.dumps({"error": "Job failed", "job_id": job_id, "kind": job.kind, "exception": str(e)}), exc_info=True)
+                job.status = 'failed'
+                job.error = str(e)
+            job.finished_at = datetime.now(pytz.UTC)
+            db.session.commit()
+            db.session.remove()
+
+    def shutdown(self, app, wait=True):
+        state = app.extensions['job_queue']
+        if state['executor'] is not None:
+            state['executor'].shutdown(wait=wait)
+            state['executor'] = None
+
+
+job_queue = JobQueue()
+
+
+@job_handler('analysis')
+def run_analysis(job):
+    from flask_app.models import AnalysisResult
+    from utils.thematic_analysis import perform_incremental_analysis
+    content = perform_incremental_analysis(job.user_id)
+    analysis = AnalysisResult(user_id=job.user_id, content=content)
+    db.session.add(analysis)
+    db.session.flush()
+    job.analysis_result_id = analysis.id
+
+
+@job_handler('pdf_export')
+def run_pdf_export(job, entry_id, timezone='UTC'):
+    from flask_app.models import Entry
+    from utils.pdf_cache import get_pdf_cache
+    entry = db.session.get(Entry, entry_id)
+    if entry is None or entry.user_id != job.user_id:
+        raise ValueError(f"Entry {entry_id} is not available for export")
+    # Served from the PDF cache by the result route, not stored on the job
+    get_pdf_cache().get_or_build(entry, timezone)
+
+
+@job_handler('media_renditions')
+def run_media_renditions(job, media_id):
+    from flask_app.models import Media
+    from utils.media_pipeline import process_media
+    from utils.pdf_cache import invalidate_entry_pdfs
+    media = db.session.get(Media, media_id)
+    if media is None:
+        raise ValueError(f"Media {media_id} no longer exists")
+    try:
+        process_media(media)
+    except Exception:
+        media.processing_status = 'failed'
+        db.session.commit()
+        raise
+    if media.processing_status == 'ready':
+        # PDFs exported so far embedded the original; the next export uses the display rendition
+        media.entry.bump_version()
+        db.session.commit()
+        invalidate_entry_pdfs(media.entry_id)
+
+
+def fail_stale_jobs(stale_after):
+    # Jobs live in the executor of the process that queued them, so one still queued or running
+    # stale_after seconds after it was queued or started was lost to a restart or crash
+    from flask_app.models import Job
+    now = datetime.now(pytz.UTC)
+    cutoff = (now - timedelta(seconds=stale_after)).replace(tzinfo=None)
+    failed = Job.query.filter(Job.status.in_(('queued', 'running')),
+                              db.func.coalesce(Job.started_at, Job.created_at) < cutoff).update(
+        {'status': 'failed', 'error': 'Interrupted: the worker running this job stopped', 'finished_at': now},
+        synchronize_session=False)
+    db.session.commit()
+    return failed
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
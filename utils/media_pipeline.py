@@ -0,0 +1,73 @@
+import os
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+
+# Longest edge in pixels for each rendition; each is written as JPEG/PNG plus a WebP twin
+RENDITION_SIZES = {
+    'thumb': 320,
+    'display': 1280,
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def _save(image, path, fmt):
+    if fmt == 'WEBP':
+        image.save(path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt == 'JPEG':
+        image.convert('RGB').save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, fmt, optimize=True)
+
+
+def generate_renditions(media, upload_folder=None):
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    source_path = os.path.join(upload_folder, media.filename)
+    stem = os.path.splitext(media.filename)[0]
+
+    with Image.open(source_path) as source:
+        source.seek(0)  # first frame of animated GIFs
+        # Bake the EXIF orientation into the pixels; the renditions carry no EXIF (GPS, camera serials)
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        base_format, base_ext, base_mime = ('PNG', 'png', 'image/png') if has_alpha else ('JPEG', 'jpg', 'image/jpeg')
+
+        renditions = {}
+        for name, longest_edge in RENDITION_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((longest_edge, longest_edge), Image.LANCZOS)
+            for suffix, fmt, ext, mimetype in ((name, base_format, base_ext, base_mime),
+                                               (f'{name}_webp', 'WEBP', 'webp', 'image/webp')):
+                filename = f"{stem}.{name}.{ext}"
+                _save(resized, os.path.join(upload_folder, filename), fmt)
+                renditions[suffix] = {'filename': filename, 'width': resized.width,
+                                      'height': resized.height, 'mimetype': mimetype}
+    return renditions
+
+
+def process_media(media):
+    if media.media_type != 'image':
+        media.processing_status = 'skipped'
+        return
+    media.renditions = generate_renditions(media)
+    media.processing_status = 'ready'
+
+
+def rendition_filename(media, name='display', webp=False):
+    # Smallest suitable file for a slot, falling back to the original until processing finishes
+    rendition = media.rendition(f'{name}_webp' if webp else name)
+    return rendition['filename'] if rendition else media.filename
+
+
+def rendition_path(media, name='display'):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], rendition_filename(media, name))
+
+
+def media_url(filename):
+    # Uploads are served from UPLOAD_FOLDER by the media blueprint, with Range and long-lived caching
+    return url_for('media.serve_file', filename=filename)
+
+
+def rendition_url(media, name='display', webp=False):
+    return media_url(rendition_filename(media, name, webp=webp))
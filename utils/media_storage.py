@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import pytz
+import magic
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from flask_app.extensions import db
+from flask_app.models import Media, MediaBlob, UploadSession
+from utils.media_pipeline import RENDITION_SIZES
+
+# Bytes read from the upload stream per iteration; never holds more than this in memory
+CHUNK_SIZE = 64 * 1024
+# Allowed MIME types, mapped to the Media.media_type they are stored as
+ALLOWED_MIME_TYPES = {
+    'image/png': 'image', 'image/jpeg': 'image', 'image/gif': 'image',
+    'audio/mpeg': 'audio', 'video/mp4': 'video'
+}
+# Stored originals are named <sha256><ext> from the sniffed type, so the same bytes always
+# land at the same path whatever the client called the file
+MIME_EXTENSIONS = {
+    'image/png': '.png', 'image/jpeg': '.jpg', 'image/gif': '.gif',
+    'audio/mpeg': '.mp3', 'video/mp4': '.mp4'
+}
+
+
+class UnsupportedMediaType(ValueError):
+    pass
+
+
+class FileTooSmall(ValueError):
+    pass
+
+
+class ChunkTooLarge(ValueError):
+    pass
+
+
+class StoredFile:
+    # Hashed, type-checked content still sitting at path; media_for_blob moves it to
+    # <upload_folder>/<filename> once the transaction referencing it commits. A temporary
+    # path is deleted if that transaction rolls back, anything else is left to be retried.
+    def __init__(self, sha256, filename, size_bytes, mime_type, path, upload_folder, temporary=True):
+        self.sha256 = sha256
+        self.filename = filename
+        self.path = path
+        self.upload_folder = upload_folder
+        self.temporary = temporary
+        self.size_bytes = size_bytes
+        self.mime_type = mime_type
+
+    @property
+    def media_type(self):
+        return ALLOWED_MIME_TYPES[self.mime_type]
+
+
+def sniff_mime_type(chunk):
+    mime_type = magic.from_buffer(chunk[:2048], mime=True)
+    if mime_type not in ALLOWED_MIME_TYPES:
+        raise UnsupportedMediaType(mime_type)
+    return mime_type
+
+
+def _place(path, final_path):
+    if os.path.exists(final_path):
+        os.remove(path)  # duplicate content: keep the existing blob
+    else:
+        # A rename when both paths are on one filesystem, a streamed copy otherwise
+        shutil.move(path, final_path)
+
+
+def store_chunks(chunks, upload_folder, min_size=0):
+    # Write chunks to a temp file in the upload folder while hashing them; the MIME type is
+    # sniffed from the first chunk so a bad upload is rejected before the rest is written.
+    # The result is named <sha256><ext>, so identical content is only ever stored once.
+    os.makedirs(upload_folder, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    mime_type = None
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if mime_type is None:
+                    mime_type = sniff_mime_type(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+        if mime_type is None or size < min_size:
+            raise FileTooSmall(size)
+
+        digest = hasher.hexdigest()
+        return StoredFile(digest, f"{digest}{MIME_EXTENSIONS[mime_type]}", size, mime_type, tmp_path, upload_folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_stream(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def store_upload(file, upload_folder, min_size=0):
+    return store_chunks(iter_stream(file.stream), upload_folder, min_size=min_size)
+
+
+def store_file(path, upload_folder, min_size=0):
+    # Move an already-assembled file (e.g. a finished resumable upload) into content-addressed
+    # storage. It is read once to hash it; the bytes themselves are renamed, not copied.
+    os.makedirs(upload_folder, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    mime_type = None
+    with open(path, 'rb') as f:
+        for chunk in iter_stream(f):
+            if mime_type is None:
+                mime_type = sniff_mime_type(chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+    if mime_type is None or size < min_size:
+        raise FileTooSmall(size)
+    digest = hasher.hexdigest()
+    return StoredFile(digest, f"{digest}{MIME_EXTENSIONS[mime_type]}", size, mime_type, path, upload_folder,
+                      temporary=False)
+
+
+def staging_path(staging_dir, upload_id):
+    return os.path.join(staging_dir, f"{upload_id}.part")
+
+
+def write_chunk(path, stream, offset, max_bytes):
+    # Write one chunk of a resumable upload at offset, streaming it from the request.
+    # Anything past offset is truncated first, so a retried chunk simply overwrites the
+    # partial copy of itself. Returns (bytes written, sniffed MIME type or None).
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    mime_type = None
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as out:
+        out.truncate(offset)
+        out.seek(offset)
+        try:
+            for chunk in iter_stream(stream):
+                if offset == 0 and written == 0:
+                    mime_type = sniff_mime_type(chunk)
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ChunkTooLarge(written)
+                out.write(chunk)
+        except ValueError:
+            out.truncate(offset)
+            raise
+    return written, mime_type
+
+
+def purge_stale_uploads(staging_dir, max_age):
+    # Abandoned resumable uploads: sessions idle for max_age seconds, plus any staged file
+    # older than that whose session is already gone. Returns the number of sessions removed.
+    cutoff = datetime.now(pytz.UTC) - timedelta(seconds=max_age)
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for session in stale:
+        db.session.delete(session)
+    db.session.commit()
+    if os.path.isdir(staging_dir):
+        live = {upload_id for (upload_id,) in db.session.query(UploadSession.id)}
+        for name in os.listdir(staging_dir):
+            path = os.path.join(staging_dir, name)
+            if name[:-len('.part')] not in live and os.path.getmtime(path) < cutoff.timestamp():
+                os.remove(path)
+    return len(stale)
+
+
+def _acquire_blob(stored):
+    # Returns the blob's filename, which is the one every Media row must point at
+    updated = (MediaBlob.query
+               .filter_by(sha256=stored.sha256)
+               .update({MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False))
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(MediaBlob(sha256=stored.sha256, filename=stored.filename, size_bytes=stored.size_bytes,
+                                         mime_type=stored.mime_type, ref_count=1))
+            return stored.filename
+        except IntegrityError:
+            # A concurrent upload of the same file created the row first
+            MediaBlob.query.filter_by(sha256=stored.sha256).update(
+                {MediaBlob.ref_count: MediaBlob.ref_count + 1}, synchronize_session=False)
+    return db.session.query(MediaBlob.filename).filter_by(sha256=stored.sha256).scalar()
+
+
+def media_for_blob(stored):
+    # New Media row for a stored file; renditions are reused when another row already has them.
+    # The file itself is only moved into place after commit: by then this row's reference is
+    # visible, so reclaim_blobs can no longer delete the blob out from under it.
+    filename = _acquire_blob(stored)
+    db.session.info.setdefault('pending_blob_files', []).append((stored, filename))
+    media = Media(filename=filename, media_type=stored.media_type, content_hash=stored.sha256)
+    sibling = (Media.query
+               .filter(Media.content_hash == stored.sha256, Media.processing_status == 'ready')
+               .first())
+    if sibling is not None:
+        media.renditions = sibling.renditions
+        media.processing_status = 'ready'
+    return media
+
+
+@event.listens_for(Session, 'after_commit')
+def _place_pending_files(session):
+    if session.in_nested_transaction():
+        return
+    for stored, filename in session.info.pop('pending_blob_files', ()):
+        try:
+            # A blob that predates MIME-based names keeps its file and the new copy is dropped
+            _place(stored.path, os.path.join(stored.upload_folder, filename))
+        except OSError as e:
+            logging.error(json.dumps({"error": "Error placing stored file", "sha256": stored.sha256,
+                                      "exception": str(e)}), exc_info=True)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_pending_files(session, transaction):
+    # Whatever is still pending when the outermost transaction ends was rolled back
+    if transaction.parent is not None:
+        return
+    for stored, _ in session.info.pop('pending_blob_files', ()):
+        if stored.temporary:
+            remove_files([stored.path])
+
+
+def release_media(media):
+    # Drop one reference; returns the hashes to pass to reclaim_blobs once the transaction commits
+    if not media.content_hash:
+        return []
+    MediaBlob.query.filter_by(sha256=media.content_hash).update(
+        {MediaBlob.ref_count: MediaBlob.ref_count - 1}, synchronize_session=False)
+    ref_count = db.session.query(MediaBlob.ref_count).filter_by(sha256=media.content_hash).scalar()
+    return [media.content_hash] if ref_count is not None and ref_count <= 0 else []
+
+
+def blob_paths(upload_folder, filename):
+    # The original plus every rendition media_pipeline may have written for it
+    stem = os.path.splitext(filename)[0]
+    paths = [os.path.join(upload_folder, filename)]
+    paths.extend(os.path.join(upload_folder, f"{stem}.{name}.{ext}")
+                 for name in RENDITION_SIZES for ext in ('jpg', 'png', 'webp'))
+    return paths
+
+
+def reclaim_blobs(hashes, upload_folder):
+    # Delete unreferenced blobs and their files, after the releasing transaction has committed.
+    # The row goes only if it is still at zero, and that DELETE holds the row lock while the
+    # files are removed: a concurrent upload of the same bytes either took its reference first
+    # (and the blob is kept) or waits, recreates the row and writes the file afresh.
+    for sha256 in hashes:
+        filename = db.session.query(MediaBlob.filename).filter_by(sha256=sha256).scalar()
+        if filename and MediaBlob.query.filter_by(sha256=sha256, ref_count=0).delete(synchronize_session=False):
+            remove_files(blob_paths(upload_folder, filename))
+        db.session.commit()
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
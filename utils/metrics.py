@@ -0,0 +1,206 @@
+import bisect
+import hmac
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from flask_app.extensions import db
+
+# Upper bounds (seconds) of the latency buckets, Prometheus' defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements per request
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+# Slow-query log lines keep this much of the SQL text
+MAX_LOGGED_STATEMENT = 1000
+
+slow_log = logging.getLogger('fieldscribe.slow')
+
+
+class Histogram:
+    # Cumulative-bucket histogram keyed by a tuple of label values. Counts are per process;
+    # with several gunicorn workers each scrape sees one worker.
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                labels = _labels(self.labels, label_values)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total}")
+                lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram('fieldscribe_http_request_duration_seconds',
+                                         'Time spent handling requests.', ('endpoint', 'method'))
+        self.requests = Counter('fieldscribe_http_requests_total', 'Requests handled.',
+                                ('endpoint', 'method', 'status'))
+        self.request_queries = Histogram('fieldscribe_http_request_queries', 'SQL statements issued per request.',
+                                         ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.sql_seconds = Histogram('fieldscribe_sql_duration_seconds', 'Time spent in SQL statements.',
+                                     ('endpoint',))
+        self.slow_queries = Counter('fieldscribe_sql_slow_queries_total',
+                                    'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+        self.section_seconds = Histogram('fieldscribe_section_duration_seconds',
+                                         'Time spent in named sections of a request.', ('section',))
+
+    def render(self):
+        lines = []
+        for metric in (self.request_seconds, self.requests, self.request_queries, self.sql_seconds,
+                       self.slow_queries, self.section_seconds):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics():
+    return current_app.extensions.get('metrics')
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+@contextmanager
+def timer(section):
+    # Times a block of a request: recorded in the section histogram and in Server-Timing
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.section_seconds.observe(elapsed, section)
+        if has_request_context():
+            g.setdefault('metric_sections', []).append((section, elapsed))
+
+
+def _instrument_engine(app, engine, metrics):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metric_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metric_started'].pop()
+        endpoint = _endpoint()
+        metrics.sql_seconds.observe(elapsed, endpoint)
+        if has_request_context():
+            g.sql_count = g.get('sql_count', 0) + 1
+            g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+        if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+            metrics.slow_queries.inc(endpoint)
+            slow_log.warning(json.dumps({"event": "slow_query", "endpoint": endpoint,
+                                         "duration_ms": round(elapsed * 1000, 1),
+                                         "statement": statement[:MAX_LOGGED_STATEMENT]}))
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed_statement(context):
+        # after_cursor_execute doesn't fire for a statement that raised
+        started = context.connection.info.get('metric_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def init_metrics(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics = app.extensions['metrics'] = Metrics()
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(app, engine, metrics)
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.metric_sections = []
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint()
+        sql_count, sql_seconds = g.pop('sql_count', 0), g.pop('sql_seconds', 0.0)
+        metrics.request_seconds.observe(elapsed, endpoint, request.method)
+        metrics.requests.inc(endpoint, request.method, response.status_code)
+        metrics.request_queries.observe(sql_count, endpoint)
+
+        timings = [f'app;dur={elapsed * 1000:.1f}', f'db;dur={sql_seconds * 1000:.1f};desc="{sql_count} queries"']
+        timings += [f'{section};dur={seconds * 1000:.1f}' for section, seconds in g.pop('metric_sections', [])]
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+        if elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+            slow_log.warning(json.dumps({"event": "slow_request", "endpoint": endpoint, "method": request.method,
+                                         "path": request.path, "status": response.status_code,
+                                         "duration_ms": round(elapsed * 1000, 1), "queries": sql_count,
+                                         "sql_ms": round(sql_seconds * 1000, 1)}))
+        return response
+
+    def metrics_view():
+        # Only scrapers holding METRICS_TOKEN; without one configured the endpoint doesn't exist
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
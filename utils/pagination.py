@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from flask_app.extensions import db
+
+DEFAULT_PER_PAGE = 5
+# Hard server-side ceiling; ?per_page= is clamped to this
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_encode_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in ('next', 'prev') or not isinstance(values, list):
+            raise ValueError(direction)
+        return direction, [_decode_value(v) for v in values]
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def _seek_condition(keys, values, descending):
+    # Lexicographic "comes after (k1, k2, ...)" in the fetch order, written without row-value
+    # syntax so it works on every backend and can still use a composite index
+    clauses = []
+    for i, key in enumerate(keys):
+        prefix = [keys[j] == values[j] for j in range(i)]
+        step = key < values[i] if descending else key > values[i]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+
+def estimate_count(query):
+    # PostgreSQL: the planner's row estimate, which costs no scan. Elsewhere: an exact count.
+    if db.engine.dialect.name == 'postgresql':
+        statement = query.order_by(None).statement
+        compiled = statement.compile(dialect=db.engine.dialect)
+        with db.engine.connect() as conn:
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    return query.order_by(None).count()
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def clamp_per_page(per_page, default=DEFAULT_PER_PAGE):
+    if per_page is None or per_page < 1:
+        return default
+    return min(per_page, MAX_PER_PAGE)
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=DEFAULT_PER_PAGE, descending=True, with_count=False):
+    # keys must be a unique ordering (e.g. (Entry.date, Entry.id)); every page is one index
+    # range scan of per_page + 1 rows, however deep it is
+    per_page = clamp_per_page(per_page)
+    direction, values = ('next', None) if not cursor else decode_cursor(cursor)
+    if values is not None and len(values) != len(keys):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    backwards = direction == 'prev'
+    fetch_descending = descending != backwards
+
+    total = estimate_count(query) if with_count else None
+
+    paged = query
+    if values is not None:
+        paged = paged.filter(_seek_condition(keys, values, fetch_descending))
+    ordering = [key.desc() if fetch_descending else key.asc() for key in keys]
+    rows = paged.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = values is not None, has_more
+
+    def key_values(row):
+        return [getattr(row, key.key) for key in keys]
+
+    next_cursor = encode_cursor('next', key_values(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor('prev', key_values(rows[0])) if rows and has_prev else None
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total)
@@ -0,0 +1,34 @@
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash
+
+# werkzeug's method strings: 'scrypt:<n>:<r>:<p>' or 'pbkdf2:<digest>:<iterations>'
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+DEFAULT_PASSWORD_SALT_LENGTH = 16
+
+
+def _policy():
+    if has_app_context():
+        return (current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_PASSWORD_HASH_METHOD),
+                current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_PASSWORD_SALT_LENGTH))
+    return DEFAULT_PASSWORD_HASH_METHOD, DEFAULT_PASSWORD_SALT_LENGTH
+
+
+def hash_password(password):
+    method, salt_length = _policy()
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+@lru_cache(maxsize=8)
+def _stored_prefix(method):
+    # The method as werkzeug writes it into hashes, with defaults filled in ('scrypt' ->
+    # 'scrypt:32768:8:1'); one throwaway hash per configured method, then cached
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    # True when a stored hash was made with other parameters than the current policy
+    if not password_hash:
+        return False
+    method, _ = _policy()
+    return password_hash.split('$', 1)[0] != _stored_prefix(method)
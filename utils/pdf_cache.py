@@ -0,0 +1,131 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from utils.pdf_generator import generate_pdf
+
+
+class PDFCache:
+    def __init__(self, cache_dir=None, memory_bytes=16 * 1024 * 1024, disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _filename(entry_id, version, timezone):
+        tz_key = hashlib.sha1(timezone.encode('utf-8')).hexdigest()[:12]
+        return f"{entry_id}-{version}-{tz_key}.pdf"
+
+    def get(self, entry_id, version, timezone):
+        name = self._filename(entry_id, version, timezone)
+        with self._lock:
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                return self._memory[name]
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # keep recently served files at the back of the eviction queue
+        self._remember(name, data)
+        return data
+
+    def set(self, entry_id, version, timezone, data):
+        name = self._filename(entry_id, version, timezone)
+        self._remember(name, data)
+        if not self.cache_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.cache_dir, name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict_disk()
+
+    def get_or_build(self, entry, timezone):
+        data = self.get(entry.id, entry.version, timezone)
+        if data is None:
+            data = generate_pdf(entry, timezone)
+            self.set(entry.id, entry.version, timezone, data)
+        return data
+
+    def invalidate(self, entry_id):
+        prefix = f"{entry_id}-"
+        with self._lock:
+            for name in [name for name in self._memory if name.startswith(prefix)]:
+                self._memory_size -= len(self._memory.pop(name))
+        if not self.cache_dir:
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.pdf'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def _remember(self, name, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if name in self._memory:
+                self._memory_size -= len(self._memory.pop(name))
+            self._memory[name] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for item in os.scandir(self.cache_dir):
+            if item.is_file() and item.name.endswith('.pdf'):
+                stat = item.stat()
+                files.append((stat.st_mtime, stat.st_size, item.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def init_pdf_cache(app):
+    cache = PDFCache(
+        cache_dir=app.config.get('PDF_CACHE_DIR'),
+        memory_bytes=app.config.get('PDF_CACHE_MEMORY_BYTES', 16 * 1024 * 1024),
+        disk_bytes=app.config.get('PDF_CACHE_DISK_BYTES', 256 * 1024 * 1024),
+    )
+    app.extensions['pdf_cache'] = cache
+    return cache
+
+
+def get_pdf_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('pdf_cache')
+
+
+def invalidate_entry_pdfs(entry_id):
+    cache = get_pdf_cache()
+    if cache is not None:
+        cache.invalidate(entry_id)
@@ -1,25 +1,26 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from io import BytesIO
 from datetime import datetime
 import pytz
-from flask import url_for
+from utils.media_pipeline import rendition_path
 
-def generate_pdf(entry, timezone):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
+# ReportLab is imported inside the functions that use it: it is a large import that only PDF
+# exports need, so web workers don't pay for it at startup
+
+def get_styles():
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name='Justify', alignment=4))  # 4 is for justified text
-    
+    return styles
+
+def entry_flowables(entry, timezone, styles, media=None):
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer, Image
     story = []
-    
+
     # Title
     story.append(Paragraph(entry.title, styles['Heading1']))
     story.append(Spacer(1, 12))
-    
+
     # Date and Location
     tz = pytz.timezone(timezone)
     local_date = entry.date.replace(tzinfo=pytz.UTC).astimezone(tz)
@@ -28,31 +29,90 @@ def generate_pdf(entry, timezone):
     if entry.location:
         story.append(Paragraph(f"Location: {entry.location}", styles['Normal']))
     story.append(Spacer(1, 12))
-    
+
     # Content
-    story.append(Paragraph(entry.content, styles['Justify']))
-    story.append(Spacer(1, 12))
-    
+    for heading, text in (("Context", entry.context),
+                          ("Detailed Observation", entry.detailed_observation),
+                          ("Reflection", entry.reflection)):
+        if text:
+            story.append(Paragraph(heading, styles['Heading3']))
+            story.append(Paragraph(text, styles['Justify']))
+            story.append(Spacer(1, 12))
+
     # Tags
     if entry.tags:
         tags_str = ", ".join([tag.name for tag in entry.tags])
         story.append(Paragraph(f"Tags: {tags_str}", styles['Italic']))
-    
+
     # Associated Media
-    if entry.media:
+    media_items = list(entry.media) if media is None else media
+    if media_items:
         story.append(Spacer(1, 12))
         story.append(Paragraph("Associated Media:", styles['Heading3']))
-        for media in entry.media:
+        for media in media_items:
             if media.media_type == 'image':
-                img_path = url_for('static', filename=f'uploads/{media.filename}', _external=True)
+                # Read from disk rather than fetching our own URL, so this also works off the request thread;
+                # the display rendition is plenty for a 4x3 inch slot and far cheaper to embed than the original
+                img_path = rendition_path(media, 'display')
                 img = Image(img_path, width=4*inch, height=3*inch)
                 story.append(img)
                 story.append(Spacer(1, 6))
             else:
                 story.append(Paragraph(f"Media: {media.filename} ({media.media_type})", styles['Normal']))
-    
+
+    # End on a Spacer so keepWithNext headings never straddle two entries
+    story.append(Spacer(1, 12))
+    return story
+
+def generate_pdf(entry, timezone):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+
+    story = entry_flowables(entry, timezone, get_styles())
+
     doc.build(story)
     pdf_content = buffer.getvalue()
     buffer.close()
-    
+
     return pdf_content
+
+class LazyStory(list):
+    # A story for build() that refills from an iterable of flowable lists whenever build()
+    # has consumed what it holds, so only one entry's flowables are in memory at a time.
+    # build() checks len() before every flowable, which is where the next batch is pulled.
+    def __init__(self, batches):
+        super().__init__()
+        self._batches = iter(batches)
+
+    def __len__(self):
+        while not super().__len__():
+            batch = next(self._batches, None)
+            if batch is None:
+                break
+            self.extend(batch)
+        return super().__len__()
+
+def report_batches(entries, timezone, title, styles):
+    from reportlab.platypus import Paragraph, Spacer, PageBreak
+    yield [Paragraph(title, styles['Title']),
+           Paragraph(f"Generated: {datetime.now(pytz.timezone(timezone)).strftime('%Y-%m-%d %H:%M %Z')}", styles['Normal']),
+           Spacer(1, 24)]
+    count = 0
+    for entry, media in entries:
+        flowables = entry_flowables(entry, timezone, styles, media=media)
+        yield [PageBreak()] + flowables if count else flowables
+        count += 1
+    if not count:
+        yield [Paragraph("No entries matched this export.", styles['Normal'])]
+
+def generate_report(entries, output, timezone, title):
+    # entries is an iterable of (entry, media) pairs, consumed lazily: each entry's flowables
+    # are laid out and dropped before the next one is pulled
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame
+    doc = BaseDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal')
+    doc.addPageTemplates([PageTemplate(id='Report', frames=frame, pagesize=doc.pagesize)])
+    doc.build(LazyStory(report_batches(entries, timezone, title, get_styles())))
@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+from flask_app.extensions import db
+from flask_app.models import Entry, User
+
+# Relationships every entry list/detail view renders; selectinload keeps it at one query per relationship
+ENTRY_OPTIONS = (selectinload(Entry.tags), selectinload(Entry.media))
+
+
+def user_entries_query(user_id):
+    return (Entry.query
+            .filter_by(user_id=user_id)
+            .options(*ENTRY_OPTIONS)
+            .order_by(Entry.date.desc(), Entry.id.desc()))
+
+
+def load_entry_or_404(entry_id):
+    return Entry.query.options(*ENTRY_OPTIONS).get_or_404(entry_id)
+
+
+def admin_entries_query():
+    return (Entry.query
+            .options(joinedload(Entry.user))
+            .order_by(Entry.date.desc(), Entry.id.desc()))
+
+
+def admin_users_query():
+    return User.query.order_by(User.id)
+
+
+class QueryCounter:
+    # Counts SQL statements sent through db.engine while active; with max_queries set,
+    # leaving the block raises AssertionError if the limit was exceeded (for tests)
+    def __init__(self, max_queries=None, engine=None):
+        self.max_queries = max_queries
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        if self.engine is None:
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        if exc_type is None and self.max_queries is not None and self.count > self.max_queries:
+            raise AssertionError(f"{self.count} SQL statements issued, expected at most {self.max_queries}:\n"
+                                 + "\n".join(self.statements))
+        return False
@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app, has_app_context
+from sqlalchemy import delete, insert, select
+from flask_app.extensions import db
+
+# The SQL backend deletes expired rows (all keys) every this many hits
+SQL_SWEEP_EVERY = 500
+
+
+class MemoryRateLimitBackend:
+    # Per-process: each worker allows the full limit, so the effective cap is limit x workers
+    def __init__(self):
+        # Ordered by each key's latest hit, oldest first, so idle keys are dropped from the front
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _retry_after(self, limits, cutoff):
+        # Caller holds the lock. Seconds until every key is under its limit again (0 = now)
+        retry_after = 0
+        for key, limit in limits.items():
+            hits = self._hits.get(key)
+            while hits and hits[0] <= cutoff:
+                hits.popleft()
+            if hits and len(hits) >= limit:
+                retry_after = max(retry_after, hits[-limit] - cutoff)
+        return retry_after
+
+    def check(self, limits, window):
+        # Like hit(), without recording anything
+        with self._lock:
+            return self._retry_after(limits, time.monotonic() - window)
+
+    def hit(self, limits, window):
+        # limits: {key: max hits per window}. Returns 0 and records the hit when every key is
+        # under its limit, otherwise the seconds until the oldest blocking hit leaves the window
+        now = time.monotonic()
+        cutoff = now - window
+        with self._lock:
+            retry_after = self._retry_after(limits, cutoff)
+            if retry_after:
+                return retry_after
+            self._record(limits, now, cutoff)
+            return 0
+
+    def add(self, keys, window):
+        # Records a hit for each key unconditionally
+        now = time.monotonic()
+        with self._lock:
+            self._record(keys, now, now - window)
+
+    def _record(self, keys, now, cutoff):
+        for key in keys:
+            self._hits.setdefault(key, deque()).append(now)
+            self._hits.move_to_end(key)
+        # Each key is popped at most once per hit that added it, so this is O(1) amortised
+        while self._hits:
+            key, hits = next(iter(self._hits.items()))
+            if hits and hits[-1] > cutoff:
+                break
+            self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+class SQLRateLimitBackend:
+    # Shared by every worker. Hits are committed on their own connection straight away, so
+    # concurrent workers count them and a failed login can't roll them back.
+    def __init__(self):
+        self._calls = 0
+
+    @staticmethod
+    def _retry_after(conn, attempts, limits, cutoff):
+        retry_after = 0
+        for key, limit in limits.items():
+            # The limit-th most recent hit; if it's inside the window the key is full
+            blocking = conn.execute(select(attempts.c.attempted_at)
+                                    .where(attempts.c.key == key, attempts.c.attempted_at > cutoff)
+                                    .order_by(attempts.c.attempted_at.desc())
+                                    .offset(limit - 1).limit(1)).scalar()
+            if blocking is not None:
+                retry_after = max(retry_after, (blocking - cutoff).total_seconds())
+        return retry_after
+
+    def check(self, limits, window):
+        from flask_app.models import LoginAttempt
+        cutoff = datetime.now(pytz.UTC).replace(tzinfo=None) - timedelta(seconds=window)
+        with db.engine.connect() as conn:
+            return self._retry_after(conn, LoginAttempt.__table__, limits, cutoff)
+
+    def hit(self, limits, window):
+        from flask_app.models import LoginAttempt
+        attempts = LoginAttempt.__table__
+        now = datetime.now(pytz.UTC).replace(tzinfo=None)
+        cutoff = now - timedelta(seconds=window)
+        with db.engine.begin() as conn:
+            retry_after = self._retry_after(conn, attempts, limits, cutoff)
+            if retry_after:
+                return retry_after
+            self._record(conn, attempts, limits, now, cutoff)
+            return 0
+
+    def add(self, keys, window):
+        from flask_app.models import LoginAttempt
+        now = datetime.now(pytz.UTC).replace(tzinfo=None)
+        with db.engine.begin() as conn:
+            self._record(conn, LoginAttempt.__table__, keys, now, now - timedelta(seconds=window))
+
+    def _record(self, conn, attempts, keys, now, cutoff):
+        conn.execute(insert(attempts), [{'key': key, 'attempted_at': now} for key in keys])
+        self._calls += 1
+        if self._calls % SQL_SWEEP_EVERY == 0:
+            conn.execute(delete(attempts).where(attempts.c.attempted_at <= cutoff))
+
+    def reset(self, key):
+        from flask_app.models import LoginAttempt
+        attempts = LoginAttempt.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(attempts).where(attempts.c.key == key))
+
+
+def init_login_limiter(app):
+    backend = app.config.get('LOGIN_RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'memory':
+        limiter = MemoryRateLimitBackend()
+    elif backend == 'sql':
+        limiter = SQLRateLimitBackend()
+    elif backend == 'none':
+        limiter = None
+    else:
+        raise ValueError(f"Unknown LOGIN_RATE_LIMIT_BACKEND: {backend}")
+    app.extensions['login_limiter'] = limiter
+    return limiter
+
+
+def get_login_limiter():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('login_limiter')
+
+
+def username_key(username):
+    return 'user:' + (username or '').strip().lower()[:150]
+
+
+def ip_key(remote_addr):
+    return 'ip:' + (remote_addr or 'unknown')
+
+
+def check_login_attempt(username, remote_addr):
+    # Seconds the caller must wait (0 = go ahead and verify the password). Counts the attempt
+    # against the username; the address is only checked here and charged for failures, so
+    # many people signing in through one NAT or proxy don't lock each other out.
+    limiter = get_login_limiter()
+    if limiter is None:
+        return 0
+    config = current_app.config
+    window = config['LOGIN_ATTEMPT_WINDOW']
+    retry_after = limiter.check({ip_key(remote_addr): config['LOGIN_MAX_ATTEMPTS_PER_IP']}, window)
+    if not retry_after:
+        retry_after = limiter.hit({username_key(username): config['LOGIN_MAX_ATTEMPTS_PER_USERNAME']}, window)
+    return math.ceil(retry_after)
+
+
+def record_failed_login(remote_addr):
+    limiter = get_login_limiter()
+    if limiter is not None:
+        limiter.add([ip_key(remote_addr)], current_app.config['LOGIN_ATTEMPT_WINDOW'])
+
+
+def reset_login_attempts(username):
+    # After a successful login the account's own counter starts over; the IP's doesn't
+    limiter = get_login_limiter()
+    if limiter is not None:
+        limiter.reset(username_key(username))
@@ -0,0 +1,112 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import DDL, event, text, bindparam, table, column
+from flask_app.extensions import db
+from flask_app.models import Entry, Tag
+from utils.queries import ENTRY_OPTIONS
+
+# Ranked results per page; ?limit= is clamped to this
+MAX_SEARCH_RESULTS = 50
+
+# PostgreSQL: a stored generated tsvector (kept current by the database on every
+# INSERT/UPDATE) with a GIN index. Title ranks above the observation, which ranks
+# above context and reflection.
+POSTGRES_DDL = [
+    """ALTER TABLE entry ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(detailed_observation, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(context, '') || ' ' || coalesce(reflection, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_entry_search_vector ON entry USING GIN (search_vector)",
+]
+
+# SQLite: an external-content FTS5 table over entry, kept in sync by triggers
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS entry_fts USING fts5(
+        title, detailed_observation, context, reflection,
+        content='entry', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS entry_fts_ai AFTER INSERT ON entry BEGIN
+        INSERT INTO entry_fts(rowid, title, detailed_observation, context, reflection)
+        VALUES (new.id, new.title, new.detailed_observation, new.context, new.reflection);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS entry_fts_ad AFTER DELETE ON entry BEGIN
+        INSERT INTO entry_fts(entry_fts, rowid, title, detailed_observation, context, reflection)
+        VALUES ('delete', old.id, old.title, old.detailed_observation, old.context, old.reflection);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS entry_fts_au AFTER UPDATE OF title, detailed_observation, context, reflection ON entry BEGIN
+        INSERT INTO entry_fts(entry_fts, rowid, title, detailed_observation, context, reflection)
+        VALUES ('delete', old.id, old.title, old.detailed_observation, old.context, old.reflection);
+        INSERT INTO entry_fts(rowid, title, detailed_observation, context, reflection)
+        VALUES (new.id, new.title, new.detailed_observation, new.context, new.reflection);
+    END""",
+]
+
+entry_fts = table('entry_fts', column('rowid'))
+
+
+def _ddl(statements, dialect):
+    return [DDL(statement).execute_if(dialect=dialect) for statement in statements]
+
+
+for _statement in _ddl(POSTGRES_DDL, 'postgresql') + _ddl(SQLITE_DDL, 'sqlite'):
+    event.listen(Entry.__table__, 'after_create', _statement)
+event.listen(Entry.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS entry_fts").execute_if(dialect='sqlite'))
+
+
+def install_search_index(engine=None, rebuild=False):
+    # For databases created before search existed; create_all() installs it for new ones
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            statements = POSTGRES_DDL
+        elif engine.dialect.name == 'sqlite':
+            statements = SQLITE_DDL + (["INSERT INTO entry_fts(entry_fts) VALUES ('rebuild')"] if rebuild else [])
+        else:
+            raise RuntimeError(f"Full-text search is not supported on {engine.dialect.name}")
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+
+
+def _fts5_query(q):
+    # Quote each word so user input can't trip FTS5 query syntax; words are ANDed
+    words = re.findall(r"\w+", q, flags=re.UNICODE)
+    return " ".join('"' + word + '"' for word in words)
+
+
+def search_entries(user_id, q, project=None, tag=None, start=None, end=None, limit=20, offset=0):
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    query = Entry.query.filter(Entry.user_id == user_id)
+
+    if db.engine.dialect.name == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', :q)"
+        query = (query
+                 .filter(text(f"entry.search_vector @@ {tsquery}"))
+                 .order_by(text(f"ts_rank_cd(entry.search_vector, {tsquery}) DESC"), Entry.date.desc())
+                 .params(q=q))
+    else:
+        match = _fts5_query(q)
+        if not match:
+            return []
+        # bm25() is lower-is-better; weights follow the column order of entry_fts
+        query = (query
+                 .join(entry_fts, entry_fts.c.rowid == Entry.id)
+                 .filter(text("entry_fts MATCH :q").bindparams(bindparam('q', match)))
+                 .order_by(text("bm25(entry_fts, 10.0, 5.0, 1.0, 1.0)"), Entry.date.desc()))
+
+    if project:
+        query = query.filter(Entry.project == project)
+    if tag:
+        query = query.filter(Entry.tags.any(Tag.name == tag))
+    if start:
+        query = query.filter(Entry.date >= start)
+    if end:
+        query = query.filter(Entry.date < end + timedelta(days=1))
+
+    return query.options(*ENTRY_OPTIONS).limit(limit).offset(offset).all()
+
+
+def parse_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
@@ -0,0 +1,72 @@
+from sqlalchemy.orm import load_only, selectinload
+from flask_app.models import Entry
+from utils.media_pipeline import media_url, rendition_url
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def media_to_dict(media):
+    return {
+        'id': media.id,
+        'entry_id': media.entry_id,
+        'media_type': media.media_type,
+        'processing_status': media.processing_status,
+        'change_seq': media.change_seq,
+        'url': media_url(media.filename),
+        'thumb_url': rendition_url(media, 'thumb') if media.media_type == 'image' else None,
+        'display_url': rendition_url(media, 'display') if media.media_type == 'image' else None,
+    }
+
+
+# Column fields map straight onto Entry columns; relation fields need their own load
+ENTRY_COLUMN_FIELDS = ('id', 'project', 'title', 'location', 'context', 'detailed_observation',
+                       'reflection', 'date', 'version', 'change_seq')
+ENTRY_RELATION_FIELDS = ('tags', 'media')
+ENTRY_FIELDS = ENTRY_COLUMN_FIELDS + ENTRY_RELATION_FIELDS
+
+ENTRY_SERIALIZERS = {
+    'date': lambda entry: _isoformat(entry.date),
+    'tags': lambda entry: [tag.name for tag in entry.tags],
+    'media': lambda entry: [media_to_dict(media) for media in entry.media],
+}
+
+
+def parse_fields(value, allowed=ENTRY_FIELDS):
+    # ?fields=id,title,tags -> ('id', 'title', 'tags'); id is always included
+    if not value:
+        return allowed
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(['id'] + fields))
+
+
+def entry_load_options(fields):
+    # Only the requested columns are selected and only the requested relationships loaded.
+    # date stays loaded because list endpoints paginate on it.
+    columns = {'id', 'date'} | {field for field in fields if field in ENTRY_COLUMN_FIELDS}
+    options = [load_only(*(getattr(Entry, column) for column in sorted(columns)))]
+    if 'tags' in fields:
+        options.append(selectinload(Entry.tags))
+    if 'media' in fields:
+        options.append(selectinload(Entry.media))
+    return options
+
+
+def entry_to_dict(entry, fields=ENTRY_FIELDS):
+    return {field: ENTRY_SERIALIZERS[field](entry) if field in ENTRY_SERIALIZERS else getattr(entry, field)
+            for field in fields}
+
+
+def analysis_to_dict(analysis, include_content=True):
+    data = {'id': analysis.id, 'date': _isoformat(analysis.date)}
+    if include_content:
+        data['content'] = analysis.content
+    return data
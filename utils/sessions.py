@@ -0,0 +1,377 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+from datetime import datetime
+import pytz
+from flask import current_app, has_app_context
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import delete, insert, select, update
+from flask_app.extensions import db
+from utils.metrics import timer
+
+# Request-local keys: flask-login sets and pops '_remember' within one request and checks for
+# it after every request, so it never reaches the store and looking it up doesn't load the session
+TRANSIENT_KEYS = frozenset({'_remember'})
+# secrets.token_urlsafe(32)
+SID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+def _utcnow():
+    return datetime.now(pytz.UTC).replace(tzinfo=None)
+
+
+def session_key(sid):
+    # Stores only see a hash of the cookie value, so a leaked table or directory can't be replayed
+    return hashlib.sha256(sid.encode('utf-8')).hexdigest()
+
+
+def _owner(data):
+    # flask-login keeps the signed-in user's id as a string under '_user_id'
+    try:
+        return int(data.get('_user_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ServerSession(SessionMixin):
+    # Holds only the session id until something reads or writes a key; then the data is loaded
+    # from the store once. A request that never looks at the session costs no store hit.
+    def __init__(self, store=None, sid=None, cookie_sid=None):
+        self.store = store
+        self.sid = sid
+        self.cookie_sid = cookie_sid
+        self.new = sid is None
+        self.modified = False
+        self._accessed = False
+        self.user_id = None
+        self.expires_at = None
+        self._data = {} if sid is None else None
+        self._local = {}
+
+    @property
+    def accessed(self):
+        # True once a key was actually read or written, so responses that never looked at the
+        # session get no Vary: Cookie and stay cacheable downstream. Flask marks every session
+        # accessed as soon as anything touches the `session` proxy (flask-login does on every
+        # request, for '_remember'), so that assignment is ignored.
+        return self._accessed
+
+    @accessed.setter
+    def accessed(self, value):
+        pass
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _items(self):
+        self._accessed = True
+        if self._data is None:
+            with timer('session_load'):
+                record = self.store.load(session_key(self.sid))
+            if record is None:
+                # Expired or revoked: carry on with an empty session under a new id
+                self.sid = None
+                self.new = True
+                self._data = {}
+            else:
+                self._data, self.user_id, self.expires_at = record
+        return self._data
+
+    def __getitem__(self, key):
+        if key in TRANSIENT_KEYS:
+            return self._local[key]
+        return self._items()[key]
+
+    def __setitem__(self, key, value):
+        if key in TRANSIENT_KEYS:
+            self._local[key] = value
+            return
+        self._items()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        if key in TRANSIENT_KEYS:
+            del self._local[key]
+            return
+        del self._items()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __len__(self):
+        return len(self._items())
+
+
+class MemorySessionStore:
+    # Per-process: only for a single worker (development, tests)
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        with self._lock:
+            record = self._sessions.get(key)
+            if record is None:
+                return None
+            payload, user_id, expires_at = record
+            if expires_at <= _utcnow():
+                del self._sessions[key]
+                return None
+        return session_json_serializer.loads(payload), user_id, expires_at
+
+    def save(self, key, data, user_id, expires_at):
+        payload = session_json_serializer.dumps(data)
+        with self._lock:
+            self._sessions[key] = (payload, user_id, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            keys = [key for key, record in self._sessions.items() if record[1] == user_id]
+            for key in keys:
+                del self._sessions[key]
+        return len(keys)
+
+    def purge_expired(self, limit):
+        now = _utcnow()
+        with self._lock:
+            keys = list(itertools.islice((key for key, record in self._sessions.items() if record[2] <= now), limit))
+            for key in keys:
+                del self._sessions[key]
+        return len(keys)
+
+
+class FileSessionStore:
+    # One file per session, shared by the workers of one host. A file's mtime is its expiry
+    # time, so purging needs a directory scan but no reads.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                expires_ts = os.fstat(f.fileno()).st_mtime
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        expires_at = datetime.fromtimestamp(expires_ts, pytz.UTC).replace(tzinfo=None)
+        if expires_at <= _utcnow():
+            self.delete(key)
+            return None
+        return session_json_serializer.loads(record['data']), record['user_id'], expires_at
+
+    def save(self, key, data, user_id, expires_at):
+        record = {'user_id': user_id, 'data': session_json_serializer.dumps(data)}
+        expires_ts = expires_at.replace(tzinfo=pytz.UTC).timestamp()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.utime(tmp_path, (expires_ts, expires_ts))
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def revoke_user(self, user_id):
+        revoked = 0
+        for item in os.scandir(self.directory):
+            if not item.name.endswith('.json'):
+                continue
+            try:
+                with open(item.path, 'r', encoding='utf-8') as f:
+                    owner = json.load(f).get('user_id')
+            except (FileNotFoundError, ValueError):
+                continue
+            if owner == user_id:
+                self.delete(item.name[:-len('.json')])
+                revoked += 1
+        return revoked
+
+    def purge_expired(self, limit):
+        now_ts = _utcnow().replace(tzinfo=pytz.UTC).timestamp()
+        purged = 0
+        for item in os.scandir(self.directory):
+            if purged >= limit:
+                break
+            try:
+                if item.name.endswith('.json') and item.stat().st_mtime <= now_ts:
+                    os.remove(item.path)
+                    purged += 1
+            except FileNotFoundError:
+                pass
+        return purged
+
+
+class SQLSessionStore:
+    # Shared by every worker. Runs on its own connection, so saving the session after a view
+    # never commits or rolls back the view's transaction.
+    def load(self, key):
+        from flask_app.models import SessionRecord
+        sessions = SessionRecord.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(select(sessions.c.data, sessions.c.user_id, sessions.c.expires_at)
+                               .where(sessions.c.key == key, sessions.c.expires_at > _utcnow())).first()
+        if row is None:
+            return None
+        return session_json_serializer.loads(row.data), row.user_id, row.expires_at
+
+    def save(self, key, data, user_id, expires_at):
+        from flask_app.models import SessionRecord
+        sessions = SessionRecord.__table__
+        values = {'data': session_json_serializer.dumps(data), 'user_id': user_id, 'expires_at': expires_at}
+        with db.engine.begin() as conn:
+            # Ids are never reused, so a missed update means the row doesn't exist yet
+            if not conn.execute(update(sessions).where(sessions.c.key == key).values(values)).rowcount:
+                conn.execute(insert(sessions).values(key=key, **values))
+
+    def delete(self, key):
+        from flask_app.models import SessionRecord
+        sessions = SessionRecord.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(sessions).where(sessions.c.key == key))
+
+    def revoke_user(self, user_id):
+        from flask_app.models import SessionRecord
+        sessions = SessionRecord.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(delete(sessions).where(sessions.c.user_id == user_id)).rowcount
+
+    def purge_expired(self, limit):
+        from flask_app.models import SessionRecord
+        sessions = SessionRecord.__table__
+        with db.engine.begin() as conn:
+            keys = conn.execute(select(sessions.c.key).where(sessions.c.expires_at <= _utcnow())
+                                .limit(limit)).scalars().all()
+            if keys:
+                conn.execute(delete(sessions).where(sessions.c.key.in_(keys)))
+        return len(keys)
+
+
+class ServerSessionInterface(SessionInterface):
+    # The cookie carries only a random session id. The store is written when the session
+    # changes, or when an unchanged session is past half its lifetime, not on every response.
+    def __init__(self, store, sweep_every=500, purge_batch=1000):
+        self.store = store
+        self.sweep_every = sweep_every
+        self.purge_batch = purge_batch
+        self._saves = itertools.count(1)
+
+    def open_session(self, app, request):
+        cookie_sid = request.cookies.get(self.get_cookie_name(app))
+        sid = cookie_sid if cookie_sid and SID_PATTERN.match(cookie_sid) else None
+        return ServerSession(self.store, sid, cookie_sid)
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.loaded:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        data = dict(session)
+
+        if not data:
+            # Logged out and nothing left to flash: drop the record and the cookie
+            if session.sid is not None:
+                self.store.delete(session_key(session.sid))
+            if session.cookie_sid is not None:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       partitioned=self.get_cookie_partitioned(app))
+                response.vary.add('Cookie')
+            return
+
+        now = _utcnow()
+        lifetime = app.permanent_session_lifetime
+        user_id = _owner(data)
+        if session.sid is not None and user_id != session.user_id:
+            # Signed in or out: a new id, so an id planted or seen before the login doesn't carry over
+            self.store.delete(session_key(session.sid))
+            session.sid = None
+        if session.sid is not None and not session.modified and session.expires_at - now > lifetime / 2:
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        with timer('session_save'):
+            self.store.save(session_key(session.sid), data, user_id, now + lifetime)
+        if next(self._saves) % self.sweep_every == 0:
+            self.store.purge_expired(self.purge_batch)
+
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+                            partitioned=self.get_cookie_partitioned(app))
+        response.vary.add('Cookie')
+
+
+def init_sessions(app):
+    backend = app.config.get('SESSION_BACKEND', 'sql')
+    if backend == 'sql':
+        store = SQLSessionStore()
+    elif backend == 'file':
+        store = FileSessionStore(app.config['SESSION_FILE_DIR'])
+    elif backend == 'memory':
+        store = MemorySessionStore()
+    elif backend == 'cookie':
+        store = None
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    app.extensions['session_store'] = store
+    if store is not None:
+        app.session_interface = ServerSessionInterface(store, app.config.get('SESSION_SWEEP_EVERY', 500),
+                                                       app.config.get('SESSION_PURGE_BATCH', 1000))
+    return store
+
+
+def get_session_store():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('session_store')
+
+
+def revoke_user_sessions(user_id):
+    # Signs the user out everywhere; None when sessions live in cookies and can't be revoked
+    store = get_session_store()
+    if store is None:
+        return None
+    return store.revoke_user(user_id)
+
+
+def purge_expired_sessions(batch_size=1000):
+    # Deletes expired sessions batch by batch, so no single statement holds locks for long
+    store = get_session_store()
+    if store is None:
+        return 0
+    purged = 0
+    while True:
+        removed = store.purge_expired(batch_size)
+        purged += removed
+        if removed < batch_size:
+            return purged
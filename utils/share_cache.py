@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask_app.extensions import db
+from flask_app.models import Entry, Media
+from utils.queries import ENTRY_OPTIONS
+
+
+class SharedPage:
+    def __init__(self, entry_id, version, body):
+        self.entry_id = entry_id
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.checked_at = time.monotonic()
+
+
+class SharedPageCache:
+    # Rendered public pages by share token, LRU-bounded. A page is served without touching the
+    # database for `ttl` seconds after it was last confirmed; after that one (id, version)
+    # lookup confirms it again. Commits in this process drop affected pages at once; the ttl
+    # bounds how long another worker can keep serving an edited or unshared entry.
+    def __init__(self, max_pages=1000, ttl=60):
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            page = self._pages.get(token)
+            if page is not None:
+                self._pages.move_to_end(token)
+            return page
+
+    def set(self, token, page):
+        with self._lock:
+            self._pages[token] = page
+            self._pages.move_to_end(token)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def invalidate_token(self, token):
+        with self._lock:
+            self._pages.pop(token, None)
+
+    def invalidate_entries(self, entry_ids):
+        with self._lock:
+            for token in [token for token, page in self._pages.items() if page.entry_id in entry_ids]:
+                del self._pages[token]
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+def init_shared_page_cache(app):
+    app.extensions['shared_page_cache'] = SharedPageCache(app.config['SHARED_PAGE_CACHE_SIZE'],
+                                                          app.config['SHARED_PAGE_CACHE_TTL'])
+
+
+def get_shared_page_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('shared_page_cache')
+
+
+def _render(entry):
+    # Straight through Jinja, skipping context processors: they load current_user (a query
+    # for signed-in viewers) into a page that must be the same for everyone
+    template = current_app.jinja_env.get_template('shared_entry.html')
+    return SharedPage(entry.id, entry.version, template.render(entry=entry).encode('utf-8'))
+
+
+def get_shared_page(token):
+    # The cached page for a share token, rendering it on a miss; None if nothing is shared under it
+    cache = get_shared_page_cache()
+    page = cache.get(token)
+    if page is not None and time.monotonic() - page.checked_at < cache.ttl:
+        return page
+
+    if page is not None:
+        current = db.session.query(Entry.id, Entry.version).filter(Entry.share_token == token).first()
+        if current is not None and tuple(current) == (page.entry_id, page.version):
+            page.checked_at = time.monotonic()
+            return page
+
+    entry = Entry.query.options(*ENTRY_OPTIONS).filter(Entry.share_token == token).first()
+    if entry is None:
+        cache.invalidate_token(token)
+        return None
+    page = _render(entry)
+    cache.set(token, page)
+    return page
+
+
+# Edits bump Entry.version, a rotated or revoked token changes Entry.share_token, and media
+# processing touches Media rows; any of them committed here drops the entry's pages
+@event.listens_for(Session, 'after_flush')
+def _collect_stale_pages(session, flush_context):
+    stale = session.info.setdefault('stale_shared_entries', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Entry):
+            stale.add(obj.id)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Media) and obj.entry_id is not None:
+            stale.add(obj.entry_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_stale_pages(session):
+    stale = session.info.pop('stale_shared_entries', None)
+    cache = get_shared_page_cache() if stale else None
+    if cache is not None:
+        cache.invalidate_entries(stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_pages(session):
+    session.info.pop('stale_shared_entries', None)
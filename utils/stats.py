@@ -0,0 +1,209 @@
+from datetime import date, timedelta
+from sqlalchemy import DDL, event, func
+from flask_app.extensions import db
+from flask_app.models import User, Tag, StatCounter
+
+# Longest activity window the admin charts may request
+MAX_ACTIVITY_DAYS = 3 * 366
+
+# PostgreSQL: one helper that applies a +/- delta (dropping rows that reach zero), called from
+# row triggers on entry and entry_tags. Counters change in the same transaction as the rows.
+POSTGRES_DDL = [
+    """CREATE OR REPLACE FUNCTION stat_bump(dim text, uid integer, b text, delta integer) RETURNS void AS $$
+    BEGIN
+        INSERT INTO stat_counter (dimension, user_id, bucket, total) VALUES (dim, uid, b, delta)
+        ON CONFLICT (dimension, user_id, bucket) DO UPDATE SET total = stat_counter.total + EXCLUDED.total;
+        DELETE FROM stat_counter WHERE dimension = dim AND user_id = uid AND bucket = b AND total <= 0;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION stat_entry_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM stat_bump('entries', OLD.user_id, '', -1);
+            PERFORM stat_bump('project', OLD.user_id, OLD.project, -1);
+            PERFORM stat_bump('day', OLD.user_id, to_char(OLD.date, 'YYYY-MM-DD'), -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM stat_bump('entries', NEW.user_id, '', 1);
+            PERFORM stat_bump('project', NEW.user_id, NEW.project, 1);
+            PERFORM stat_bump('day', NEW.user_id, to_char(NEW.date, 'YYYY-MM-DD'), 1);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION stat_entry_tag_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM stat_bump('tag', user_id, OLD.tag_id::text, -1) FROM entry WHERE id = OLD.entry_id;
+        ELSE
+            PERFORM stat_bump('tag', user_id, NEW.tag_id::text, 1) FROM entry WHERE id = NEW.entry_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION stat_user_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM stat_bump('users', 0, '', CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS stat_entry ON entry",
+    """CREATE TRIGGER stat_entry AFTER INSERT OR DELETE OR UPDATE OF user_id, project, date ON entry
+        FOR EACH ROW EXECUTE FUNCTION stat_entry_change()""",
+    "DROP TRIGGER IF EXISTS stat_entry_tag ON entry_tags",
+    """CREATE TRIGGER stat_entry_tag AFTER INSERT OR DELETE ON entry_tags
+        FOR EACH ROW EXECUTE FUNCTION stat_entry_tag_change()""",
+    'DROP TRIGGER IF EXISTS stat_user ON "user"',
+    """CREATE TRIGGER stat_user AFTER INSERT OR DELETE ON "user"
+        FOR EACH ROW EXECUTE FUNCTION stat_user_change()""",
+]
+
+_SQLITE_ENTRY_ADD = """INSERT INTO stat_counter (dimension, user_id, bucket, total)
+        VALUES ('entries', new.user_id, '', 1), ('project', new.user_id, new.project, 1),
+               ('day', new.user_id, date(new.date), 1)
+        ON CONFLICT (dimension, user_id, bucket) DO UPDATE SET total = total + 1;"""
+_SQLITE_ENTRY_REMOVE = """UPDATE stat_counter SET total = total - 1 WHERE user_id = old.user_id AND (
+            (dimension = 'entries' AND bucket = '') OR (dimension = 'project' AND bucket = old.project)
+            OR (dimension = 'day' AND bucket = date(old.date)));
+        DELETE FROM stat_counter WHERE user_id = old.user_id AND total <= 0;"""
+
+# SQLite: the same bookkeeping written directly into the triggers
+SQLITE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS stat_entry_ai AFTER INSERT ON entry BEGIN
+        {_SQLITE_ENTRY_ADD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stat_entry_ad AFTER DELETE ON entry BEGIN
+        {_SQLITE_ENTRY_REMOVE}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stat_entry_au AFTER UPDATE OF user_id, project, date ON entry BEGIN
+        {_SQLITE_ENTRY_REMOVE}
+        {_SQLITE_ENTRY_ADD}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stat_entry_tag_ai AFTER INSERT ON entry_tags BEGIN
+        INSERT INTO stat_counter (dimension, user_id, bucket, total)
+        SELECT 'tag', user_id, CAST(new.tag_id AS TEXT), 1 FROM entry WHERE id = new.entry_id
+        ON CONFLICT (dimension, user_id, bucket) DO UPDATE SET total = total + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stat_entry_tag_ad AFTER DELETE ON entry_tags BEGIN
+        UPDATE stat_counter SET total = total - 1 WHERE dimension = 'tag' AND bucket = CAST(old.tag_id AS TEXT)
+            AND user_id = (SELECT user_id FROM entry WHERE id = old.entry_id);
+        DELETE FROM stat_counter WHERE dimension = 'tag' AND total <= 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stat_user_ai AFTER INSERT ON "user" BEGIN
+        INSERT INTO stat_counter (dimension, user_id, bucket, total) VALUES ('users', 0, '', 1)
+        ON CONFLICT (dimension, user_id, bucket) DO UPDATE SET total = total + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stat_user_ad AFTER DELETE ON "user" BEGIN
+        UPDATE stat_counter SET total = total - 1 WHERE dimension = 'users';
+        DELETE FROM stat_counter WHERE dimension = 'users' AND total <= 0;
+    END""",
+]
+
+# Recompute every counter from the source tables (after a bulk import, or for a database
+# that predates the triggers)
+REBUILD_SQL = {
+    'postgresql': [
+        "DELETE FROM stat_counter",
+        """INSERT INTO stat_counter (dimension, user_id, bucket, total)
+            SELECT 'entries', user_id, '', count(*) FROM entry GROUP BY user_id
+            UNION ALL SELECT 'project', user_id, project, count(*) FROM entry GROUP BY user_id, project
+            UNION ALL SELECT 'day', user_id, to_char(date, 'YYYY-MM-DD'), count(*) FROM entry
+                GROUP BY user_id, to_char(date, 'YYYY-MM-DD')
+            UNION ALL SELECT 'tag', e.user_id, et.tag_id::text, count(*) FROM entry_tags et
+                JOIN entry e ON e.id = et.entry_id GROUP BY e.user_id, et.tag_id
+            UNION ALL SELECT 'users', 0, '', count(*) FROM "user" HAVING count(*) > 0""",
+    ],
+    'sqlite': [
+        "DELETE FROM stat_counter",
+        """INSERT INTO stat_counter (dimension, user_id, bucket, total)
+            SELECT 'entries', user_id, '', count(*) FROM entry GROUP BY user_id
+            UNION ALL SELECT 'project', user_id, project, count(*) FROM entry GROUP BY user_id, project
+            UNION ALL SELECT 'day', user_id, date(date), count(*) FROM entry GROUP BY user_id, date(date)
+            UNION ALL SELECT 'tag', e.user_id, CAST(et.tag_id AS TEXT), count(*) FROM entry_tags et
+                JOIN entry e ON e.id = et.entry_id GROUP BY e.user_id, et.tag_id
+            UNION ALL SELECT 'users', 0, '', count(*) FROM "user" HAVING count(*) > 0""",
+    ],
+}
+
+
+def _ddl(statements, dialect):
+    return [DDL(statement).execute_if(dialect=dialect) for statement in statements]
+
+
+# On the metadata rather than a table: the triggers need entry, entry_tags and stat_counter.
+# create_all() also runs on databases that already hold entries (`flask init-db` after an
+# upgrade), so the counters are rebuilt in the same transaction the triggers are installed in;
+# triggers over an empty counter table would drive it negative on the first delete.
+for _statement in (_ddl(POSTGRES_DDL + REBUILD_SQL['postgresql'], 'postgresql')
+                   + _ddl(SQLITE_DDL + REBUILD_SQL['sqlite'], 'sqlite')):
+    event.listen(db.metadata, 'after_create', _statement)
+
+
+def install_stats(engine=None, rebuild=True):
+    # For databases created before the counters existed; create_all() installs them for new ones
+    engine = engine or db.engine
+    dialect = engine.dialect.name
+    if dialect not in REBUILD_SQL:
+        raise RuntimeError(f"Statistics triggers are not supported on {dialect}")
+    StatCounter.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        for statement in (POSTGRES_DDL if dialect == 'postgresql' else SQLITE_DDL):
+            conn.exec_driver_sql(statement)
+        if rebuild:
+            for statement in REBUILD_SQL[dialect]:
+                conn.exec_driver_sql(statement)
+
+
+def _totals(dimension, user_id=None):
+    # Sum per bucket, over all users or one; reads only the counter table
+    query = db.session.query(StatCounter.bucket, func.sum(StatCounter.total)).filter(StatCounter.dimension == dimension)
+    if user_id is not None:
+        query = query.filter(StatCounter.user_id == user_id)
+    return query.group_by(StatCounter.bucket)
+
+
+def summary():
+    entries = (db.session.query(func.coalesce(func.sum(StatCounter.total), 0))
+               .filter(StatCounter.dimension == 'entries').scalar())
+    users = (db.session.query(func.coalesce(func.sum(StatCounter.total), 0))
+             .filter(StatCounter.dimension == 'users').scalar())
+    return {
+        'users': int(users),
+        'entries': int(entries),
+        'projects': _totals('project').count(),
+        'tags': _totals('tag').count(),
+    }
+
+
+def entries_per_user(limit=20):
+    rows = (db.session.query(User.id, User.username, StatCounter.total)
+            .join(StatCounter, StatCounter.user_id == User.id)
+            .filter(StatCounter.dimension == 'entries')
+            .order_by(StatCounter.total.desc(), User.id)
+            .limit(limit))
+    return [{'user_id': user_id, 'username': username, 'entries': total} for user_id, username, total in rows]
+
+
+def entries_per_project(limit=20, user_id=None):
+    rows = _totals('project', user_id).order_by(func.sum(StatCounter.total).desc(), StatCounter.bucket).limit(limit)
+    return [{'project': project, 'entries': int(total)} for project, total in rows]
+
+
+def entries_per_tag(limit=20, user_id=None):
+    rows = _totals('tag', user_id).order_by(func.sum(StatCounter.total).desc(), StatCounter.bucket).limit(limit).all()
+    names = dict(db.session.query(Tag.id, Tag.name).filter(Tag.id.in_([int(tag_id) for tag_id, total in rows])))
+    return [{'tag': names.get(int(tag_id)), 'tag_id': int(tag_id), 'entries': int(total)} for tag_id, total in rows]
+
+
+def activity(days=90, interval='day', user_id=None, today=None):
+    # Entries per day (or per ISO week, keyed by its Monday) over the last `days` days,
+    # zero-filled so charts get a continuous series
+    days = max(1, min(days, MAX_ACTIVITY_DAYS))
+    end = today or date.today()
+    start = end - timedelta(days=days - 1)
+    rows = _totals('day', user_id).filter(StatCounter.bucket >= start.isoformat(),
+                                          StatCounter.bucket <= end.isoformat())
+    per_day = {bucket: int(total) for bucket, total in rows}
+
+    series = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        key = day - timedelta(days=day.weekday()) if interval == 'week' else day
+        series[key.isoformat()] = series.get(key.isoformat(), 0) + per_day.get(day.isoformat(), 0)
+    return [{'period': period, 'entries': total} for period, total in series.items()]
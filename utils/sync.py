@@ -0,0 +1,111 @@
+from collections import defaultdict
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, attributes, selectinload
+from flask_app.models import User, Entry, Media, SyncTombstone
+
+# Rows per sync response; ?limit= is clamped to this
+MAX_SYNC_BATCH = 500
+DEFAULT_SYNC_BATCH = 200
+
+users = User.__table__
+
+
+def allocate_seqs(connection, user_id, count):
+    # Reserve count sequence numbers for a user. The UPDATE row-locks the user until commit,
+    # so concurrent writers to one journal commit in sequence order and a client cursor can't
+    # skip a change that commits late.
+    connection.execute(update(users).where(users.c.id == user_id).values(sync_seq=users.c.sync_seq + count))
+    last = connection.execute(select(users.c.sync_seq).where(users.c.id == user_id)).scalar_one()
+    return iter(range(last - count + 1, last + 1))
+
+
+def _entry_owner(entry):
+    # user_id, or the User itself when the entry was attached through entry.user to a user
+    # that is being inserted in this same flush
+    if entry.user_id is not None or entry.user is None:
+        return entry.user_id
+    return entry.user.id if entry.user.id is not None else entry.user
+
+
+def _media_user_id(session, media):
+    entry = media.entry if 'entry' not in attributes.instance_state(media).unloaded else None
+    if entry is None and media.entry_id is not None:
+        entry = session.get(Entry, media.entry_id)
+    return _entry_owner(entry) if entry is not None else None
+
+
+@event.listens_for(Session, 'before_flush')
+def stamp_changes(session, flush_context, instances):
+    changed = defaultdict(list)     # user_id -> objects to stamp
+    deleted = defaultdict(list)     # user_id -> (kind, object id)
+
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Entry) and (obj in session.new or session.is_modified(obj)):
+                changed[_entry_owner(obj)].append(obj)
+                # Media dropped from entry.media is deleted as an orphan during this flush
+                for media in attributes.get_history(obj, 'media').deleted:
+                    if media.id is not None:
+                        deleted[obj.user_id].append(('media', media.id))
+            elif isinstance(obj, Media) and (obj in session.new or session.is_modified(obj)):
+                user_id = _media_user_id(session, obj)
+                if user_id is not None:
+                    changed[user_id].append(obj)
+
+        deleted_entries = {obj.id for obj in session.deleted if isinstance(obj, Entry)}
+        for obj in session.deleted:
+            if isinstance(obj, Entry):
+                deleted[obj.user_id].append(('entry', obj.id))
+            elif isinstance(obj, Media) and obj.entry_id not in deleted_entries:
+                user_id = _media_user_id(session, obj)
+                if user_id is not None:
+                    deleted[user_id].append(('media', obj.id))
+
+    if not changed and not deleted:
+        return
+    connection = session.connection()
+    for user_id in set(changed) | set(deleted):
+        tombstones = list(dict.fromkeys(deleted[user_id]))
+        if isinstance(user_id, User):
+            # A new user's row isn't written yet, and nothing else can see it to race with
+            user = user_id
+            start = user.sync_seq or 0
+            user.sync_seq = start + len(changed[user])
+            seqs = iter(range(start + 1, user.sync_seq + 1))
+        else:
+            seqs = allocate_seqs(connection, user_id, len(changed[user_id]) + len(tombstones))
+        for obj in changed[user_id]:
+            obj.change_seq = next(seqs)
+        for kind, object_id in tombstones:
+            session.add(SyncTombstone(user_id=user_id, kind=kind, object_id=object_id, change_seq=next(seqs)))
+
+
+def changes_since(user_id, cursor, limit=DEFAULT_SYNC_BATCH):
+    # The `limit` lowest-sequence changes after cursor across entries, media and tombstones.
+    # Each source is read with its own index range scan; merging the three and keeping the
+    # first `limit` means nothing at or below the returned cursor can be left behind.
+    limit = max(1, min(limit, MAX_SYNC_BATCH))
+    entries = (Entry.query
+               .options(selectinload(Entry.tags))
+               .filter(Entry.user_id == user_id, Entry.change_seq > cursor)
+               .order_by(Entry.change_seq)
+               .limit(limit + 1).all())
+    media = (Media.query
+             .join(Entry, Entry.id == Media.entry_id)
+             .filter(Entry.user_id == user_id, Media.change_seq > cursor)
+             .order_by(Media.change_seq)
+             .limit(limit + 1).all())
+    tombstones = (SyncTombstone.query
+                  .filter(SyncTombstone.user_id == user_id, SyncTombstone.change_seq > cursor)
+                  .order_by(SyncTombstone.change_seq)
+                  .limit(limit + 1).all())
+
+    merged = sorted([('entry', row) for row in entries] + [('media', row) for row in media] +
+                    [('tombstone', row) for row in tombstones], key=lambda item: item[1].change_seq)
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    next_cursor = merged[-1][1].change_seq if merged else cursor
+    return ([row for kind, row in merged if kind == 'entry'],
+            [row for kind, row in merged if kind == 'media'],
+            [row for kind, row in merged if kind == 'tombstone'],
+            next_cursor, has_more)
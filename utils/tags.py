@@ -0,0 +1,169 @@
+import re
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, select, delete, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from flask_app.extensions import db
+from flask_app.models import Entry, Tag, entry_tags
+
+# Tag.name is a String(50)
+MAX_TAG_LENGTH = 50
+
+tags = Tag.__table__
+
+
+def normalize_tag(name):
+    # Trim, collapse inner whitespace and cap to the column length; '' means "no tag"
+    return re.sub(r'\s+', ' ', name or '').strip()[:MAX_TAG_LENGTH].strip()
+
+
+def normalize_tags(names):
+    # Order-preserving and duplicate-free, with empty names dropped
+    return list(dict.fromkeys(filter(None, (normalize_tag(name) for name in names))))
+
+
+def parse_tags(text):
+    # The comma-separated form field
+    return normalize_tags((text or '').split(','))
+
+
+class TagCache:
+    # Per-process name -> id map. Tags are never renamed or deleted, so entries stay valid;
+    # the size bound just keeps a long-running worker's memory flat.
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        with self._lock:
+            found = {}
+            for name in names:
+                if name in self._ids:
+                    self._ids.move_to_end(name)
+                    found[name] = self._ids[name]
+            return found
+
+    def set_many(self, mapping):
+        with self._lock:
+            for name, tag_id in mapping.items():
+                self._ids[name] = tag_id
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+def init_tag_cache(app):
+    app.extensions['tag_cache'] = TagCache(app.config['TAG_CACHE_SIZE'])
+
+
+def get_tag_cache():
+    return current_app.extensions['tag_cache']
+
+
+# Ids read inside a transaction are only cached once it commits; a rolled-back insert must
+# not leave the cache pointing at a tag that doesn't exist
+@event.listens_for(Session, 'after_commit')
+def _publish_tag_ids(session):
+    pending = session.info.pop('pending_tag_ids', None)
+    if pending and has_app_context() and 'tag_cache' in current_app.extensions:
+        get_tag_cache().set_many(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_tag_ids(session):
+    session.info.pop('pending_tag_ids', None)
+
+
+def _insert_missing(names):
+    # INSERT ... ON CONFLICT DO NOTHING, so concurrent saves of a new tag don't race on the
+    # unique name. Other backends fall back to one savepoint per name.
+    rows = [{'name': name} for name in names]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        db.session.execute(postgresql.insert(tags).values(rows).on_conflict_do_nothing(index_elements=['name']))
+    elif dialect == 'sqlite':
+        db.session.execute(sqlite.insert(tags).values(rows).on_conflict_do_nothing(index_elements=['name']))
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(tags).values(row))
+            except IntegrityError:
+                pass
+
+
+def upsert_tags(names):
+    # {name: id} for already-normalized names, creating any that don't exist. At most three
+    # statements however many names: lookup, bulk insert, lookup of the inserted ids.
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    pending = db.session.info.setdefault('pending_tag_ids', {})
+    ids = get_tag_cache().get_many(names)
+    ids.update((name, pending[name]) for name in names if name in pending)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = dict(db.session.execute(select(tags.c.name, tags.c.id).where(tags.c.name.in_(missing))).all())
+        new = [name for name in missing if name not in found]
+        if new:
+            _insert_missing(new)
+            found.update(db.session.execute(select(tags.c.name, tags.c.id).where(tags.c.name.in_(new))).all())
+        pending.update(found)
+        ids.update(found)
+    return ids
+
+
+def set_tags_for_entries(names_by_entry):
+    # Replace the tag sets of several (flushed) entries: {entry_id: [names]}. Association rows
+    # are diffed as sets, so unchanged tags aren't touched; one upsert, one read of the current
+    # rows, one bulk insert and one bulk delete cover the whole batch.
+    if not names_by_entry:
+        return
+    names_by_entry = {entry_id: normalize_tags(names) for entry_id, names in names_by_entry.items()}
+    tag_ids = upsert_tags(name for names in names_by_entry.values() for name in names)
+    desired = {(entry_id, tag_ids[name]) for entry_id, names in names_by_entry.items() for name in names}
+
+    current = set(db.session.execute(
+        select(entry_tags.c.entry_id, entry_tags.c.tag_id)
+        .where(entry_tags.c.entry_id.in_(list(names_by_entry)))).all())
+    to_add = desired - current
+    to_remove = current - desired
+    if to_add:
+        db.session.execute(insert(entry_tags), [{'entry_id': e, 'tag_id': t} for e, t in to_add])
+    if to_remove:
+        db.session.execute(delete(entry_tags).where(
+            tuple_(entry_tags.c.entry_id, entry_tags.c.tag_id).in_(list(to_remove))))
+
+    # The ORM collections no longer match the table; reload them on next access
+    for entry_id in names_by_entry:
+        entry = db.session.identity_map.get(db.session.identity_key(Entry, entry_id))
+        if entry is not None:
+            db.session.expire(entry, ['tags'])
+
+
+def set_entry_tags(entry, names):
+    db.session.flush()
+    set_tags_for_entries({entry.id: names})
+
+
+def tag_counts(user_id, limit=None, order='count'):
+    # [(id, name, entries)] for the user's tags, from a single aggregate over entry_tags
+    count = func.count(entry_tags.c.entry_id).label('entries')
+    query = (select(tags.c.id, tags.c.name, count)
+             .select_from(tags
+                          .join(entry_tags, entry_tags.c.tag_id == tags.c.id)
+                          .join(Entry.__table__, Entry.__table__.c.id == entry_tags.c.entry_id))
+             .where(Entry.__table__.c.user_id == user_id)
+             .group_by(tags.c.id, tags.c.name))
+    query = query.order_by(count.desc(), tags.c.name) if order == 'count' else query.order_by(tags.c.name)
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).all()
@@ -1,24 +1,201 @@
 import os
-from openai import OpenAI
+import hashlib
+import threading
+from sqlalchemy.orm import selectinload
+from flask_app.extensions import db
+from flask_app.models import Entry, AnalysisPartial, AnalysisPartialEntry
+from utils.analysis_cache import get_analysis_cache, make_cache_key
 
-api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
+# Built on first use: importing the SDK costs more than the rest of the app put together,
+# and workers that never run an analysis shouldn't need the key at all
+_client = None
+_client_lock = threading.Lock()
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
-def perform_thematic_analysis(entries):
-    prompt = "Meticulously analyze the journal entries and provide a comprehensive summary of the main themes, emotions, and patterns:\n\n"
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.environ.get("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable is not set")
+                from openai import OpenAI
+                _client = OpenAI(api_key=api_key)
+    return _client
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 2000
+SYSTEM_PROMPT = "As a sophisticated qualitative researcher, provide in-depth thematic analysis of journal entries, highlighting main themes, emotions, and patterns with clarity."
+ANALYSIS_PROMPT = "Meticulously analyze the journal entries and provide a comprehensive summary of the main themes, emotions, and patterns:\n\n"
+MERGE_PROMPT = "The following are partial thematic analyses, each covering a different set of entries from the same journal. Merge them into one comprehensive summary of the main themes, emotions, and patterns across the whole journal:\n\n"
+
+# Rough prompt budget per model call, leaving room for the system prompt and the reply
+CHUNK_TOKEN_BUDGET = 12000
+# Entries fetched per round-trip when streaming from the database
+STREAM_BATCH_SIZE = 200
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting English prose
+    return len(text) // 4 + 1
+
+
+def serialize_entry(entry):
+    return {
+        'id': entry.id,
+        'title': entry.title,
+        'project': entry.project,
+        'location': entry.location,
+        'context': entry.context,
+        'detailed_observation': entry.detailed_observation,
+        'reflection': entry.reflection,
+        'date': entry.date.isoformat(),
+        'tags': [tag.name for tag in entry.tags]
+    }
+
+
+def stream_user_entries(user_id, batch_size=STREAM_BATCH_SIZE):
+    query = (Entry.query
+             .filter_by(user_id=user_id)
+             .order_by(Entry.date, Entry.id)
+             .options(selectinload(Entry.tags))
+             .yield_per(batch_size))
+    for entry in query:
+        yield serialize_entry(entry)
+
+
+def format_entry(entry):
+    return f"Content:\n- Detailed Observation: {entry['detailed_observation']}\n- Reflection: {entry['reflection']}\n"
+
+
+def content_hash(entry):
+    # Hash exactly what the model sees, so edits to other fields don't invalidate summaries
+    return hashlib.sha256(format_entry(entry).encode('utf-8')).hexdigest()
+
+
+def chunk_entries(entries, token_budget=CHUNK_TOKEN_BUDGET):
+    chunk = []
+    chunk_tokens = 0
     for entry in entries:
-        prompt += f"Content:\n- Detailed Observation: {entry['detailed_observation']}\n- Reflection: {entry['reflection']}\n"
+        tokens = estimate_tokens(format_entry(entry))
+        if chunk and chunk_tokens + tokens > token_budget:
+            yield chunk
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(entry)
+        chunk_tokens += tokens
+    if chunk:
+        yield chunk
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+
+def _request_completion(prompt):
+    response = get_client().chat.completions.create(
+        model=MODEL,
         messages=[
-            {"role": "system", "content": "As a sophisticated qualitative researcher, provide in-depth thematic analysis of journal entries, highlighting main themes, emotions, and patterns with clarity."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=2000
+        max_tokens=MAX_TOKENS
     )
-
     return response.choices[0].message.content
+
+
+def _complete(prompt):
+    # The prompt embeds the serialized entries, so identical requests share a key
+    cache = get_analysis_cache()
+    if cache is None:
+        return _request_completion(prompt)
+    key = make_cache_key(MODEL, SYSTEM_PROMPT, prompt, MAX_TOKENS)
+    return cache.get_or_compute(key, lambda: _request_completion(prompt))
+
+
+def partial_fingerprint():
+    # Stored partials are only reused while the model and prompts that produced them are unchanged
+    return make_cache_key(MODEL, SYSTEM_PROMPT, ANALYSIS_PROMPT, MAX_TOKENS)
+
+
+def summarize_chunk(chunk):
+    return _complete(ANALYSIS_PROMPT + "".join(format_entry(entry) for entry in chunk))
+
+
+def merge_summaries(summaries, token_budget=CHUNK_TOKEN_BUDGET):
+    # Reduce in rounds so the merge prompt itself never outgrows the budget;
+    # every group takes at least two summaries so each round makes progress
+    while len(summaries) > 1:
+        merged = []
+        group = []
+        group_tokens = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if len(group) > 1 and group_tokens + tokens > token_budget:
+                merged.append(_complete(MERGE_PROMPT + "\n\n---\n\n".join(group)))
+                group = []
+                group_tokens = 0
+            group.append(summary)
+            group_tokens += tokens
+        if len(group) == 1 and merged:
+            merged.append(group[0])
+        else:
+            merged.append(_complete(MERGE_PROMPT + "\n\n---\n\n".join(group)))
+        summaries = merged
+    return summaries[0]
+
+
+def perform_thematic_analysis(entries, token_budget=CHUNK_TOKEN_BUDGET):
+    # Map: one summary per token-budgeted chunk; only the summaries are kept in memory
+    summaries = [summarize_chunk(chunk) for chunk in chunk_entries(entries, token_budget)]
+    if not summaries:
+        summaries = [summarize_chunk([])]
+    # Reduce: a journal that fits in one chunk gets exactly one model call, as before
+    return merge_summaries(summaries, token_budget)
+
+
+def perform_incremental_analysis(user_id, token_budget=CHUNK_TOKEN_BUDGET):
+    # First pass: current content hash and prompt size of every entry (ids and numbers only)
+    current_hashes = {}
+    entry_tokens = {}
+    for entry in stream_user_entries(user_id):
+        current_hashes[entry['id']] = content_hash(entry)
+        entry_tokens[entry['id']] = estimate_tokens(format_entry(entry))
+
+    # A stored partial stays valid only while every entry it summarised is unchanged
+    fingerprint = partial_fingerprint()
+    partials = (AnalysisPartial.query
+                .filter_by(user_id=user_id)
+                .options(selectinload(AnalysisPartial.entries))
+                .order_by(AnalysisPartial.id)
+                .all())
+    valid = []
+    for partial in partials:
+        if partial.fingerprint == fingerprint and all(current_hashes.get(row.entry_id) == row.content_hash
+                                                      for row in partial.entries):
+            valid.append(partial)
+        else:
+            db.session.delete(partial)
+
+    # Partials under half the budget are folded back in whenever there is new work, so small
+    # runs don't pile up tiny partials that every later merge has to pay for again
+    covered = {row.entry_id for partial in valid for row in partial.entries}
+    if len(covered) < len(current_hashes):
+        undersized = [partial for partial in valid
+                      if sum(entry_tokens[row.entry_id] for row in partial.entries) < token_budget / 2]
+        for partial in undersized:
+            db.session.delete(partial)
+            valid.remove(partial)
+            covered.difference_update(row.entry_id for row in partial.entries)
+    summaries = [partial.summary for partial in valid]
+
+    # Second pass: summarise new, edited, orphaned and compacted entries
+    dirty = (entry for entry in stream_user_entries(user_id) if entry['id'] not in covered)
+    for chunk in chunk_entries(dirty, token_budget):
+        summary = summarize_chunk(chunk)
+        partial = AnalysisPartial(user_id=user_id, summary=summary, fingerprint=fingerprint)
+        partial.entries = [AnalysisPartialEntry(entry_id=entry['id'], content_hash=content_hash(entry))
+                           for entry in chunk]
+        db.session.add(partial)
+        summaries.append(summary)
+
+    if not summaries:
+        summaries = [summarize_chunk([])]
+    return merge_summaries(summaries, token_budget)
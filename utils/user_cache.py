@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask_app.extensions import db
+from flask_app.models import User
+
+
+class SessionUser(UserMixin):
+    # What requests need to know about the signed-in user, without an ORM row. Views use
+    # current_user.id / .is_admin; anything else should load User by id.
+    def __init__(self, id, username, email, is_admin):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+class UserCache:
+    # Per-process LRU of signed-in users. Commits in this process drop changed users at once;
+    # the ttl bounds how long another worker can act on an old admin flag.
+    def __init__(self, max_size=10000, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._users.get(user_id)
+            if item is None:
+                return None
+            user, expires_at = item
+            if expires_at < time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user):
+        with self._lock:
+            self._users[user.id] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+def init_user_cache(app):
+    ttl = app.config['USER_CACHE_TTL']
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_SIZE'], ttl) if ttl > 0 else None
+
+
+def get_user_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('user_cache')
+
+
+def load_user(user_id):
+    # flask-login's user_loader: one narrow SELECT on a miss, nothing on a hit
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    cache = get_user_cache()
+    user = cache.get(user_id) if cache is not None else None
+    if user is None:
+        row = (db.session.query(User.id, User.username, User.email, User.is_admin)
+               .filter(User.id == user_id).first())
+        if row is None:
+            return None
+        user = SessionUser(*row)
+        if cache is not None:
+            cache.set(user)
+    return user
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        # Collection-only changes (user.entries and other backrefs) don't affect the cached fields
+        if isinstance(obj, User) and session.is_modified(obj, include_collections=False):
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_changed_users(session):
+    changed = session.info.pop('changed_user_ids', None)
+    cache = get_user_cache() if changed else None
+    if cache is not None:
+        cache.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_users(session):
+    session.info.pop('changed_user_ids', None)